@@ -0,0 +1,138 @@
+# answer_cache.py - Exact and semantic LRU caches of generated answers
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Case, spacing and trailing punctuation don't change the question"""
+    return ' '.join(text.lower().split()).rstrip('?!. ')
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    answer: str
+    relevant_chunks: List[str]
+    sources: List[List[dict]]
+
+
+@dataclass
+class _TierStats:
+    hits: int = 0
+    misses: int = 0
+
+    def as_dict(self, entries: int) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+class AnswerCache:
+    """Two-tier cache of answers, scoped to the index versions they were built from.
+
+    The exact tier is keyed by the normalized query text. The semantic tier
+    keeps each cached query's unit embedding and returns the answer of the
+    closest one within `max_distance` cosine distance. Both are LRU-bounded.
+
+    Every entry belongs to a scope: the searched collections at their
+    snapshot versions, plus filters, mode, top_k and whether decoding was
+    greedy. A new snapshot makes a
+    new scope, so stale answers are never returned; `invalidate` also drops
+    them eagerly to free their slots.
+    """
+
+    def __init__(self, max_entries: int = 1024, semantic_entries: int = 1024, max_distance: float = 0.05):
+        self.max_entries = max_entries
+        self.semantic_entries = semantic_entries if max_distance > 0 else 0
+        self.max_distance = max_distance
+        self._exact: "OrderedDict[Tuple[Hashable, str], CachedAnswer]" = OrderedDict()
+        self._semantic: "OrderedDict[Tuple[Hashable, str], Tuple[np.ndarray, CachedAnswer]]" = OrderedDict()
+        self._exact_stats = _TierStats()
+        self._semantic_stats = _TierStats()
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope(snapshot_versions: Dict[str, int], filters: Optional[dict], mode: str, top_k: int,
+              greedy: bool) -> Hashable:
+        """Everything besides the question that determines an answer"""
+        return (tuple(sorted(snapshot_versions.items())),
+                json.dumps(filters, sort_keys=True, default=str) if filters else None, mode, top_k, greedy)
+
+    def get(self, query_text: str, scope: Hashable) -> Optional[CachedAnswer]:
+        """Exact tier lookup"""
+        if not self.max_entries:
+            return None
+        key = (scope, normalize_query(query_text))
+        with self._lock:
+            cached = self._exact.get(key)
+            if cached is None:
+                self._exact_stats.misses += 1
+                return None
+            self._exact.move_to_end(key)
+            self._exact_stats.hits += 1
+            return cached
+
+    def get_similar(self, query_embedding: np.ndarray, scope: Hashable) -> Optional[CachedAnswer]:
+        """Semantic tier lookup: the nearest cached query in the same scope, if close enough"""
+        if not self.semantic_entries:
+            return None
+        unit = _unit(query_embedding)
+        with self._lock:
+            keys = [key for key in self._semantic if key[0] == scope]
+            if keys:
+                distances = 1.0 - np.stack([self._semantic[key][0] for key in keys]) @ unit
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    self._semantic.move_to_end(keys[best])
+                    self._semantic_stats.hits += 1
+                    return self._semantic[keys[best]][1]
+            self._semantic_stats.misses += 1
+            return None
+
+    def put(self, query_text: str, query_embedding: Optional[np.ndarray], scope: Hashable, cached: CachedAnswer):
+        key = (scope, normalize_query(query_text))
+        with self._lock:
+            if self.max_entries:
+                self._exact[key] = cached
+                self._exact.move_to_end(key)
+                while len(self._exact) > self.max_entries:
+                    self._exact.popitem(last=False)
+                    self.evictions += 1
+            if self.semantic_entries and query_embedding is not None:
+                self._semantic[key] = (_unit(query_embedding), cached)
+                self._semantic.move_to_end(key)
+                while len(self._semantic) > self.semantic_entries:
+                    self._semantic.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, collection: str, version: int):
+        """Drop answers built from versions of `collection` older than `version`"""
+        def stale(key) -> bool:
+            return any(name == collection and seen < version for name, seen in key[0][0])
+
+        with self._lock:
+            for tier in (self._exact, self._semantic):
+                for key in [key for key in tier if stale(key)]:
+                    del tier[key]
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "exact": self._exact_stats.as_dict(len(self._exact)),
+                "semantic": self._semantic_stats.as_dict(len(self._semantic)),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype='float32').ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
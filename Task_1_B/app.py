@@ -1,135 +1,616 @@
 # app.py - Simple RAG System for Task 1B
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import pandas as pd
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
 import pdfplumber
-import os
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import json
-import torch
-from typing import List
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Literal, Optional, Tuple
+
+import config
+from answer_cache import AnswerCache, CachedAnswer
+from archive import ArchiveError, ModelMismatch, archive_pieces, read_archive
+from backends import Embedder, Generator, configure_torch_threads, create_embedder, create_generator
+from chunking import ContextPacker, TokenChunker
+from generation import BatchingGenerator
+from dedup import DedupPlan
+from index_store import CollectionManager, IndexSnapshot
+from lexical import reciprocal_rank_fusion
+from projection import ProjectionPolicy
+from published_index import IndexPublisher, PublishedCollections
+from table_query import answer_from_tables
+from tables import Table
+from metadata import ChunkMetadata
+from uploads import UploadLimitMiddleware, UploadTooLarge, save_upload
+from metrics import (DUPLICATE_UPLOADS, INGEST_STAGE_SECONDS, QUERY_SECONDS, QUERY_STAGE_SECONDS, StageTimer,
+                     record_ingestion, update_index_gauges)
 
 app = FastAPI(title="RAG System", description="Simple RAG system for PDF/CSV ingestion")
+app.add_middleware(UploadLimitMiddleware, limits=[(r"/upload/(pdf|csv)", config.MAX_UPLOAD_BYTES),
+                                                  (r"/collections/[^/]+/import", config.MAX_ARCHIVE_BYTES)])
+
+class ChunkFilter(BaseModel):
+    sources: Optional[List[str]] = None  # Uploaded file names
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    
+    def to_mask_kwargs(self) -> dict:
+        """Arguments for ChunkMetadata.mask()"""
+        return {
+            "sources": self.sources,
+            "page_min": self.page_min,
+            "page_max": self.page_max,
+            "uploaded_after": self.uploaded_after.timestamp() if self.uploaded_after else None,
+            "uploaded_before": self.uploaded_before.timestamp() if self.uploaded_before else None
+        }
 
 class QueryRequest(BaseModel):
     query: str
+    collections: List[str] = [config.DEFAULT_COLLECTION]
+    filter: Optional[ChunkFilter] = None  # Restrict the search to matching chunks
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"  # Retrieval strategy
+    include_timings: bool = False  # Add per-stage durations to the response
+
+class StreamQueryRequest(QueryRequest):
+    greedy: bool = False  # Deterministic decoding for reproducible answers
 
 class QueryResponse(BaseModel):
     answer: str
     relevant_chunks: List[str]
+    sources: List[List[dict]]  # Provenance records for each relevant chunk
+    snapshot_versions: Dict[str, int]
+    timings: Optional[Dict[str, float]] = None  # embed_ms, search_ms, generate_ms
+    cache: Optional[str] = None  # "exact" or "semantic" when the answer was reused
+    table_query: Optional[List[dict]] = None  # The structured plan per table, when tables answered the query
+
+PROMPT_TEMPLATE = """Context: {context}
+
+Question: {query}
+
+Based on the context above, provide a concise answer to the question. If the context doesn't contain relevant information, say so clearly."""
+
+SERVING_ROLES = ("standalone", "writer", "reader")
+
+def table_matches_filters(table: Table, filters: Optional[dict]) -> bool:
+    """Whether a query's metadata filter selects a CSV table; page ranges never match CSV rows"""
+    if not filters:
+        return True
+    if filters.get("page_min") is not None or filters.get("page_max") is not None:
+        return False
+    if filters.get("sources") is not None and table.source not in filters["sources"]:
+        return False
+    if filters.get("uploaded_after") is not None and table.uploaded_at < filters["uploaded_after"]:
+        return False
+    if filters.get("uploaded_before") is not None and table.uploaded_at > filters["uploaded_before"]:
+        return False
+    return True
 
 class RAGSystem:
-    def __init__(self):
-        # Use small open-source models
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        # Initialize small LLM for text generation
-        print("Loading LLM model...")
-        self.llm = pipeline(
-            "text2text-generation",
-            model="google/flan-t5-small",
-            device=0 if torch.cuda.is_available() else -1
+    def __init__(self, embedder: Optional[Embedder] = None, llm: Optional[Generator] = None,
+                 collections_dir: str = config.COLLECTIONS_DIR, role: str = config.SERVING_ROLE,
+                 answer_cache: Optional[AnswerCache] = None):
+        # Models are loaded by load_models() in the background so the
+        # server can bind and answer liveness checks immediately. Backends
+        # passed in here (e.g. offline stubs for benchmarks) are used as-is.
+        self.embedder = embedder
+        self.llm = llm
+        self.generator = None
+        self.chunker = None
+        self.packer = None
+        self.ready = False
+        self.load_error = None
+        # Answers for repeated and near-identical questions
+        self.answer_cache = answer_cache or AnswerCache(
+            max_entries=config.ANSWER_CACHE_SIZE,
+            semantic_entries=config.SEMANTIC_CACHE_SIZE,
+            max_distance=config.SEMANTIC_CACHE_MAX_DISTANCE
         )
-        print("LLM model loaded successfully!")
         
-        self.chunks = []
-        self.embeddings = None
-        self.index = None
+        # Named collections, each publishing its own index snapshots. A
+        # writer also publishes them to PUBLISH_DIR for reader workers, which
+        # serve memory-mapped copies and never ingest themselves.
+        if role not in SERVING_ROLES:
+            raise ValueError(f"Unknown serving role '{role}', expected one of {', '.join(SERVING_ROLES)}")
+        self.role = role
+        self.publisher = None
+        if role == "reader":
+            self.collections = PublishedCollections(config.PUBLISH_DIR, config.PUBLISH_POLL_SECONDS,
+                                                    on_update=self.on_new_snapshot)
+        else:
+            self.collections = CollectionManager(collections_dir, config.DEDUP_NEAR_THRESHOLD, ProjectionPolicy(
+                dims=config.EMBEDDING_PROJECTION_DIMS,
+                min_chunks=config.PROJECTION_MIN_CHUNKS,
+                refit_growth=config.PROJECTION_REFIT_GROWTH,
+                drift=config.PROJECTION_DRIFT
+            ))
+            if role == "writer":
+                self.publisher = IndexPublisher(config.PUBLISH_DIR, config.PUBLISH_KEEP_VERSIONS,
+                                                config.PUBLISH_MIN_INTERVAL_SECONDS)
+        self.collections.get(config.DEFAULT_COLLECTION, create=True)
+    
+    def load_models(self):
+        """Load the embedding and generation backends, then run a warm-up pass"""
+        try:
+            configure_torch_threads(config.INFERENCE_THREADS)
+            if self.embedder is None:
+                self.embedder = create_embedder(config.EMBEDDING_BACKEND, config.EMBEDDING_MODEL,
+                                                config.EMBEDDING_POOL_WORKERS, config.EMBEDDING_POOL_BACKEND,
+                                                quantize=config.QUANTIZE_INT8, threads=config.INFERENCE_THREADS)
+            # Chunks are sized in the embedding model's own tokens
+            self.chunker = TokenChunker(
+                self.embedder.tokenizer,
+                chunk_tokens=config.CHUNK_TOKENS,
+                overlap_tokens=config.CHUNK_OVERLAP_TOKENS
+            )
+            
+            if self.llm is None:
+                print("Loading LLM model...")
+                self.llm = create_generator(config.GENERATION_BACKEND, config.GENERATION_MODEL,
+                                            quantize=config.QUANTIZE_INT8)
+                print("LLM model loaded successfully!")
+            self.packer = ContextPacker(self.llm.tokenizer, max_input_tokens=config.GENERATION_MAX_INPUT_TOKENS)
+            
+            # Concurrent queries share padded batch calls of the generator
+            self.generator = BatchingGenerator(
+                self.llm,
+                max_batch_size=config.GENERATION_MAX_BATCH_SIZE,
+                max_wait_ms=config.GENERATION_MAX_WAIT_MS,
+                max_length=150,
+                do_sample=True,
+                temperature=0.7
+            )
+            
+            self.warm_up()
+            self.ready = True
+            print("RAG system ready!")
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"Error loading models: {e}")
+    
+    def warm_up(self):
+        """Run one embedding and one generation so the first request isn't slow"""
+        self.embedder.encode(["warm-up"])
+        self.generator.generate("Context: warm-up\n\nQuestion: Is the model ready?")
         
-    def process_pdf(self, pdf_path: str) -> List[str]:
-        """Extract text from PDF and chunk it"""
+    def process_pdf(self, pdf_path: str) -> Tuple[List[str], List[int]]:
+        """Extract text from PDF and chunk it, returning chunks and their page numbers"""
         chunks = []
+        pages = []
         with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
+            for page_number, page in enumerate(pdf.pages, start=1):
                 text = page.extract_text()
                 if text:
-                    # Simple chunking - split by sentences
-                    sentences = text.split('.')
-                    for sentence in sentences:
-                        if len(sentence.strip()) > 20:  # Filter short sentences
-                            chunks.append(sentence.strip())
-        return chunks
-    
-    def process_csv(self, csv_path: str) -> List[str]:
-        """Extract text from CSV and chunk it"""
+                    # Sentence-aligned chunks of a fixed token budget
+                    page_chunks = self.chunker.chunk(text)
+                    chunks.extend(page_chunks)
+                    pages.extend([page_number] * len(page_chunks))
+        return chunks, pages
+    
+    def process_csv(self, csv_path: str) -> Tuple[List[str], List[int]]:
+        """Extract text from CSV and chunk it, returning chunks and their row numbers"""
+        return self.chunk_dataframe(pd.read_csv(csv_path))
+    
+    def chunk_dataframe(self, df: pd.DataFrame) -> Tuple[List[str], List[int]]:
+        """One "column: value" chunk per row, with the rows' 1-based numbers"""
         chunks = []
-        df = pd.read_csv(csv_path)
-        for _, row in df.iterrows():
+        rows = []
+        for row_number, (_, row) in enumerate(df.iterrows(), start=1):
             # Convert row to text
             row_text = ' '.join([f"{col}: {val}" for col, val in row.items() if pd.notna(val)])
             if len(row_text) > 20:
                 chunks.append(row_text)
-        return chunks
+                rows.append(row_number)
+        return chunks, rows
     
-    def create_embeddings(self, chunks: List[str]):
-        """Create embeddings and FAISS index"""
-        self.chunks = chunks
-        self.embeddings = self.embedding_model.encode(chunks)
+    def create_embeddings(self, chunks: List[str], metadata: ChunkMetadata,
+                          collection: str = config.DEFAULT_COLLECTION,
+                          timer: Optional[StageTimer] = None,
+                          document: Optional[dict] = None,
+                          table: Optional[Table] = None) -> Tuple[IndexSnapshot, DedupPlan]:
+        """Deduplicate and embed new chunks, then publish the collection's next index snapshot.
+
+        `document` records the uploaded file by content hash so re-uploads can be skipped;
+        a CSV's typed `table` is stored with it for structured queries.
+        """
+        store = self.collections.get(collection, create=True)
+        if not chunks:
+            return store.current(), DedupPlan()
+        if timer is None:
+            result = store.ingest(chunks, metadata, self.embedder.encode, document, table)
+            self.on_new_snapshot(collection, result[0])
+            return result
         
-        # Create FAISS index
-        dimension = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(self.embeddings.astype('float32'))
+        def embed(texts: List[str]) -> np.ndarray:
+            with timer.stage("embed"):
+                return self.embedder.encode(texts)
+        
+        # "index" is everything ingest does besides embedding: dedup, FAISS and BM25 updates
+        start = time.perf_counter()
+        result = store.ingest(chunks, metadata, embed, document, table)
+        timer.record("index", time.perf_counter() - start - timer.durations.get("embed", 0.0))
+        with timer.stage("publish"):
+            self.on_new_snapshot(collection, result[0])
+        return result
     
-    def query(self, query_text: str, top_k: int = 3) -> dict:
-        """Query the RAG system"""
-        if not self.index:
-            return {"answer": "No documents loaded", "relevant_chunks": []}
+    def on_new_snapshot(self, collection: str, snapshot: IndexSnapshot):
+        """Drop cached answers the snapshot made stale and hand it to reader workers"""
+        self.answer_cache.invalidate(collection, snapshot.version)
+        self.publish(collection, snapshot)
+    
+    def publish(self, collection: str, snapshot: IndexSnapshot):
+        """Hand a new snapshot to reader workers, when running as the writer"""
+        if self.publisher is not None:
+            self.publisher.schedule(collection, snapshot)
+    
+    def delete_document(self, collection: str, sha256: str) -> IndexSnapshot:
+        """Delete one uploaded document and compact the collection in the background if needed"""
+        store = self.collections.get(collection)
+        if store is None:
+            raise KeyError(collection)
+        snapshot = store.delete_document(sha256)
+        self.on_new_snapshot(collection, snapshot)
+        if store.tombstone_ratio >= config.COMPACTION_THRESHOLD:
+            threading.Thread(target=self.compact_collection, args=(collection, store),
+                             name=f"compact-{collection}", daemon=True).start()
+        return snapshot
+    
+    def embedding_identity(self) -> dict:
+        """The loaded embedding model, recorded in exported archives and checked on import"""
+        return {"model": self.embedder.model_id, "dimension": self.embedder.dimension}
+    
+    def import_archive(self, collection: str, stream) -> Tuple[dict, IndexSnapshot]:
+        """Load an exported collection into a new or empty one, reusing its vectors"""
+        manifest, contents = read_archive(stream, self.embedder.model_id, self.embedder.dimension,
+                                          config.MAX_ARCHIVE_BYTES)
+        snapshot = self.collections.restore(collection, contents)
+        self.on_new_snapshot(collection, snapshot)
+        return manifest, snapshot
+    
+    def compact_collection(self, collection: str, store):
+        """Rebuild a collection's index without tombstones; queries keep using the current one"""
+        try:
+            snapshot = store.compact()
+        except Exception as e:
+            print(f"Error compacting collection '{collection}': {e}")
+            return
+        if snapshot is not None:
+            self.on_new_snapshot(collection, snapshot)
+    
+    def publish_saved_collections(self):
+        """Publish collections saved by an earlier run that readers haven't seen yet"""
+        for stats in self.collections.stats():
+            if stats["snapshot_version"] > self.publisher.published_version(stats["name"]):
+                self.publish(stats["name"], self.collections.load(stats["name"]).current())
+    
+    def pin_snapshots(self, collections: List[str]) -> Dict[str, IndexSnapshot]:
+        """Pin the current snapshot of each named collection for one request"""
+        snapshots = {}
+        for name in dict.fromkeys(collections):
+            store = self.collections.get(name)
+            if store is None:
+                raise KeyError(name)
+            snapshots[name] = store.current()
+        return snapshots
+    
+    def retrieve(self, snapshots: Dict[str, IndexSnapshot], query_text: str, top_k: int = 3,
+                 filters: Optional[dict] = None, mode: str = "vector",
+                 timer: Optional[StageTimer] = None,
+                 query_embedding: Optional[np.ndarray] = None) -> Tuple[List[str], List[List[dict]]]:
+        """Return the chunks most relevant to the query and their provenance records"""
+        timer = timer or StageTimer(QUERY_STAGE_SECONDS)
+        if query_embedding is None:
+            with timer.stage("embed"):
+                query_embedding = self.embedder.encode([query_text])
         
-        # Get query embedding
-        query_embedding = self.embedding_model.encode([query_text])
+        with timer.stage("search"):
+            return self.search_snapshots(snapshots, query_text, query_embedding, top_k, filters, mode)
+    
+    def search_snapshots(self, snapshots: Dict[str, IndexSnapshot], query_text: str, query_embedding: np.ndarray,
+                         top_k: int, filters: Optional[dict], mode: str) -> Tuple[List[str], List[List[dict]]]:
+        """Search each pinned collection and merge the results"""
+        # Search each collection and merge; lower keys rank first
+        candidates = []
+        for snapshot in snapshots.values():
+            if snapshot.index is None:
+                continue
+            # Pre-filter: FAISS only scores chunks selected by the metadata
+            # filter, and never tombstones of deleted documents
+            mask = snapshot.search_mask(filters)
+            if mask is not None:
+                if not mask.any():
+                    continue
+                if mask.all():
+                    mask = None
+            candidates.extend(
+                (key, snapshot, idx)
+                for key, idx in self.search_snapshot(snapshot, query_text, query_embedding, top_k, mask, mode)
+            )
+        candidates.sort(key=lambda candidate: candidate[0])
         
-        # Search in FAISS
-        distances, indices = self.index.search(query_embedding.astype('float32'), top_k)
+        # Get relevant chunks; a deduplicated chunk lists every place it appeared
+        top = candidates[:top_k]
+        return ([snapshot.chunks[idx] for _, snapshot, idx in top],
+                [snapshot.metadata.describe(idx) for _, snapshot, idx in top])
+    
+    def search_snapshot(self, snapshot: IndexSnapshot, query_text: str, query_embedding: np.ndarray,
+                        top_k: int, mask: Optional[np.ndarray], mode: str) -> List[Tuple[float, int]]:
+        """Rank one snapshot's chunks as (key, chunk id) pairs using the requested retrieval mode"""
+        if mode != "vector":
+            lexical_scores, lexical_ids = snapshot.lexical_search(query_text, config.LEXICAL_CANDIDATES, mask)
+            
+            if mode == "lexical" and len(lexical_ids):
+                # Rescore the BM25 candidates with MiniLM instead of scanning the whole index
+                distances = snapshot.rescore(query_embedding, lexical_ids)
+                order = np.argsort(distances)[:top_k]
+                return [(float(distances[i]), int(lexical_ids[i])) for i in order]
+            
+            if mode == "hybrid":
+                # Fuse the lexical and vector rankings with reciprocal rank fusion
+                distances, vector_ids = snapshot.search(query_embedding, config.LEXICAL_CANDIDATES, mask)
+                fused = reciprocal_rank_fusion([vector_ids[0][vector_ids[0] != -1], lexical_ids], k=config.RRF_K)
+                return [(-score, idx) for idx, score in fused[:top_k]]
         
-        # Get relevant chunks
-        relevant_chunks = [self.chunks[idx] for idx in indices[0]]
+        # Vector search (also the fallback when no chunk shares a term with the query)
+        distances, indices = snapshot.search(query_embedding, top_k, mask)
+        return [(float(distance), int(idx)) for distance, idx in zip(distances[0], indices[0]) if idx != -1]
+    
+    def query(self, query_text: str, snapshots: Dict[str, IndexSnapshot], top_k: int = 3,
+              filters: Optional[dict] = None, mode: str = "vector",
+              timer: Optional[StageTimer] = None) -> dict:
+        """Query the RAG system"""
+        timer = timer or StageTimer(QUERY_STAGE_SECONDS)
+        snapshot_versions = {name: snapshot.version for name, snapshot in snapshots.items()}
+        if all(snapshot.index is None for snapshot in snapshots.values()):
+            return {"answer": "No documents loaded", "relevant_chunks": [], "sources": [],
+                    "snapshot_versions": snapshot_versions, "timings": timer.as_ms(),
+                    "cache": None, "table_query": None}
         
-        # Generate answer using LLM
-        answer = self.generate_simple_answer(query_text, relevant_chunks)
+        with QUERY_SECONDS.labels(mode=mode).time():
+            tabular = self.table_answer(query_text, snapshots, filters, timer)
+            if tabular is not None:
+                return {**tabular, "snapshot_versions": snapshot_versions, "timings": timer.as_ms(), "cache": None}
+            
+            # /query's batched generation always samples
+            scope = self.answer_cache.scope(snapshot_versions, filters, mode, top_k, greedy=False)
+            tier, cached, query_embedding = self.cached_answer(query_text, scope, timer)
+            if cached is not None:
+                return {
+                    "answer": cached.answer,
+                    "relevant_chunks": cached.relevant_chunks,
+                    "sources": cached.sources,
+                    "snapshot_versions": snapshot_versions,
+                    "timings": timer.as_ms(),
+                    "cache": tier,
+                    "table_query": None
+                }
+            
+            relevant_chunks, sources = self.retrieve(snapshots, query_text, top_k, filters, mode, timer,
+                                                     query_embedding)
+            
+            # Generate answer using LLM
+            with timer.stage("generate"):
+                try:
+                    answer = self.generate_answer(query_text, relevant_chunks)
+                    self.answer_cache.put(query_text, query_embedding, scope,
+                                          CachedAnswer(answer, relevant_chunks, sources))
+                except Exception as e:
+                    answer = self.fallback_answer(relevant_chunks, e)
         
         return {
             "answer": answer,
-            "relevant_chunks": relevant_chunks
+            "relevant_chunks": relevant_chunks,
+            "sources": sources,
+            "snapshot_versions": snapshot_versions,
+            "timings": timer.as_ms(),
+            "cache": None,
+            "table_query": None
         }
     
+    def table_answer(self, query_text: str, snapshots: Dict[str, IndexSnapshot], filters: Optional[dict],
+                     timer: StageTimer) -> Optional[dict]:
+        """Answer filter, sort and aggregate questions straight from the collections' CSV tables.
+
+        Returns None when tables are disabled or no table's columns fit the
+        question, so it goes through retrieval instead. Metadata filters
+        select which tables take part.
+        """
+        if not config.TABLE_QUERIES:
+            return None
+        with timer.stage("table"):
+            tables = {}
+            for name, snapshot in snapshots.items():
+                for key, table in snapshot.tables.items():
+                    if table_matches_filters(table, filters):
+                        tables[f"{name}/{key}"] = table
+            answered = answer_from_tables(query_text, tables, config.TABLE_ANSWER_MAX_ROWS) if tables else None
+        if answered is None:
+            return None
+        
+        answer, results = answered
+        relevant_chunks, sources = [], []
+        for result in results:
+            table = result.plan.table
+            for i in result.rows[:config.TABLE_ANSWER_MAX_ROWS]:
+                relevant_chunks.append(table.row_text(i))
+                sources.append([{"source": table.source, "page": None, "row": int(table.rows[i]),
+                                 "uploaded_at": table.uploaded_at}])
+        return {
+            "answer": answer,
+            "relevant_chunks": relevant_chunks,
+            "sources": sources,
+            "table_query": [result.plan.describe() for result in results]
+        }
+    
+    def cached_answer(self, query_text: str, scope, timer: StageTimer
+                      ) -> Tuple[Optional[str], Optional[CachedAnswer], Optional[np.ndarray]]:
+        """Look the question up in the exact tier, then embed it and try the semantic tier.
+
+        Returns the tier that hit, the cached answer, and the query embedding
+        when one was computed so retrieval can reuse it.
+        """
+        with timer.stage("cache"):
+            cached = self.answer_cache.get(query_text, scope)
+        if cached is not None:
+            return "exact", cached, None
+        
+        with timer.stage("embed"):
+            query_embedding = self.embedder.encode([query_text])
+        with timer.stage("cache"):
+            cached = self.answer_cache.get_similar(query_embedding[0], scope)
+        return ("semantic" if cached is not None else None), cached, query_embedding
+    
+    def stream_query(self, query_text: str, snapshots: Dict[str, IndexSnapshot], top_k: int = 3,
+                     filters: Optional[dict] = None, mode: str = "vector", greedy: bool = False,
+                     include_timings: bool = False):
+        """Yield server-sent events: the retrieved chunks first, then answer tokens"""
+        timer = StageTimer(QUERY_STAGE_SECONDS)
+        snapshot_versions = {name: snapshot.version for name, snapshot in snapshots.items()}
+        if all(snapshot.index is None for snapshot in snapshots.values()):
+            yield sse_event("chunks", {"relevant_chunks": [], "sources": [], "snapshot_versions": snapshot_versions})
+            yield sse_event("token", {"text": "No documents loaded"})
+            yield sse_event("done", {})
+            return
+        
+        tabular = self.table_answer(query_text, snapshots, filters, timer)
+        if tabular is not None:
+            yield sse_event("chunks", {"relevant_chunks": tabular["relevant_chunks"], "sources": tabular["sources"],
+                                       "snapshot_versions": snapshot_versions, "cache": None,
+                                       "table_query": tabular["table_query"]})
+            yield sse_event("token", {"text": tabular["answer"]})
+            yield sse_event("done", {"timings": timer.as_ms()} if include_timings else {})
+            return
+        
+        scope = self.answer_cache.scope(snapshot_versions, filters, mode, top_k, greedy)
+        tier, cached, query_embedding = self.cached_answer(query_text, scope, timer)
+        if cached is not None:
+            yield sse_event("chunks", {"relevant_chunks": cached.relevant_chunks, "sources": cached.sources,
+                                       "snapshot_versions": snapshot_versions, "cache": tier})
+            yield sse_event("token", {"text": cached.answer})
+            yield sse_event("done", {"timings": timer.as_ms()} if include_timings else {})
+            return
+        
+        relevant_chunks, sources = self.retrieve(snapshots, query_text, top_k, filters, mode, timer, query_embedding)
+        yield sse_event("chunks", {"relevant_chunks": relevant_chunks, "sources": sources,
+                                   "snapshot_versions": snapshot_versions, "cache": None})
+        
+        if not relevant_chunks:
+            yield sse_event("token", {"text": "No relevant information found."})
+            yield sse_event("done", {"timings": timer.as_ms()} if include_timings else {})
+            return
+        
+        try:
+            # Includes the time the client takes to read each token
+            pieces = []
+            with timer.stage("generate"):
+                for text in self.llm.stream(self.build_prompt(query_text, relevant_chunks),
+                                            max_length=150, greedy=greedy):
+                    pieces.append(text)
+                    yield sse_event("token", {"text": text})
+            self.answer_cache.put(query_text, query_embedding, scope,
+                                  CachedAnswer(''.join(pieces).strip(), relevant_chunks, sources))
+        except Exception as e:
+            print(f"Error streaming answer: {e}")
+            yield sse_event("error", {"detail": f"Error generating answer: {str(e)}"})
+        yield sse_event("done", {"timings": timer.as_ms()} if include_timings else {})
+    
+    def build_prompt(self, query: str, chunks: List[str]) -> str:
+        """Build the LLM prompt, packing ranked chunks into the generator's input budget"""
+        # Whatever the template and question don't use is left for context
+        budget = self.packer.max_input_tokens - self.packer.count_tokens(PROMPT_TEMPLATE.format(context="", query=query))
+        context = "\n".join(self.packer.pack(chunks, budget))
+        return PROMPT_TEMPLATE.format(context=context, query=query)
+    
     def generate_simple_answer(self, query: str, chunks: List[str]) -> str:
         """Generate answer using small LLM"""
+        try:
+            return self.generate_answer(query, chunks)
+        except Exception as e:
+            return self.fallback_answer(chunks, e)
+    
+    def generate_answer(self, query: str, chunks: List[str]) -> str:
+        """Generate an answer, raising if the LLM fails"""
         if not chunks:
             return "No relevant information found."
         
-        # Combine top chunks as context
-        context = "\n".join(chunks[:3])  # Use top 3 most relevant chunks
+        prompt = self.build_prompt(query, chunks)
         
-        # Create prompt for the LLM
-        prompt = f"""Context: {context}
-
-Question: {query}
+        # Generate answer using the LLM
+        answer = self.generator.generate(prompt)
+        
+        # Clean up the answer
+        if answer.startswith(prompt):
+            answer = answer[len(prompt):].strip()
+        
+        return answer if answer else "I couldn't generate a relevant answer based on the provided context."
+    
+    def fallback_answer(self, chunks: List[str], error: Exception) -> str:
+        """What to answer when generation failed; never cached"""
+        print(f"Error generating answer: {error}")
+        return f"Error generating answer, but here's the most relevant context: {chunks[0][:200]}..."
 
-Based on the context above, provide a concise answer to the question. If the context doesn't contain relevant information, say so clearly."""
-
-        try:
-            # Generate answer using the LLM
-            response = self.llm(prompt, max_length=150, do_sample=True, temperature=0.7)
-            answer = response[0]['generated_text']
-            
-            # Clean up the answer
-            if answer.startswith(prompt):
-                answer = answer[len(prompt):].strip()
-            
-            return answer if answer else "I couldn't generate a relevant answer based on the provided context."
-            
-        except Exception as e:
-            print(f"Error generating answer: {e}")
-            return f"Error generating answer, but here's the most relevant context: {chunks[0][:200]}..."
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 # Global RAG system instance
 rag_system = RAGSystem()
 
+@app.on_event("startup")
+async def start_model_warm_up():
+    """Load models in the background so the server binds immediately"""
+    threading.Thread(target=rag_system.load_models, name="model-warm-up", daemon=True).start()
+    if rag_system.publisher is not None:
+        threading.Thread(target=rag_system.publish_saved_collections, name="index-publish", daemon=True).start()
+    if rag_system.role == "reader":
+        rag_system.collections.start()
+
+@app.on_event("shutdown")
+async def stop_backends():
+    """Stop embedding worker processes, if the backend started any, and publish pending snapshots"""
+    if rag_system.publisher is not None:
+        rag_system.publisher.flush()
+    if rag_system.embedder is not None:
+        rag_system.embedder.close()
+
+def require_ready():
+    """Reject requests with 503 until the models have finished loading"""
+    if not rag_system.ready:
+        detail = (f"Model loading failed: {rag_system.load_error}" if rag_system.load_error
+                  else "Models are still loading, please retry shortly")
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+def require_writer():
+    """Reject index changes with 403 on reader workers; they go to the writer"""
+    if rag_system.role == "reader":
+        raise HTTPException(status_code=403, detail="This worker serves read-only published indexes; "
+                                                    "send uploads and collection changes to the writer")
+
+def validate_collection(name: str):
+    """Reject collection names that are not safe to use as directory names"""
+    try:
+        CollectionManager.validate_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def pin_snapshots_or_404(collections: List[str]) -> Dict[str, IndexSnapshot]:
+    """Pin the requested collections, turning unknown names into HTTP errors"""
+    if not collections:
+        raise HTTPException(status_code=400, detail="At least one collection is required")
+    for name in collections:
+        validate_collection(name)
+    try:
+        return rag_system.pin_snapshots(collections)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Collection not found: {e.args[0]}")
+
 def get_navigation_html():
     """Common navigation bar for all pages"""
     return """
@@ -217,7 +698,7 @@ async def home_page():
                         <h3>📈 System Status</h3>
                         <p><strong>Status:</strong> ${data.status}</p>
                         <p><strong>Documents Loaded:</strong> ${data.chunks_loaded} chunks</p>
-                        <p><strong>Ready to process queries!</strong></p>
+                        <p><strong>${data.ready ? 'Ready to process queries!' : 'Models are loading, please wait...'}</strong></p>
                     `;
                 })
                 .catch(error => {
@@ -255,6 +736,9 @@ async def docs_page():
                 <p>Upload PDF or CSV files to add them to the knowledge base. The system will process and index your documents for querying.</p>
             </div>
             
+            <h2>🗂️ Collection</h2>
+            <input type="text" id="collection" value="default" placeholder="Collection name" style="width: 100%; padding: 10px; border: 1px solid #ddd; border-radius: 5px; box-sizing: border-box;">
+            
             <h2>📎 Upload PDF File</h2>
             <form id="pdfForm" enctype="multipart/form-data">
                 <input type="file" id="pdfFile" accept=".pdf" required>
@@ -295,7 +779,8 @@ async def docs_page():
                 document.getElementById('pdfResult').innerHTML = '<div class="loading">Uploading and processing PDF...</div>';
                 
                 try {
-                    const response = await fetch('/upload/pdf', {
+                    const collection = document.getElementById('collection').value.trim() || 'default';
+                    const response = await fetch('/upload/pdf?collection=' + encodeURIComponent(collection), {
                         method: 'POST',
                         body: formData
                     });
@@ -329,7 +814,8 @@ async def docs_page():
                 document.getElementById('csvResult').innerHTML = '<div class="loading">Uploading and processing CSV...</div>';
                 
                 try {
-                    const response = await fetch('/upload/csv', {
+                    const collection = document.getElementById('collection').value.trim() || 'default';
+                    const response = await fetch('/upload/csv?collection=' + encodeURIComponent(collection), {
                         method: 'POST',
                         body: formData
                     });
@@ -378,6 +864,12 @@ async def query_page():
             <form id="queryForm">
                 <h2>💬 Your Question:</h2>
                 <textarea id="query" placeholder="Example: 'What is the price of iPhone 15 Pro?' or 'How does AI help with software development?'"></textarea>
+                <input type="text" id="collections" value="default" placeholder="Collections to search (comma-separated)" style="width: 100%; padding: 10px; margin-bottom: 10px; border: 1px solid #ddd; border-radius: 5px; box-sizing: border-box;">
+                <select id="mode" style="width: 100%; padding: 10px; margin-bottom: 10px; border: 1px solid #ddd; border-radius: 5px;">
+                    <option value="vector">Semantic search</option>
+                    <option value="hybrid">Hybrid (keyword + semantic)</option>
+                    <option value="lexical">Keyword candidates, semantic rerank</option>
+                </select>
                 <button type="submit">🔍 Search & Ask</button>
             </form>
             
@@ -413,6 +905,7 @@ async def query_page():
             document.getElementById('queryForm').addEventListener('submit', async function(e) {
                 e.preventDefault();
                 const query = document.getElementById('query').value.trim();
+                const collections = document.getElementById('collections').value.split(',').map(c => c.trim()).filter(c => c);
                 
                 if (!query) {
                     document.getElementById('result').innerHTML = '<div class="error">Please enter a question</div>';
@@ -422,48 +915,83 @@ async def query_page():
                 document.getElementById('result').innerHTML = '<div class="loading">🤖 AI is thinking and searching...</div>';
                 
                 try {
-                    const response = await fetch('/query', {
+                    const response = await fetch('/query/stream', {
                         method: 'POST',
                         headers: {'Content-Type': 'application/json'},
-                        body: JSON.stringify({query: query})
+                        body: JSON.stringify({query: query, collections: collections, mode: document.getElementById('mode').value})
                     });
                     
-                    const data = await response.json();
+                    if (!response.ok) {
+                        const data = await response.json();
+                        document.getElementById('result').innerHTML = '<div class="error">❌ Error: ' + data.detail + '</div>';
+                        return;
+                    }
                     
-                    if (response.ok) {
-                        // Store in history
-                        const queryResult = {
-                            query: query,
-                            answer: data.answer,
-                            chunks: data.relevant_chunks,
-                            timestamp: new Date().toLocaleString()
-                        };
-                        queryHistory.unshift(queryResult);
-                        localStorage.setItem('queryHistory', JSON.stringify(queryHistory.slice(0, 20))); // Keep last 20
-                        
-                        let chunksHtml = '';
-                        data.relevant_chunks.forEach((chunk, i) => {
-                            chunksHtml += '<div class="chunk"><strong>Source ' + (i+1) + ':</strong><br>' + chunk + '</div>';
-                        });
-                        
-                        document.getElementById('result').innerHTML = 
-                            '<div class="result">' +
-                                '<h3>🤖 AI Answer:</h3>' +
-                                '<p style="font-size: 16px; line-height: 1.6; background: white; padding: 15px; border-radius: 5px;">' + data.answer + '</p>' +
-                                '<h3>📋 Relevant Information Found:</h3>' +
-                                '<div style="max-height: 300px; overflow-y: auto;">' +
-                                    chunksHtml +
-                                '</div>' +
-                                '<div style="margin-top: 20px;">' +
-                                    '<a href="/output-page"><button>📊 View All Results</button></a>' +
-                                '</div>' +
-                            '</div>';
+                    document.getElementById('result').innerHTML = 
+                        '<div class="result">' +
+                            '<h3>🤖 AI Answer:</h3>' +
+                            '<p id="answer" style="font-size: 16px; line-height: 1.6; background: white; padding: 15px; border-radius: 5px;"></p>' +
+                            '<h3>📋 Relevant Information Found:</h3>' +
+                            '<div id="chunks" style="max-height: 300px; overflow-y: auto;"></div>' +
+                            '<div style="margin-top: 20px;">' +
+                                '<a href="/output-page"><button>📊 View All Results</button></a>' +
+                            '</div>' +
+                        '</div>';
+                    
+                    // Read server-sent events: chunks first, then answer tokens
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    let answer = '';
+                    let chunks = [];
+                    
+                    while (true) {
+                        const {value, done} = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, {stream: true});
                         
-                        // Clear form
-                        document.getElementById('query').value = '';
-                    } else {
-                        document.getElementById('result').innerHTML = '<div class="error">❌ Error: ' + data.detail + '</div>';
+                        let boundary;
+                        while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {
+                            const raw = buffer.slice(0, boundary);
+                            buffer = buffer.slice(boundary + 2);
+                            
+                            let eventName = 'message';
+                            let payload = '';
+                            raw.split('\\n').forEach(line => {
+                                if (line.startsWith('event: ')) eventName = line.slice(7);
+                                if (line.startsWith('data: ')) payload += line.slice(6);
+                            });
+                            const data = payload ? JSON.parse(payload) : {};
+                            
+                            if (eventName === 'chunks') {
+                                chunks = data.relevant_chunks;
+                                let chunksHtml = '';
+                                chunks.forEach((chunk, i) => {
+                                    chunksHtml += '<div class="chunk"><strong>Source ' + (i+1) + ':</strong><br>' + chunk + '</div>';
+                                });
+                                document.getElementById('chunks').innerHTML = chunksHtml;
+                            } else if (eventName === 'token') {
+                                answer += data.text;
+                                document.getElementById('answer').textContent = answer;
+                            } else if (eventName === 'error') {
+                                answer = answer || data.detail;
+                                document.getElementById('answer').textContent = answer;
+                            }
+                        }
                     }
+                    
+                    // Store in history
+                    const queryResult = {
+                        query: query,
+                        answer: answer,
+                        chunks: chunks,
+                        timestamp: new Date().toLocaleString()
+                    };
+                    queryHistory.unshift(queryResult);
+                    localStorage.setItem('queryHistory', JSON.stringify(queryHistory.slice(0, 20))); // Keep last 20
+                    
+                    // Clear form
+                    document.getElementById('query').value = '';
                 } catch (error) {
                     document.getElementById('result').innerHTML = '<div class="error">❌ Query failed: ' + error.message + '</div>';
                 }
@@ -586,68 +1114,249 @@ async def output_page():
     """
     return html_content
 
-@app.post("/upload/pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Upload and process PDF file"""
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files allowed")
+async def ingest_upload(file: UploadFile, collection: str, response: Response, label: str,
+                        parse: Callable[[str], Tuple[List[str], ChunkMetadata, Optional[Table]]]) -> dict:
+    """Store an upload content-addressed, then parse, embed and index it unless the same bytes were ingested"""
+    validate_collection(collection)
     
-    # Save uploaded file
-    file_path = f"uploads/{file.filename}"
-    os.makedirs("uploads", exist_ok=True)
+    # Stream the file to disk in fixed-size pieces, hashing as it goes
+    try:
+        stored = await save_upload(file, config.UPLOAD_DIR, config.MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    document = {"sha256": stored.sha256, "source": file.filename, "bytes": stored.size}
     
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    store = rag_system.collections.get(collection, create=True)
+    if stored.sha256 in store.current().documents:
+        return duplicate_upload_response(label, collection, store.current(), document)
     
     try:
-        # Process PDF
-        chunks = rag_system.process_pdf(file_path)
-        rag_system.create_embeddings(chunks)
-        
-        return {"message": f"PDF processed successfully. {len(chunks)} chunks created."}
+        # Build the next snapshot off the event loop; queries keep using the current one
+        timer = StageTimer(INGEST_STAGE_SECONDS)
+        with timer.stage("parse"):
+            chunks, metadata, table = await run_in_threadpool(parse, stored.path)
+        document.update(chunks=len(chunks), ingested_at=time.time())
+        snapshot, plan = await run_in_threadpool(rag_system.create_embeddings, chunks, metadata, collection,
+                                                 timer, document, table)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing {label}: {str(e)}")
+    
+    if plan.document_exists:
+        # An identical upload finished first
+        return duplicate_upload_response(label, collection, snapshot, document)
+    record_ingestion(label.lower(), plan)
+    response.headers["Server-Timing"] = timer.server_timing()
+    return {
+        "message": f"{label} processed successfully. {len(chunks)} chunks created, {len(plan.new_positions)} new after deduplication.",
+        "collection": collection,
+        "snapshot_version": snapshot.version,
+        "sha256": stored.sha256,
+        "duplicate_document": False,
+        "new_chunks": len(plan.new_positions),
+        "exact_duplicates": plan.exact_duplicates,
+        "near_duplicates": plan.near_duplicates,
+        "timings": timer.as_ms()
+    }
 
-@app.post("/upload/csv")
-async def upload_csv(file: UploadFile = File(...)):
-    """Upload and process CSV file"""
+def duplicate_upload_response(label: str, collection: str, snapshot: IndexSnapshot, document: dict) -> dict:
+    """Response for a file whose exact bytes are already in the collection"""
+    DUPLICATE_UPLOADS.labels(type=label.lower()).inc()
+    previous = snapshot.documents[document["sha256"]]
+    return {
+        "message": f"{label} already ingested as '{previous['source']}', skipped extraction and embedding.",
+        "collection": collection,
+        "snapshot_version": snapshot.version,
+        "sha256": document["sha256"],
+        "duplicate_document": True,
+        "new_chunks": 0,
+        "exact_duplicates": 0,
+        "near_duplicates": 0,
+        "timings": {}
+    }
+
+@app.post("/upload/pdf", dependencies=[Depends(require_writer), Depends(require_ready)])
+async def upload_pdf(response: Response, file: UploadFile = File(...),
+                     collection: str = Query(config.DEFAULT_COLLECTION)):
+    """Upload and process PDF file into a collection"""
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files allowed")
+    
+    def parse(path: str) -> Tuple[List[str], ChunkMetadata, Optional[Table]]:
+        chunks, pages = rag_system.process_pdf(path)
+        return chunks, ChunkMetadata.for_document(file.filename, len(chunks), pages=pages), None
+    
+    return await ingest_upload(file, collection, response, "PDF", parse)
+
+@app.post("/upload/csv", dependencies=[Depends(require_writer), Depends(require_ready)])
+async def upload_csv(response: Response, file: UploadFile = File(...),
+                     collection: str = Query(config.DEFAULT_COLLECTION)):
+    """Upload and process CSV file into a collection"""
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files allowed")
     
-    # Save uploaded file
-    file_path = f"uploads/{file.filename}"
-    os.makedirs("uploads", exist_ok=True)
+    def parse(path: str) -> Tuple[List[str], ChunkMetadata, Optional[Table]]:
+        # Keep a typed copy of the table next to the row chunks
+        df = pd.read_csv(path)
+        chunks, rows = rag_system.chunk_dataframe(df)
+        uploaded_at = time.time()
+        return (chunks, ChunkMetadata.for_document(file.filename, len(chunks), rows=rows, uploaded_at=uploaded_at),
+                Table.from_dataframe(df, file.filename, uploaded_at))
     
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
-    
-    try:
-        # Process CSV
-        chunks = rag_system.process_csv(file_path)
-        rag_system.create_embeddings(chunks)
-        
-        return {"message": f"CSV processed successfully. {len(chunks)} chunks created."}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
+    return await ingest_upload(file, collection, response, "CSV", parse)
 
-@app.post("/query", response_model=QueryResponse)
-async def query_rag(request: QueryRequest):
+@app.post("/query", response_model=QueryResponse, dependencies=[Depends(require_ready)])
+async def query_rag(request: QueryRequest, response: Response):
     """Query the RAG system"""
+    snapshots = pin_snapshots_or_404(request.collections)
     try:
-        result = rag_system.query(request.query)
+        # Run in the threadpool so concurrent queries can be batched together
+        filters = request.filter.to_mask_kwargs() if request.filter else None
+        timer = StageTimer(QUERY_STAGE_SECONDS)
+        result = await run_in_threadpool(rag_system.query, request.query, snapshots, 3, filters, request.mode, timer)
+        response.headers["Server-Timing"] = timer.server_timing()
         return QueryResponse(
             answer=result["answer"],
-            relevant_chunks=result["relevant_chunks"]
+            relevant_chunks=result["relevant_chunks"],
+            sources=result["sources"],
+            snapshot_versions=result["snapshot_versions"],
+            timings=result["timings"] if request.include_timings else None,
+            cache=result["cache"],
+            table_query=result["table_query"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/query/stream", dependencies=[Depends(require_ready)])
+async def query_rag_stream(request: StreamQueryRequest):
+    """Stream retrieved chunks and then answer tokens as server-sent events"""
+    snapshots = pin_snapshots_or_404(request.collections)
+    return StreamingResponse(
+        rag_system.stream_query(
+            request.query, snapshots,
+            filters=request.filter.to_mask_kwargs() if request.filter else None,
+            mode=request.mode,
+            greedy=request.greedy,
+            include_timings=request.include_timings
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/collections")
+async def list_collections():
+    """List collections with their size and memory usage"""
+    return {"collections": rag_system.collections.stats()}
+
+@app.post("/collections/{name}/load", dependencies=[Depends(require_writer)])
+async def load_collection(name: str):
+    """Load a collection's saved index into memory"""
+    validate_collection(name)
+    try:
+        store = await run_in_threadpool(rag_system.collections.load, name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Collection not found: {name}")
+    return {"message": f"Collection '{name}' loaded", "snapshot_version": store.current().version}
+
+@app.post("/collections/{name}/unload", dependencies=[Depends(require_writer)])
+async def unload_collection(name: str):
+    """Save a collection to disk and free its memory"""
+    validate_collection(name)
+    if not await run_in_threadpool(rag_system.collections.unload, name):
+        raise HTTPException(status_code=404, detail=f"Collection not found: {name}")
+    return {"message": f"Collection '{name}' unloaded"}
+
+@app.get("/collections/{name}/documents")
+async def list_documents(name: str):
+    """List the documents ingested into a collection, keyed by content hash"""
+    snapshot = pin_snapshots_or_404([name])[name]
+    return {"collection": name, "snapshot_version": snapshot.version, "documents": dict(snapshot.documents)}
+
+@app.delete("/collections/{name}/documents/{sha256}", dependencies=[Depends(require_writer)])
+async def delete_document(name: str, sha256: str):
+    """Delete a document; its chunks drop out of search results immediately"""
+    validate_collection(name)
+    try:
+        snapshot = await run_in_threadpool(rag_system.delete_document, name, sha256)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Document {sha256} not found in collection '{name}'")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "message": f"Document {sha256} deleted from '{name}'",
+        "snapshot_version": snapshot.version,
+        "deleted_chunks": snapshot.deleted_count,
+        "chunks": snapshot.size
+    }
+
+@app.get("/collections/{name}/export", dependencies=[Depends(require_ready)])
+async def export_collection(name: str):
+    """Download a collection as one checksummed archive: vectors, compressed chunk texts and metadata"""
+    snapshot = pin_snapshots_or_404([name])[name]
+    return StreamingResponse(
+        archive_pieces(snapshot, name, rag_system.embedding_identity()),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{name}-v{snapshot.version}.ragkb"'}
+    )
+
+@app.post("/collections/{name}/import", dependencies=[Depends(require_writer), Depends(require_ready)])
+async def import_collection(name: str, file: UploadFile = File(...)):
+    """Load an exported archive into a new or empty collection without re-embedding"""
+    validate_collection(name)
+    store = rag_system.collections.get(name)
+    if store is not None and store.current().size:
+        raise HTTPException(status_code=409, detail=f"Collection '{name}' is not empty")
+    try:
+        manifest, snapshot = await run_in_threadpool(rag_system.import_archive, name, file.file)
+    except ModelMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "message": f"Imported {manifest['chunks']} chunks into '{name}'",
+        "collection": name,
+        "snapshot_version": snapshot.version,
+        "documents": len(snapshot.documents),
+        "exported_from": manifest["collection"]
+    }
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "chunks_loaded": len(rag_system.chunks)}
+    """Health check endpoint with separate liveness and readiness"""
+    return {
+        "status": "healthy" if rag_system.ready else ("failed" if rag_system.load_error else "starting"),
+        "live": True,
+        "ready": rag_system.ready,
+        "load_error": rag_system.load_error,
+        "role": rag_system.role,
+        "chunks_loaded": sum(store.current().size for store in rag_system.collections.loaded().values()),
+        "collections": rag_system.collections.stats(),
+        "backends": {"embedding": type(rag_system.embedder).__name__ if rag_system.embedder else None,
+                     "generation": type(rag_system.llm).__name__ if rag_system.llm else None,
+                     "quantized_int8": {"embedding": bool(rag_system.embedder and rag_system.embedder.quantized),
+                                        "generation": bool(rag_system.llm and rag_system.llm.quantized)},
+                     "inference_threads": config.INFERENCE_THREADS or None},
+        "generation": rag_system.generator.stats() if rag_system.generator else None,
+        "answer_cache": rag_system.answer_cache.stats()
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, ingestion counters and index sizes"""
+    update_index_gauges(await run_in_threadpool(rag_system.collections.stats))
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe - the process is up and serving"""
+    return {"live": True}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe - 503 until models are loaded and warmed up"""
+    require_ready()
+    return {"ready": True}
 
 if __name__ == "__main__":
     import uvicorn
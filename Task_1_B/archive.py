@@ -0,0 +1,334 @@
+# archive.py - Checksummed single-file export and import of a collection, without re-embedding
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import struct
+import sys
+import time
+import zlib
+from types import MappingProxyType
+from typing import BinaryIO, Dict, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from metadata import ChunkMetadata
+from tables import Table
+
+# Layout: MAGIC, manifest length (uint32 LE), sha256 of the manifest, the JSON
+# manifest, then each section's bytes in manifest order. The manifest lists
+# every section with its length and sha256, so a reader can stream the
+# sections in fixed-size pieces and verify each one as it goes.
+MAGIC = b"RAGKB\x00\x01\n"
+FORMAT_VERSION = 1
+PIECE_BYTES = 1024 * 1024
+MAX_SECTION_BYTES = 1024 * 1024 * 1024
+REQUIRED_SECTIONS = ("chunk_offsets", "chunk_text", "chunk_ids", "source_ids", "pages", "rows", "uploaded_at",
+                     "catalog", "tables")
+
+
+class ArchiveError(Exception):
+    """The file is not a readable archive: bad header, truncated, or a checksum mismatch"""
+
+
+class ModelMismatch(ArchiveError):
+    """The archive's vectors come from a different embedding model than the one loaded"""
+
+
+class Section:
+    """One named part of an archive: a raw numpy array, or zlib-compressed bytes"""
+
+    def __init__(self, name: str, data: bytes = b"", array: Optional[np.ndarray] = None):
+        self.name = name
+        if array is not None:
+            self.array = np.ascontiguousarray(array)
+            self.entry = {"name": name, "encoding": "raw", "dtype": self.array.dtype.str,
+                          "shape": list(self.array.shape)}
+            self.payload = memoryview(self.array).cast('B')
+        else:
+            self.entry = {"name": name, "encoding": "zlib", "raw_bytes": len(data)}
+            self.payload = memoryview(zlib.compress(data, 6))
+        self.entry["bytes"] = len(self.payload)
+        self.entry["sha256"] = hashlib.sha256(self.payload).hexdigest()
+
+    def pieces(self) -> Iterator[bytes]:
+        for start in range(0, len(self.payload), PIECE_BYTES):
+            yield bytes(self.payload[start:start + PIECE_BYTES])
+
+
+def _live_contents(snapshot) -> Tuple[List[str], Optional[np.ndarray], ChunkMetadata]:
+    """Chunks, embeddings and metadata with tombstoned chunks left out and ids renumbered"""
+    if snapshot.live is None:
+        return list(snapshot.chunks), snapshot.embeddings, snapshot.metadata
+    live_ids = np.flatnonzero(snapshot.live)
+    new_ids = np.cumsum(snapshot.live, dtype='int32') - 1
+    embeddings = snapshot.embeddings[live_ids] if snapshot.embeddings is not None else None
+    return ([snapshot.chunks[i] for i in live_ids], embeddings,
+            snapshot.metadata.with_chunk_ids(new_ids[snapshot.metadata.chunk_ids]))
+
+
+def _encode_tables(tables: Mapping[str, Table]) -> bytes:
+    """The tables in save_tables' layout, as one uncompressed npz plus its JSON index"""
+    buffer = io.BytesIO()
+    arrays, index = {}, {}
+    for key, table in tables.items():
+        columns = list(table.columns)
+        arrays[f"{key}/rows"] = table.rows
+        arrays.update({f"{key}/column_{i}": table.columns[name] for i, name in enumerate(columns)})
+        index[key] = {"source": table.source, "columns": columns,
+                      "kinds": [table.kinds[name] for name in columns], "uploaded_at": table.uploaded_at}
+    np.savez(buffer, **arrays)
+    return json.dumps(index).encode('utf-8') + b"\n" + buffer.getvalue()
+
+
+def _decode_tables(data: bytes) -> Dict[str, Table]:
+    index_line, npz = data.split(b"\n", 1)
+    index = json.loads(index_line)
+    tables = {}
+    with np.load(io.BytesIO(npz)) as arrays:
+        for key, entry in index.items():
+            columns = {name: arrays[f"{key}/column_{i}"] for i, name in enumerate(entry["columns"])}
+            tables[key] = Table(source=entry["source"], columns=MappingProxyType(columns),
+                                kinds=MappingProxyType(dict(zip(entry["columns"], entry["kinds"]))),
+                                rows=arrays[f"{key}/rows"], uploaded_at=entry["uploaded_at"])
+    return tables
+
+
+def archive_pieces(snapshot, collection: str, embedding: dict) -> Iterator[bytes]:
+    """Serialize a snapshot's live contents as an archive, yielded in pieces for streaming.
+
+    `embedding` identifies the vectors' model ({"model", "dimension"}); an
+    import refuses the archive unless its own model matches. Vectors are
+    stored as raw float32, chunk texts and JSON as zlib. The lexical index,
+    dedup signatures and any PCA projection are rebuilt on import.
+    """
+    chunks, embeddings, metadata = _live_contents(snapshot)
+    encoded = [chunk.encode('utf-8') for chunk in chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    offsets[1:] = np.cumsum([len(chunk) for chunk in encoded])
+
+    sections = []
+    if embeddings is not None:
+        sections.append(Section("embeddings", array=np.asarray(embeddings, dtype='<f4')))
+    sections += [
+        Section("chunk_offsets", array=offsets),
+        Section("chunk_text", b"".join(encoded)),
+        Section("chunk_ids", array=metadata.chunk_ids.astype('<i4')),
+        Section("source_ids", array=metadata.source_ids.astype('<i4')),
+        Section("pages", array=metadata.pages.astype('<i4')),
+        Section("rows", array=metadata.rows.astype('<i4')),
+        Section("uploaded_at", array=metadata.uploaded_at.astype('<f8')),
+        Section("catalog", json.dumps({"sources": list(metadata.sources),
+                                       "documents": dict(snapshot.documents)}).encode('utf-8')),
+        Section("tables", _encode_tables(snapshot.tables))
+    ]
+    manifest = json.dumps({
+        "format": FORMAT_VERSION,
+        "created_at": time.time(),
+        "collection": collection,
+        "snapshot_version": snapshot.version,
+        "chunks": len(chunks),
+        "embedding": embedding,
+        "sections": [section.entry for section in sections]
+    }).encode('utf-8')
+
+    yield MAGIC + struct.pack('<I', len(manifest)) + hashlib.sha256(manifest).digest() + manifest
+    for section in sections:
+        yield from section.pieces()
+
+
+def write_archive(snapshot, collection: str, embedding: dict, path: str) -> int:
+    """Write an archive file; returns its size in bytes"""
+    size = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        for piece in archive_pieces(snapshot, collection, embedding):
+            out.write(piece)
+            size += len(piece)
+    os.replace(tmp_path, path)
+    return size
+
+
+def _read_exactly(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise ArchiveError("Archive is truncated")
+    return data
+
+
+def read_manifest(stream: BinaryIO) -> dict:
+    """Read and verify the header; the stream is left at the first section"""
+    if _read_exactly(stream, len(MAGIC)) != MAGIC:
+        raise ArchiveError("Not a knowledge-base archive")
+    (length,) = struct.unpack('<I', _read_exactly(stream, 4))
+    digest = _read_exactly(stream, 32)
+    manifest = _read_exactly(stream, length)
+    if hashlib.sha256(manifest).digest() != digest:
+        raise ArchiveError("Archive manifest checksum mismatch")
+    try:
+        manifest = json.loads(manifest)
+    except ValueError:
+        raise ArchiveError("Archive manifest is not valid JSON")
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ArchiveError(f"Unsupported archive format {manifest.get('format')}")
+    return manifest
+
+
+def _check_size(entry: dict, size, max_bytes: int):
+    if not isinstance(size, int) or size < 0:
+        raise ArchiveError(f"Section '{entry['name']}' has an invalid size")
+    if size > max_bytes:
+        raise ArchiveError(f"Section '{entry['name']}' exceeds the {max_bytes} byte section limit")
+
+
+def _read_section(stream: BinaryIO, entry: dict, max_bytes: int):
+    """Stream one section in fixed-size pieces, checking its length and sha256.
+
+    Raw arrays are copied piece by piece into their final buffer; compressed
+    sections are inflated piece by piece. Nothing is allocated for a section
+    whose stored or inflated size exceeds `max_bytes`, or whose raw shape
+    doesn't account for exactly its stored bytes.
+    """
+    digest = hashlib.sha256()
+    remaining = entry["bytes"]
+    _check_size(entry, remaining, max_bytes)
+    if entry["encoding"] == "raw":
+        try:
+            dtype = np.dtype(entry["dtype"])
+            shape = tuple(entry["shape"])
+        except TypeError:
+            raise ArchiveError(f"Section '{entry['name']}' has an invalid dtype or shape")
+        if not all(isinstance(n, int) and n >= 0 for n in shape):
+            raise ArchiveError(f"Section '{entry['name']}' has an invalid shape")
+        if math.prod(shape) * dtype.itemsize != remaining:
+            raise ArchiveError(f"Section '{entry['name']}' has the wrong size for its shape")
+        array = np.empty(shape, dtype=dtype)
+        target = memoryview(array).cast('B')
+        position = 0
+        while remaining:
+            piece = stream.read(min(PIECE_BYTES, remaining))
+            if not piece:
+                raise ArchiveError("Archive is truncated")
+            digest.update(piece)
+            target[position:position + len(piece)] = piece
+            position += len(piece)
+            remaining -= len(piece)
+        result = array
+    else:
+        raw_bytes = entry.get("raw_bytes")
+        _check_size(entry, raw_bytes, max_bytes)
+        inflater = zlib.decompressobj()
+        parts = []
+        inflated = 0
+        while remaining:
+            piece = stream.read(min(PIECE_BYTES, remaining))
+            if not piece:
+                raise ArchiveError("Archive is truncated")
+            digest.update(piece)
+            try:
+                # One byte past raw_bytes is enough to tell the section inflates too far
+                parts.append(inflater.decompress(piece, raw_bytes - inflated + 1))
+            except zlib.error:
+                raise ArchiveError(f"Section '{entry['name']}' is corrupt")
+            inflated += len(parts[-1])
+            if inflated > raw_bytes:
+                raise ArchiveError(f"Section '{entry['name']}' inflates past its recorded size")
+            remaining -= len(piece)
+        parts.append(inflater.flush())
+        result = b"".join(parts)
+        if len(result) != raw_bytes:
+            raise ArchiveError(f"Section '{entry['name']}' inflates past its recorded size")
+    if digest.hexdigest() != entry["sha256"]:
+        raise ArchiveError(f"Checksum mismatch in section '{entry['name']}'")
+    return result
+
+
+def check_model(manifest: dict, model_id: str, dimension: Optional[int] = None):
+    """Raise ModelMismatch unless the archive's vectors come from the given embedding model"""
+    embedding = manifest["embedding"]
+    dimensions = (embedding["dimension"], dimension)
+    if embedding["model"] != model_id or (None not in dimensions and dimensions[0] != dimensions[1]):
+        raise ModelMismatch(
+            f"Archive was embedded with '{embedding['model']}' ({embedding['dimension']} dims), "
+            f"but this server uses '{model_id}'" + (f" ({dimension} dims)" if dimension is not None else ""))
+
+
+def read_archive(stream: BinaryIO, model_id: str, dimension: Optional[int] = None,
+                 max_section_bytes: int = MAX_SECTION_BYTES) -> Tuple[dict, dict]:
+    """Verify and decode an archive into (manifest, contents) for SnapshotStore.restore.
+
+    The embedding model is checked before any section is read, and no section
+    may store or inflate to more than `max_section_bytes`.
+    """
+    manifest = read_manifest(stream)
+    check_model(manifest, model_id, dimension)
+    sections = {entry["name"]: _read_section(stream, entry, max_section_bytes) for entry in manifest["sections"]}
+    missing = set(REQUIRED_SECTIONS) - set(sections)
+    if missing:
+        raise ArchiveError(f"Archive is missing sections: {', '.join(sorted(missing))}")
+
+    data, offsets = sections["chunk_text"], sections["chunk_offsets"]
+    if len(offsets) != manifest["chunks"] + 1 or offsets[-1] != len(data):
+        raise ArchiveError("Chunk offsets don't match the chunk text")
+    chunks = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(manifest["chunks"])]
+    catalog = json.loads(sections["catalog"])
+    metadata = ChunkMetadata(
+        sources=tuple(catalog["sources"]),
+        chunk_ids=sections["chunk_ids"].astype('int32'),
+        source_ids=sections["source_ids"].astype('int32'),
+        pages=sections["pages"].astype('int32'),
+        rows=sections["rows"].astype('int32'),
+        uploaded_at=sections["uploaded_at"].astype('float64')
+    )
+    embeddings = sections.get("embeddings")
+    if embeddings is not None:
+        embeddings = embeddings.astype('float32', copy=False)
+        if len(embeddings) != len(chunks):
+            raise ArchiveError("Archive has a different number of vectors and chunks")
+    return manifest, {
+        "version": manifest["snapshot_version"],
+        "chunks": chunks,
+        "embeddings": embeddings,
+        "metadata": metadata,
+        "documents": catalog["documents"],
+        "tables": _decode_tables(sections["tables"])
+    }
+
+
+def main():
+    """Export a saved collection to an archive, or import one as a saved collection, offline"""
+    import config
+    from backends import embedding_model_id
+    from index_store import CollectionManager
+
+    parser = argparse.ArgumentParser(description="Export or import a collection as a checksummed archive")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("collection")
+    parser.add_argument("path", help="Archive file to write or read")
+    parser.add_argument("--collections-dir", default=config.COLLECTIONS_DIR)
+    args = parser.parse_args()
+
+    model_id = embedding_model_id(config.EMBEDDING_BACKEND, config.EMBEDDING_MODEL, config.EMBEDDING_POOL_BACKEND)
+    collections = CollectionManager(args.collections_dir, config.DEDUP_NEAR_THRESHOLD)
+    try:
+        if args.command == "export":
+            snapshot = collections.load(args.collection).current()
+            dimension = snapshot.embeddings.shape[1] if snapshot.embeddings is not None else None
+            size = write_archive(snapshot, args.collection, {"model": model_id, "dimension": dimension}, args.path)
+            print(f"Exported '{args.collection}' ({snapshot.size} chunks) to {args.path}: {size} bytes")
+        else:
+            with open(args.path, "rb") as f:
+                manifest, contents = read_archive(f, model_id, max_section_bytes=config.MAX_ARCHIVE_BYTES)
+            collections.restore(args.collection, contents)
+            collections.unload(args.collection)
+            print(f"Imported {manifest['chunks']} chunks into '{args.collection}' under {args.collections_dir}")
+    except KeyError:
+        sys.exit(f"Collection not found: {args.collection}")
+    except (ArchiveError, ValueError) as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# backends.py - Pluggable embedding and generation backends
+import hashlib
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+
+from generation import stream_generate
+from lexical import tokenize
+
+
+class Embedder(ABC):
+    """Turns chunks and queries into float32 vectors.
+
+    `tokenizer` is used by the chunker to size chunks in the embedder's own
+    tokens.
+    """
+    tokenizer = None
+    dimension: int
+    model_id: str  # Names the vector space; vectors from different models can't be mixed
+    quantized = False  # Running dynamic int8 quantized layers
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Return a (len(texts), dimension) float32 array"""
+
+    def close(self):
+        """Release worker processes or other resources"""
+
+
+class Generator(ABC):
+    """Produces answers from prompts, batched or streamed.
+
+    `tokenizer` is used by the context packer to fit prompts into the
+    model's input budget.
+    """
+    tokenizer = None
+    quantized = False
+
+    @abstractmethod
+    def generate_batch(self, prompts: List[str], **generate_kwargs) -> List[str]:
+        """Return one answer per prompt"""
+
+    @abstractmethod
+    def stream(self, prompt: str, max_length: int = 150, greedy: bool = False,
+               temperature: float = 0.7) -> Iterator[str]:
+        """Yield pieces of one answer as they are produced"""
+
+
+def configure_torch_threads(threads: int):
+    """Size PyTorch's intra-op thread pool; 0 keeps torch's default of one thread per core"""
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def quantize_linear_layers(model):
+    """Convert a model's nn.Linear layers to dynamic int8 quantization, in place, for CPU inference.
+
+    Weights are stored as int8 and activations are quantized per batch at
+    run time, so no calibration data is needed. Linear layers hold nearly all
+    of MiniLM's and flan-t5's weights and compute.
+    """
+    import torch
+    if 'fbgemm' not in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = 'qnnpack'  # ARM CPUs
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """A sentence-transformers model running in this process, optionally int8-quantized on CPU"""
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', quantize: bool = False):
+        from sentence_transformers import SentenceTransformer
+        # Quantized kernels only run on CPU
+        self.model = SentenceTransformer(model_name, device='cpu' if quantize else None)
+        if quantize:
+            quantize_linear_layers(self.model)
+        self.quantized = quantize
+        self.model_id = model_name
+        self.tokenizer = self.model.tokenizer
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts), dtype='float32')
+
+
+class EncoderPoolEmbedder(Embedder):
+    """Spreads large encode batches over embedding worker processes.
+
+    Each worker holds its own copy of the model and returns vectors through
+    shared memory (see embedding_workers.py), so ingestion scales with cores
+    while the API process stays free to serve queries. Batches smaller than
+    `min_pool_batch` (such as single queries) are encoded by a local model
+    copy, where the round trip to the workers would cost more than the
+    encoding itself.
+    """
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', workers: int = 2, min_pool_batch: int = 64,
+                 worker_backend: str = 'sentence-transformers', quantize: bool = False, threads: int = 0):
+        from embedding_workers import SharedMemoryWorkerPool
+        if worker_backend == 'pool':
+            raise ValueError("Pool workers need a single-process backend such as sentence-transformers")
+        self.local = create_embedder(worker_backend, model_name, quantize=quantize)
+        self.tokenizer = self.local.tokenizer
+        self.dimension = self.local.dimension
+        self.model_id = self.local.model_id
+        self.quantized = quantize
+        self.min_pool_batch = min_pool_batch
+        # `threads` is the node's inference budget; split it so workers don't oversubscribe the cores
+        worker_threads = max(1, threads // max(1, workers)) if threads > 0 else 0
+        self.pool = SharedMemoryWorkerPool(worker_backend, model_name, workers=workers, batch_size=min_pool_batch,
+                                           quantize=quantize, threads=worker_threads)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if len(texts) < self.min_pool_batch:
+            return self.local.encode(texts)
+        return self.pool.encode(texts)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        self.local.close()
+
+
+class WordTokenizer:
+    """Whitespace tokenizer with the call/decode surface of a transformers tokenizer.
+
+    Ids are assigned to words as they are first seen, so counts are exact and
+    `decode` round-trips. Used by the offline backends.
+    """
+    EOS_ID = 1
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._words: List[str] = ['<pad>', '</s>']
+        self._lock = threading.Lock()
+
+    def _word_id(self, word: str) -> int:
+        word_id = self._ids.get(word)
+        if word_id is None:
+            with self._lock:
+                word_id = self._ids.setdefault(word, len(self._words))
+                if word_id == len(self._words):
+                    self._words.append(word)
+        return word_id
+
+    def __call__(self, texts: Union[str, List[str]], add_special_tokens: bool = True, **kwargs) -> dict:
+        single = isinstance(texts, str)
+        encoded = []
+        for text in [texts] if single else texts:
+            ids = [self._word_id(word) for word in text.split()]
+            if add_special_tokens:
+                ids.append(self.EOS_ID)
+            encoded.append(ids)
+        return {"input_ids": encoded[0] if single else encoded}
+
+    def decode(self, ids: List[int], skip_special_tokens: bool = True) -> str:
+        return ' '.join(self._words[i] for i in ids if not (skip_special_tokens and i <= self.EOS_ID))
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic bag-of-words vectors from hashed tokens, for offline tests and benchmarks.
+
+    Each token adds +/-1 to one of `dimension` buckets chosen by a stable
+    hash, and vectors are L2-normalized. Texts sharing words land close
+    together, which is enough to exercise retrieval without model weights.
+    """
+
+    model_id = 'hashing'
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.tokenizer = WordTokenizer()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+                vectors[row, digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class TransformersGenerator(Generator):
+    """A Hugging Face text2text-generation pipeline such as flan-t5, optionally int8-quantized on CPU"""
+
+    def __init__(self, model_name: str = 'google/flan-t5-small', quantize: bool = False):
+        import torch
+        from transformers import pipeline
+        self.pipeline = pipeline(
+            "text2text-generation",
+            model=model_name,
+            device=0 if torch.cuda.is_available() and not quantize else -1
+        )
+        if quantize:
+            quantize_linear_layers(self.pipeline.model)
+        self.quantized = quantize
+        self.tokenizer = self.pipeline.tokenizer
+
+    def generate_batch(self, prompts: List[str], **generate_kwargs) -> List[str]:
+        outputs = self.pipeline(prompts, batch_size=len(prompts), **generate_kwargs)
+        # The pipeline returns one list per prompt when given a list input
+        return [(output[0] if isinstance(output, list) else output)['generated_text'] for output in outputs]
+
+    def stream(self, prompt: str, max_length: int = 150, greedy: bool = False,
+               temperature: float = 0.7) -> Iterator[str]:
+        return stream_generate(self.pipeline, prompt, max_length=max_length, greedy=greedy,
+                               temperature=temperature)
+
+
+_CONTEXT = re.compile(r'Context:(.*?)\n\nQuestion:', re.DOTALL)
+_FIRST_SENTENCE = re.compile(r'\s*(.+?[.!?])(?:\s|$)', re.DOTALL)
+
+
+class TemplateGenerator(Generator):
+    """Answers with the first sentence of the prompt's context, for offline tests and benchmarks.
+
+    Output depends only on the prompt, so results are reproducible and the
+    cost of generation is close to zero.
+    """
+
+    def __init__(self):
+        self.tokenizer = WordTokenizer()
+
+    def answer(self, prompt: str) -> str:
+        match = _CONTEXT.search(prompt)
+        context = match.group(1).strip() if match else ''
+        if not context:
+            return "The context doesn't contain relevant information."
+        sentence = _FIRST_SENTENCE.match(context)
+        return sentence.group(1) if sentence else context.splitlines()[0]
+
+    def generate_batch(self, prompts: List[str], **generate_kwargs) -> List[str]:
+        return [self.answer(prompt) for prompt in prompts]
+
+    def stream(self, prompt: str, max_length: int = 150, greedy: bool = False,
+               temperature: float = 0.7) -> Iterator[str]:
+        words = self.answer(prompt).split(' ')
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + ' '
+
+
+EMBEDDING_BACKENDS = ('sentence-transformers', 'pool', 'hashing')
+GENERATION_BACKENDS = ('transformers', 'template')
+
+
+def create_embedder(backend: str, model_name: str = 'all-MiniLM-L6-v2', pool_workers: int = 2,
+                    pool_backend: str = 'sentence-transformers', quantize: bool = False,
+                    threads: int = 0) -> Embedder:
+    """`quantize` and `threads` apply to torch-based backends; the offline ones ignore them"""
+    if backend == 'sentence-transformers':
+        return SentenceTransformerEmbedder(model_name, quantize=quantize)
+    if backend == 'pool':
+        return EncoderPoolEmbedder(model_name, workers=pool_workers, worker_backend=pool_backend,
+                                   quantize=quantize, threads=threads)
+    if backend == 'hashing':
+        return HashingEmbedder()
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}")
+
+
+def embedding_model_id(backend: str, model_name: str, pool_backend: str = 'sentence-transformers') -> str:
+    """The model_id of the embedder create_embedder would build, without loading it"""
+    if backend == 'pool':
+        backend = pool_backend
+    return HashingEmbedder.model_id if backend == 'hashing' else model_name
+
+
+def create_generator(backend: str, model_name: str = 'google/flan-t5-small', quantize: bool = False) -> Generator:
+    if backend == 'transformers':
+        return TransformersGenerator(model_name, quantize=quantize)
+    if backend == 'template':
+        return TemplateGenerator()
+    raise ValueError(f"Unknown generation backend '{backend}', expected one of {', '.join(GENERATION_BACKENDS)}")
@@ -0,0 +1,200 @@
+# benchmark.py - End-to-end ingestion and query benchmarks for the RAG pipeline
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+import config
+import synthetic_corpus
+from answer_cache import AnswerCache
+from app import RAGSystem
+from backends import EncoderPoolEmbedder, HashingEmbedder, TemplateGenerator
+from metadata import ChunkMetadata
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(samples_ms: List[float]) -> dict:
+    values = np.asarray(samples_ms, dtype='float64')
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
+
+
+def create_system(backend: str, collections_dir: str, embedding_workers: int = 0,
+                  answer_cache: bool = False) -> RAGSystem:
+    """A RAGSystem loaded synchronously with offline stubs or the configured models"""
+    # Queries repeat across measurements, so the answer cache would hide the pipeline unless asked for
+    cache = None if answer_cache else AnswerCache(max_entries=0, semantic_entries=0)
+    if backend == "offline":
+        embedder = HashingEmbedder()
+        if embedding_workers:
+            embedder = EncoderPoolEmbedder(workers=embedding_workers, worker_backend="hashing")
+        rag = RAGSystem(embedder, TemplateGenerator(), collections_dir=collections_dir, answer_cache=cache)
+    else:
+        rag = RAGSystem(collections_dir=collections_dir, answer_cache=cache)
+    rag.load_models()
+    if not rag.ready:
+        raise RuntimeError(f"Backends failed to load: {rag.load_error}")
+    return rag
+
+
+def bench_ingestion(rag: RAGSystem, data_dir: str, pages: int, rows: int, seed: int) -> dict:
+    """Time parsing, chunking, dedup, embedding and publishing of one PDF and one CSV"""
+    pdf_path = os.path.join(data_dir, f"synthetic_{pages}p.pdf")
+    csv_path = os.path.join(data_dir, f"synthetic_{rows}r.csv")
+    pdf_bytes = synthetic_corpus.write_pdf(pdf_path, pages, seed)
+    csv_bytes = synthetic_corpus.write_csv(csv_path, rows, seed)
+
+    results = {}
+    for kind, path, size, units in (("pdf", pdf_path, pdf_bytes, pages), ("csv", csv_path, csv_bytes, rows)):
+        start = time.perf_counter()
+        if kind == "pdf":
+            chunks, page_numbers = rag.process_pdf(path)
+            metadata = ChunkMetadata.for_document(os.path.basename(path), len(chunks), pages=page_numbers)
+        else:
+            chunks, row_numbers = rag.process_csv(path)
+            metadata = ChunkMetadata.for_document(os.path.basename(path), len(chunks), rows=row_numbers)
+        parsed = time.perf_counter()
+        _, plan = rag.create_embeddings(chunks, metadata)
+        elapsed = time.perf_counter() - start
+
+        results[kind] = {
+            "pages" if kind == "pdf" else "rows": units,
+            "bytes": size,
+            "chunks": len(chunks),
+            "new_chunks": len(plan.new_positions),
+            "parse_s": round(parsed - start, 4),
+            "embed_and_index_s": round(elapsed - (parsed - start), 4),
+            "total_s": round(elapsed, 4),
+            ("pages_per_s" if kind == "pdf" else "rows_per_s"): round(units / elapsed, 2),
+            "chunks_per_s": round(len(chunks) / elapsed, 2),
+            "mb_per_s": round(size / (1024 * 1024) / elapsed, 3)
+        }
+    return results
+
+
+def bench_stages(rag: RAGSystem, queries: List[str], top_k: int) -> dict:
+    """Sequential per-stage latency: query embedding, index search and answer generation"""
+    snapshots = rag.pin_snapshots([config.DEFAULT_COLLECTION])
+    stages: Dict[str, List[float]] = {"embed": [], "search": [], "generate": []}
+    for query in queries:
+        timings = rag.query(query, snapshots, top_k)["timings"]
+        for stage, samples in stages.items():
+            samples.append(timings[f"{stage}_ms"])
+    return {stage: summarize(samples) for stage, samples in stages.items()}
+
+
+def bench_concurrency(rag: RAGSystem, queries: List[str], concurrency: int, top_k: int) -> dict:
+    """End-to-end query latency and throughput with `concurrency` simultaneous clients"""
+    snapshots = rag.pin_snapshots([config.DEFAULT_COLLECTION])
+    before = rag.generator.stats()
+
+    def timed_query(query: str) -> float:
+        start = time.perf_counter()
+        rag.query(query, snapshots, top_k)
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_query, queries))
+    elapsed = time.perf_counter() - start
+    after = rag.generator.stats()
+    batches = after["batches"] - before["batches"]
+    return {
+        "concurrency": concurrency,
+        "queries_per_s": round(len(queries) / elapsed, 2),
+        "latency": summarize(latencies),
+        "generation_batches": batches,
+        "mean_generation_batch_size": round((after["prompts"] - before["prompts"]) / batches, 2) if batches else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG ingestion and query latency")
+    parser.add_argument("--sizes", default="10,50,200", help="Comma-separated PDF page counts")
+    parser.add_argument("--rows-per-page", type=int, default=20, help="CSV rows generated per PDF page")
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated client counts")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per measurement")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--backend", choices=["offline", "models"], default="offline",
+                        help="offline: hashing embedder and template generator; models: EMBEDDING_/GENERATION_BACKEND")
+    parser.add_argument("--embedding-workers", type=int, default=0,
+                        help="offline only: embed through this many hashing worker processes")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Keep the exact/semantic answer caches on (ANSWER_CACHE_SIZE etc.)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    queries = synthetic_corpus.queries(args.queries, seed=args.seed + 1)
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": args.backend,
+            "embedding_workers": args.embedding_workers
+        },
+        "settings": {
+            "chunk_tokens": config.CHUNK_TOKENS,
+            "chunk_overlap_tokens": config.CHUNK_OVERLAP_TOKENS,
+            "generation_max_input_tokens": config.GENERATION_MAX_INPUT_TOKENS,
+            "generation_max_batch_size": config.GENERATION_MAX_BATCH_SIZE,
+            "generation_max_wait_ms": config.GENERATION_MAX_WAIT_MS,
+            "dedup_near_threshold": config.DEDUP_NEAR_THRESHOLD,
+            "answer_cache": args.answer_cache,
+            "top_k": args.top_k,
+            "queries": args.queries
+        },
+        "runs": []
+    }
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as work_dir:
+        for pages in sizes:
+            print(f"Corpus of {pages} pages...")
+            rag = create_system(args.backend, os.path.join(work_dir, f"collections_{pages}"), args.embedding_workers,
+                                args.answer_cache)
+            run = {
+                "pages": pages,
+                "ingestion": bench_ingestion(rag, work_dir, pages, pages * args.rows_per_page, args.seed)
+            }
+            run["chunks_indexed"] = rag.collections.get(config.DEFAULT_COLLECTION).current().size
+            run["stages"] = bench_stages(rag, queries, args.top_k)
+            run["concurrency"] = [bench_concurrency(rag, queries, level, args.top_k) for level in concurrency_levels]
+            if args.answer_cache:
+                run["answer_cache"] = rag.answer_cache.stats()
+            run["peak_rss_mb"] = peak_rss_mb()
+            report["runs"].append(run)
+            rag.embedder.close()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# chunking.py - Tokenizer-aware chunking and token-budgeted context packing
+import re
+from typing import List
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text on sentence-ending punctuation, joining wrapped PDF lines first"""
+    text = WHITESPACE.sub(' ', text).strip()
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence]
+
+
+class TokenChunker:
+    """Packs whole sentences into chunks of at most `chunk_tokens` tokens.
+
+    Consecutive chunks share up to `overlap_tokens` tokens of trailing
+    sentences so context isn't lost at a boundary. A sentence longer than a
+    whole chunk is split into word windows instead.
+    """
+
+    def __init__(self, tokenizer, chunk_tokens: int = 128, overlap_tokens: int = 24, min_tokens: int = 5):
+        self.tokenizer = tokenizer
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+        self.min_tokens = min_tokens
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, add_special_tokens=False)['input_ids']
+        return [len(ids) for ids in encoded]
+
+    def _split_long_sentence(self, sentence: str, tokens: int) -> List[str]:
+        """Split one oversized sentence into overlapping word windows"""
+        words = sentence.split(' ')
+        tokens_per_word = max(tokens / max(len(words), 1), 1e-6)
+        window = max(1, int(self.chunk_tokens / tokens_per_word))
+        step = max(1, window - int(self.overlap_tokens / tokens_per_word))
+        pieces = []
+        for start in range(0, len(words), step):
+            pieces.append(' '.join(words[start:start + window]))
+            if start + window >= len(words):
+                break
+        return pieces
+
+    def chunk(self, text: str) -> List[str]:
+        """Split text into sentence-aligned chunks; chunks under min_tokens are dropped"""
+        sentences = split_sentences(text)
+        counts = self.count_tokens(sentences)
+
+        chunks = []
+        current: List[str] = []
+        current_counts: List[int] = []
+
+        def emit():
+            if current and sum(current_counts) >= self.min_tokens:
+                chunks.append(' '.join(current))
+
+        for sentence, tokens in zip(sentences, counts):
+            if tokens > self.chunk_tokens:
+                emit()
+                current, current_counts = [], []
+                chunks.extend(self._split_long_sentence(sentence, tokens))
+                continue
+
+            if current and sum(current_counts) + tokens > self.chunk_tokens:
+                emit()
+                # Carry trailing sentences into the next chunk as overlap
+                overlap, overlap_counts = [], []
+                for previous, previous_tokens in zip(reversed(current), reversed(current_counts)):
+                    if sum(overlap_counts) + previous_tokens > self.overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_counts.insert(0, previous_tokens)
+                current, current_counts = overlap, overlap_counts
+
+            current.append(sentence)
+            current_counts.append(tokens)
+
+        emit()
+        return chunks
+
+
+class ContextPacker:
+    """Fills an exact token budget with ranked chunks for the generator.
+
+    Chunks are taken in rank order while they fit; the first chunk that
+    doesn't fit is truncated to the remaining budget, so the encoder never
+    receives text it would cut off anyway.
+    """
+
+    def __init__(self, tokenizer, max_input_tokens: int = 512, min_fragment_tokens: int = 16):
+        self.tokenizer = tokenizer
+        self.max_input_tokens = max_input_tokens
+        self.min_fragment_tokens = min_fragment_tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=True)['input_ids'])
+
+    def pack(self, chunks: List[str], budget: int, separator: str = "\n") -> List[str]:
+        """Return the chunks (the last possibly truncated) that fit in `budget` tokens"""
+        if not chunks or budget <= 0:
+            return []
+        encoded = self.tokenizer(chunks, add_special_tokens=False)['input_ids']
+        separator_tokens = len(self.tokenizer(separator, add_special_tokens=False)['input_ids'])
+
+        packed = []
+        remaining = budget
+        for chunk, ids in zip(chunks, encoded):
+            cost = len(ids) + (separator_tokens if packed else 0)
+            if cost <= remaining:
+                packed.append(chunk)
+                remaining -= cost
+                continue
+            room = remaining - (separator_tokens if packed else 0)
+            if room >= self.min_fragment_tokens:
+                packed.append(self.tokenizer.decode(ids[:room], skip_special_tokens=True))
+            break
+        return packed
@@ -0,0 +1,66 @@
+# config.py - Runtime settings for the RAG system
+import os
+
+# Model backends: sentence-transformers, pool or hashing / transformers or template
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'sentence-transformers')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_POOL_WORKERS = int(os.getenv('EMBEDDING_POOL_WORKERS', '2'))
+EMBEDDING_POOL_BACKEND = os.getenv('EMBEDDING_POOL_BACKEND', 'sentence-transformers')  # What each worker runs
+GENERATION_BACKEND = os.getenv('GENERATION_BACKEND', 'transformers')
+GENERATION_MODEL = os.getenv('GENERATION_MODEL', 'google/flan-t5-small')
+
+# CPU inference: dynamic int8 quantization of both models' linear layers, and the
+# intra-op thread budget for this process (0 = torch default; pool workers split it)
+QUANTIZE_INT8 = os.getenv('QUANTIZE_INT8', 'false').lower() in ('1', 'true', 'yes')
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '0'))
+
+# Generation batching
+GENERATION_MAX_BATCH_SIZE = int(os.getenv('GENERATION_MAX_BATCH_SIZE', '8'))
+GENERATION_MAX_WAIT_MS = float(os.getenv('GENERATION_MAX_WAIT_MS', '10'))
+
+# Chunking and generator input, in tokens
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', '128'))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '24'))
+GENERATION_MAX_INPUT_TOKENS = int(os.getenv('GENERATION_MAX_INPUT_TOKENS', '512'))
+
+# Uploads: stored under UPLOAD_DIR by content hash; MAX_ARCHIVE_BYTES caps an imported archive and each of its sections
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'uploads')
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(100 * 1024 * 1024)))
+MAX_ARCHIVE_BYTES = int(os.getenv('MAX_ARCHIVE_BYTES', str(1024 * 1024 * 1024)))
+
+# Answer caches: exact (normalized query) and semantic (query embedding within a cosine distance); 0 disables
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '1024'))
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '1024'))
+SEMANTIC_CACHE_MAX_DISTANCE = float(os.getenv('SEMANTIC_CACHE_MAX_DISTANCE', '0.05'))
+
+# Structured queries over uploaded CSVs: filter, sort and aggregate questions skip retrieval
+TABLE_QUERIES = os.getenv('TABLE_QUERIES', 'true').lower() in ('1', 'true', 'yes')
+TABLE_ANSWER_MAX_ROWS = int(os.getenv('TABLE_ANSWER_MAX_ROWS', '20'))
+
+# Collections
+DEFAULT_COLLECTION = os.getenv('DEFAULT_COLLECTION', 'default')
+COLLECTIONS_DIR = os.getenv('COLLECTIONS_DIR', 'collections')
+
+# Reduced-dimension index: PCA-project stored and query vectors to this many dims (0 = full size)
+EMBEDDING_PROJECTION_DIMS = int(os.getenv('EMBEDDING_PROJECTION_DIMS', '0'))
+PROJECTION_MIN_CHUNKS = int(os.getenv('PROJECTION_MIN_CHUNKS', '1024'))  # Chunks needed before the first fit
+PROJECTION_REFIT_GROWTH = float(os.getenv('PROJECTION_REFIT_GROWTH', '2.0'))  # Refit once the corpus grows this much
+PROJECTION_DRIFT = float(os.getenv('PROJECTION_DRIFT', '1.5'))  # Refit when a batch loses this many times more variance
+
+# Deleted documents: compact a collection once this share of its chunks are tombstones
+COMPACTION_THRESHOLD = float(os.getenv('COMPACTION_THRESHOLD', '0.2'))
+
+# Lexical (BM25) retrieval
+LEXICAL_CANDIDATES = int(os.getenv('LEXICAL_CANDIDATES', '50'))
+RRF_K = int(os.getenv('RRF_K', '60'))
+
+# Ingestion dedup: MinHash Jaccard similarity for near-duplicates (0 = exact only)
+DEDUP_NEAR_THRESHOLD = float(os.getenv('DEDUP_NEAR_THRESHOLD', '0.8'))
+
+# Multi-worker serving: standalone, writer (ingests and publishes) or reader (serves published indexes)
+SERVING_ROLE = os.getenv('SERVING_ROLE', 'standalone')
+PUBLISH_DIR = os.getenv('PUBLISH_DIR', 'published')
+PUBLISH_POLL_SECONDS = float(os.getenv('PUBLISH_POLL_SECONDS', '1'))
+PUBLISH_KEEP_VERSIONS = int(os.getenv('PUBLISH_KEEP_VERSIONS', '3'))
+# Each publish exports the whole collection; publish at most this often, writing only the newest snapshot
+PUBLISH_MIN_INTERVAL_SECONDS = float(os.getenv('PUBLISH_MIN_INTERVAL_SECONDS', '1'))
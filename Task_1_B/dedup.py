@@ -0,0 +1,172 @@
+# dedup.py - Exact and near-duplicate chunk detection at ingestion
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from lexical import tokenize
+
+_WHITESPACE = re.compile(r'\s+')
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)*')
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def content_hash(text: str) -> bytes:
+    """Hash of the text with case and whitespace normalized"""
+    normalized = _WHITESPACE.sub(' ', text.strip().lower())
+    return hashlib.sha1(normalized.encode('utf-8')).digest()
+
+
+def numbers_key(text: str) -> bytes:
+    """The text's numbers in order; near-duplicates must agree on them exactly"""
+    return '\x00'.join(_NUMBER.findall(text)).encode('utf-8')
+
+
+class MinHasher:
+    """MinHash signatures over a chunk's token set.
+
+    The fraction of equal signature positions estimates the Jaccard similarity
+    of two chunks' token sets. Permutations are seeded so signatures are
+    stable across restarts.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm).astype('uint64')
+        self._b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm).astype('uint64')
+
+    def signature(self, tokens: List[str]) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest(), 'little')
+             for token in set(tokens)],
+            dtype='uint64'
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+
+class DedupPlan:
+    """Result of matching one batch of chunks against a DedupIndex.
+
+    `assignment[i]` is the chunk id that input chunk i maps to, and
+    `new_positions` are the inputs that need to be embedded and stored.
+    Nothing is recorded in the index until the plan is committed.
+    """
+
+    def __init__(self):
+        self.assignment: List[int] = []
+        self.new_positions: List[int] = []
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.pending_hashes: Dict[bytes, int] = {}
+        self.pending_signatures: List[Tuple[np.ndarray, int]] = []  # (signature, chunk id)
+        # LSH buckets of this batch's new chunks, so matches within a batch aren't a linear scan
+        self.pending_buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.pending_lookup: Dict[int, np.ndarray] = {}
+        self.pending_numbers: Dict[int, bytes] = {}  # chunk id -> numbers_key
+        self.document_exists = False  # The same file was ingested before; nothing was planned
+
+
+class DedupIndex:
+    """Exact-hash and MinHash LSH lookups over the chunks already stored.
+
+    Signatures are split into bands; only chunks that agree on a whole band
+    are compared, and a pair counts as a near-duplicate when its estimated
+    Jaccard similarity reaches `threshold` and both contain the same numbers
+    in the same order, so CSV rows or passages that differ only in a price,
+    date or quantity are never merged. A threshold of 0 disables
+    near-duplicate detection and keeps exact matching only.
+    """
+
+    def __init__(self, threshold: float = 0.8, min_tokens: int = 5, num_perm: int = 64, bands: int = 16):
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._hashes: Dict[bytes, int] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._numbers: Dict[int, bytes] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def _signature(self, text: str) -> Optional[np.ndarray]:
+        if self.threshold <= 0:
+            return None
+        tokens = tokenize(text)
+        if len(set(tokens)) < self.min_tokens:
+            return None
+        return self.hasher.signature(tokens)
+
+    def _find_near(self, signature: np.ndarray, keys: List[Tuple[int, bytes]], numbers: bytes,
+                   plan: DedupPlan) -> int:
+        """Lowest chunk id sharing a band and the numbers with `signature` whose estimated Jaccard reaches the threshold"""
+        candidates = set()
+        for key in keys:
+            candidates.update(self._buckets.get(key, ()))
+            candidates.update(plan.pending_buckets.get(key, ()))
+        ids = sorted(chunk_id for chunk_id in candidates
+                     if self._numbers.get(chunk_id, plan.pending_numbers.get(chunk_id)) == numbers)
+        if not ids:
+            return -1
+        others = np.stack([self._signatures.get(chunk_id, plan.pending_lookup.get(chunk_id)) for chunk_id in ids])
+        matches = np.flatnonzero((others == signature).mean(axis=1) >= self.threshold)
+        return ids[matches[0]] if len(matches) else -1
+
+    def plan(self, chunks: List[str], start_id: int) -> DedupPlan:
+        """Map each chunk to an existing chunk id or a new one starting at start_id"""
+        plan = DedupPlan()
+        for position, text in enumerate(chunks):
+            digest = content_hash(text)
+            chunk_id = self._hashes.get(digest, plan.pending_hashes.get(digest, -1))
+            if chunk_id != -1:
+                plan.exact_duplicates += 1
+                plan.assignment.append(chunk_id)
+                continue
+
+            signature = self._signature(text)
+            if signature is not None:
+                keys = self._band_keys(signature)
+                numbers = numbers_key(text)
+                chunk_id = self._find_near(signature, keys, numbers, plan)
+                if chunk_id != -1:
+                    plan.near_duplicates += 1
+                    plan.assignment.append(chunk_id)
+                    continue
+
+            chunk_id = start_id + len(plan.new_positions)
+            plan.new_positions.append(position)
+            plan.assignment.append(chunk_id)
+            plan.pending_hashes[digest] = chunk_id
+            if signature is not None:
+                plan.pending_signatures.append((signature, chunk_id))
+                plan.pending_lookup[chunk_id] = signature
+                plan.pending_numbers[chunk_id] = numbers
+                for key in keys:
+                    plan.pending_buckets.setdefault(key, []).append(chunk_id)
+        return plan
+
+    def commit(self, plan: DedupPlan):
+        """Record a plan's new chunks once they have been published"""
+        self._hashes.update(plan.pending_hashes)
+        self._numbers.update(plan.pending_numbers)
+        for signature, chunk_id in plan.pending_signatures:
+            self._signatures[chunk_id] = signature
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(chunk_id)
+
+    def add_existing(self, chunks: List[str], start_id: int = 0):
+        """Index chunks that are already stored, e.g. after loading a collection"""
+        plan = DedupPlan()
+        for offset, text in enumerate(chunks):
+            chunk_id = start_id + offset
+            plan.pending_hashes.setdefault(content_hash(text), chunk_id)
+            signature = self._signature(text)
+            if signature is not None:
+                plan.pending_signatures.append((signature, chunk_id))
+                plan.pending_numbers[chunk_id] = numbers_key(text)
+        self.commit(plan)
@@ -0,0 +1,156 @@
+# embedding_workers.py - Embedding worker processes that return vectors through shared memory
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+import numpy as np
+
+_STOP = None
+
+
+def _worker_main(backend: str, model_name: str, quantize: bool, threads: int, tasks, results):
+    """Load one model copy and encode batches from the task queue until told to stop"""
+    from backends import configure_torch_threads, create_embedder
+
+    try:
+        configure_torch_threads(threads)
+        embedder = create_embedder(backend, model_name, quantize=quantize)
+    except Exception as e:
+        results.put(("failed", repr(e)))
+        return
+    results.put(("ready", embedder.dimension))
+
+    while True:
+        task = tasks.get()
+        if task is _STOP:
+            break
+        task_id, texts, shm_name, row, total_rows = task
+        try:
+            vectors = embedder.encode(texts)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                out = np.ndarray((total_rows, embedder.dimension), dtype='float32', buffer=shm.buf)
+                out[row:row + len(texts)] = vectors
+                del out  # Release the view before closing the mapping
+            finally:
+                shm.close()
+            results.put((task_id, None))
+        except Exception as e:
+            results.put((task_id, repr(e)))
+
+
+class SharedMemoryWorkerPool:
+    """A fixed set of embedding processes fed through one work queue.
+
+    Each worker holds its own model copy. For every encode call the caller
+    allocates one shared-memory block for the whole result; workers write
+    their slice of rows into it directly, so only texts and short status
+    messages cross the process boundary and vectors are never pickled.
+    A router thread matches completions to waiting callers, so several
+    threads can encode through the pool at once.
+    """
+
+    def __init__(self, backend: str, model_name: str, workers: int = 2, batch_size: int = 64,
+                 start_timeout: float = 300.0, quantize: bool = False, threads: int = 0):
+        context = mp.get_context('spawn')  # Forking a process that holds torch state is unsafe
+        self.batch_size = max(1, batch_size)
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(target=_worker_main,
+                            args=(backend, model_name, quantize, threads, self._tasks, self._results),
+                            name=f"embedding-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for process in self._processes:
+            process.start()
+
+        self.dimension = None
+        deadline = time.monotonic() + start_timeout
+        for _ in self._processes:
+            try:
+                status, value = self._results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                status, value = "failed", f"no response within {start_timeout}s"
+            if status != "ready":
+                self.close()
+                raise RuntimeError(f"Embedding worker failed to start: {value}")
+            self.dimension = value
+
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._router = threading.Thread(target=self._route_results, name="embedding-results", daemon=True)
+        self._router.start()
+
+    @property
+    def workers(self) -> int:
+        return len(self._processes)
+
+    def _route_results(self):
+        while True:
+            message = self._results.get()
+            if message is _STOP:
+                return
+            task_id, error = message
+            with self._pending_lock:
+                future = self._pending.pop(task_id, None)
+            if future is None:
+                continue  # The caller already gave up on this call
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(RuntimeError(f"Embedding worker error: {error}"))
+
+    def _wait(self, future: Future):
+        """Wait for one task, failing instead of hanging if a worker process died"""
+        while True:
+            try:
+                return future.result(timeout=1.0)
+            except FutureTimeout:
+                if not all(process.is_alive() for process in self._processes):
+                    raise RuntimeError("An embedding worker process exited unexpectedly")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        total_rows = len(texts)
+        if total_rows == 0:
+            return np.empty((0, self.dimension), dtype='float32')
+        # Spread the batch over every worker, in pieces of at most batch_size texts
+        piece = min(self.batch_size, -(-total_rows // self.workers))
+
+        shm = shared_memory.SharedMemory(create=True, size=total_rows * self.dimension * 4)
+        task_ids = []
+        try:
+            futures = []
+            for row in range(0, total_rows, piece):
+                future = Future()
+                task_id = next(self._ids)
+                with self._pending_lock:
+                    self._pending[task_id] = future
+                task_ids.append(task_id)
+                futures.append(future)
+                self._tasks.put((task_id, texts[row:row + piece], shm.name, row, total_rows))
+            for future in futures:
+                self._wait(future)
+            # One memcpy out of the block so it can be freed; the view is dropped before close()
+            return np.ndarray((total_rows, self.dimension), dtype='float32', buffer=shm.buf).copy()
+        finally:
+            with self._pending_lock:
+                for task_id in task_ids:
+                    self._pending.pop(task_id, None)
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(_STOP)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(_STOP)
@@ -0,0 +1,127 @@
+# generation.py - Batched and streaming answer generation
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Iterator
+
+
+class BatchingGenerator:
+    """Groups prompts that arrive within a short window into one backend call.
+
+    Callers block in `generate()` while a single background thread drains the
+    queue, so concurrent requests share one padded forward pass instead of
+    each running their own.
+    """
+
+    def __init__(self, backend, max_batch_size: int = 8, max_wait_ms: float = 10, **generate_kwargs):
+        self.backend = backend
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.generate_kwargs = generate_kwargs
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._batches = 0
+        self._prompts = 0
+
+        self._worker = threading.Thread(target=self._run, name="generation-batcher", daemon=True)
+        self._worker.start()
+
+    def generate(self, prompt: str) -> str:
+        """Queue a prompt and wait for its generated text"""
+        future = Future()
+        self._queue.put((prompt, future))
+        return future.result()
+
+    def _collect_batch(self) -> list:
+        """Block for the first prompt, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            prompts = [prompt for prompt, _ in batch]
+            futures = [future for _, future in batch]
+
+            with self._lock:
+                self._batches += 1
+                self._prompts += len(batch)
+                self._batch_sizes[len(batch)] += 1
+
+            try:
+                outputs = self.backend.generate_batch(prompts, **self.generate_kwargs)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+
+    def stats(self) -> dict:
+        """Achieved batch sizes since startup"""
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "prompts": self._prompts,
+                "mean_batch_size": round(self._prompts / self._batches, 2) if self._batches else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "pending": self._queue.qsize(),
+            }
+
+
+def stream_generate(llm, prompt: str, max_length: int = 150, greedy: bool = False,
+                    temperature: float = 0.7) -> Iterator[str]:
+    """Yield decoded text pieces as the model produces them.
+
+    Generation runs in a helper thread and pushes tokens through a
+    TextIteratorStreamer. Greedy mode disables sampling so the same prompt
+    always streams the same answer. If generation fails, the stream ends and
+    the helper thread's exception is raised here.
+    """
+    from transformers import TextIteratorStreamer
+
+    tokenizer = llm.tokenizer
+    inputs = tokenizer(prompt, return_tensors="pt", truncation=True).to(llm.model.device)
+    streamer = TextIteratorStreamer(tokenizer, skip_special_tokens=True)
+
+    generate_kwargs = dict(**inputs, streamer=streamer, max_length=max_length)
+    if greedy:
+        generate_kwargs.update(do_sample=False, num_beams=1)
+    else:
+        generate_kwargs.update(do_sample=True, temperature=temperature)
+
+    errors = []
+
+    def run():
+        try:
+            llm.model.generate(**generate_kwargs)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # Unblocks the loop below even when generate failed before streaming anything
+            streamer.end()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    for text in streamer:
+        if text:
+            yield text
+    thread.join()
+    if errors:
+        raise errors[0]
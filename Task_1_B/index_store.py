@@ -0,0 +1,610 @@
+# index_store.py - Versioned, immutable index snapshots (read-copy-update)
+import json
+import os
+import re
+import shutil
+import threading
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from dedup import DedupIndex, DedupPlan
+from lexical import LexicalIndex
+from metadata import ChunkMetadata, id_selector
+from projection import Projection, ProjectionPolicy
+from tables import Table, load_tables, save_tables
+
+# Candidates fetched from a projected index per requested result, before exact reranking
+PROJECTED_OVERFETCH = 4
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """One published version of the chunk store and its FAISS index.
+
+    A snapshot is never modified after it is published. Queries hold a
+    reference to the snapshot they started with, so chunk ids always line up
+    with the index they came from even if ingestion publishes a newer version
+    mid-query.
+    """
+    version: int
+    chunks: Tuple[str, ...]
+    embeddings: Optional[np.ndarray]
+    index: Optional[faiss.Index]
+    metadata: ChunkMetadata
+    lexical: LexicalIndex
+    # Content hash (sha256) -> record of each uploaded file already ingested
+    documents: Mapping[str, dict] = field(default_factory=lambda: MappingProxyType({}))
+    # Chunk ids still referenced by a document; None when nothing is tombstoned
+    live: Optional[np.ndarray] = None
+    # Document hash -> typed columns of each uploaded CSV, for structured queries
+    tables: Mapping[str, Table] = field(default_factory=lambda: MappingProxyType({}))
+    # PCA basis the index's vectors were projected with; None when it holds full embeddings
+    projection: Optional[Projection] = None
+
+    @classmethod
+    def empty(cls) -> "IndexSnapshot":
+        return cls(version=0, chunks=(), embeddings=None, index=None,
+                   metadata=ChunkMetadata.empty(), lexical=LexicalIndex())
+
+    @property
+    def size(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def deleted_count(self) -> int:
+        """Tombstoned chunks still taking space in the index"""
+        return 0 if self.live is None else self.size - int(self.live.sum())
+
+    def search(self, query_embedding: np.ndarray, top_k: int,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (distances, ids) for the top_k nearest chunks.
+
+        With a mask, FAISS searches only the selected ids instead of
+        post-filtering a full result list. With a projection, the projected
+        index picks `PROJECTED_OVERFETCH` times as many candidates, which are
+        then ranked by their exact distance to the full query embedding.
+        """
+        query_embedding = query_embedding.astype('float32')
+        if self.projection is None:
+            return self._search_index(query_embedding, top_k, mask)
+
+        _, candidates = self._search_index(self.projection.apply(query_embedding), top_k * PROJECTED_OVERFETCH, mask)
+        distances = np.full((len(query_embedding), top_k), np.inf, dtype='float32')
+        ids = np.full((len(query_embedding), top_k), -1, dtype='int64')
+        for row, (query, found) in enumerate(zip(query_embedding, candidates)):
+            found = found[found != -1]
+            exact = self.rescore(query, found)
+            order = np.argsort(exact, kind='stable')[:top_k]
+            distances[row, :len(order)] = exact[order]
+            ids[row, :len(order)] = found[order]
+        return distances, ids
+
+    def _search_index(self, query_embedding: np.ndarray, top_k: int,
+                      mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        if mask is None:
+            return self.index.search(query_embedding, top_k)
+        if getattr(self.index, "accepts_mask", False):
+            # Memory-mapped indexes apply the mask themselves
+            return self.index.search(query_embedding, top_k, mask=mask)
+        # `bitmap` backs the selector and must stay referenced during the search
+        params, bitmap = id_selector(mask)
+        return self.index.search(query_embedding, top_k, params=params)
+
+    def filter_mask(self, filters: dict) -> np.ndarray:
+        """Boolean mask over chunk ids for a metadata filter"""
+        return self.metadata.mask(self.size, **filters)
+
+    def search_mask(self, filters: Optional[dict] = None) -> Optional[np.ndarray]:
+        """Chunks a search may return: the filter's matches, else the live chunks; None means all"""
+        if filters:
+            # Tombstoned chunks have no provenance records left, so no filter selects them
+            return self.filter_mask(filters)
+        return self.live
+
+    def lexical_search(self, query_text: str, top_k: int,
+                       mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (BM25 scores, ids) for the best keyword matches in this snapshot"""
+        return self.lexical.search(query_text, top_k, n_docs=self.size, mask=mask)
+
+    def rescore(self, query_embedding: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Exact squared L2 distances from the query to the given chunks"""
+        vectors = self.embeddings[ids]
+        return ((vectors - query_embedding.reshape(1, -1).astype('float32')) ** 2).sum(axis=1)
+
+
+class SnapshotStore:
+    """Holds the current IndexSnapshot and publishes new ones atomically.
+
+    Readers call `current()` without locking: swapping a single attribute
+    reference is atomic, so they see either the old or the new snapshot,
+    never a half-built one. Writers are serialized so that each new version
+    is built from the latest one.
+    """
+
+    def __init__(self, initial: Optional[IndexSnapshot] = None, dedup_threshold: float = 0.8,
+                 projection_policy: Optional[ProjectionPolicy] = None):
+        self._current = initial or IndexSnapshot.empty()
+        self.projection_policy = projection_policy or ProjectionPolicy()
+        self._write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self.closed = False
+        # Writer-side duplicate lookups over the stored chunks
+        self.dedup_threshold = dedup_threshold
+        self.dedup = DedupIndex(threshold=dedup_threshold)
+        self.dedup.add_existing(list(self._current.chunks))
+
+    def current(self) -> IndexSnapshot:
+        return self._current
+
+    def _check_open(self):
+        if self.closed:
+            raise RuntimeError("Collection was unloaded while ingesting, please retry")
+
+    def ingest(self, chunks: List[str], metadata: ChunkMetadata, embed: Callable[[List[str]], np.ndarray],
+               document: Optional[dict] = None, table: Optional[Table] = None) -> Tuple[IndexSnapshot, DedupPlan]:
+        """Deduplicate a batch, embed only the new chunks and publish the next snapshot.
+
+        Duplicates of stored chunks (or of each other) get no new vector; their
+        provenance records point at the chunk they duplicate. `document`
+        describes the uploaded file, keyed by its "sha256"; if a file with the
+        same hash was already ingested, nothing is published. A CSV's `table`
+        is stored under the same hash.
+        """
+        if table is not None and document is None:
+            raise ValueError("A table can only be stored along with its document")
+        with self._write_lock:
+            self._check_open()
+            previous = self._current
+            if document is not None and document["sha256"] in previous.documents:
+                plan = DedupPlan()
+                plan.document_exists = True
+                return previous, plan
+            plan = self.dedup.plan(chunks, start_id=previous.size)
+            new_chunks = [chunks[i] for i in plan.new_positions]
+            embeddings = embed(new_chunks) if new_chunks else None
+            snapshot = self._publish_locked(previous, new_chunks, embeddings,
+                                            metadata.with_chunk_ids(plan.assignment), document, table)
+            self.dedup.commit(plan)
+            return snapshot, plan
+
+    def publish(self, chunks: List[str], embeddings: np.ndarray, metadata: ChunkMetadata) -> IndexSnapshot:
+        """Append already-embedded chunks without deduplication and swap in the next snapshot.
+
+        The metadata's chunk ids are positions within `chunks`.
+        """
+        with self._write_lock:
+            self._check_open()
+            previous = self._current
+            metadata = metadata.with_chunk_ids(metadata.chunk_ids + previous.size)
+            snapshot = self._publish_locked(previous, chunks, embeddings, metadata)
+            self.dedup.add_existing(chunks, start_id=previous.size)
+            return snapshot
+
+    def _publish_locked(self, previous: IndexSnapshot, chunks: List[str], embeddings: Optional[np.ndarray],
+                        metadata: ChunkMetadata, document: Optional[dict] = None,
+                        table: Optional[Table] = None) -> IndexSnapshot:
+        """Build the snapshot after `previous` and swap it in; caller holds the write lock"""
+        index = previous.index
+        all_embeddings = previous.embeddings
+        projection = previous.projection
+        if chunks:
+            embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+            if previous.index is None:
+                all_embeddings = embeddings.copy()
+            else:
+                all_embeddings = np.vstack([previous.embeddings, embeddings])
+            all_embeddings.setflags(write=False)
+            projection, refitted = self.projection_policy.update(projection, all_embeddings, embeddings)
+            if previous.index is None or refitted:
+                index = build_index(all_embeddings, projection)
+            else:
+                # Copy the published index so readers of `previous` are unaffected
+                index = faiss.clone_index(previous.index)
+                index.add(embeddings if projection is None else projection.apply(embeddings))
+        merged_metadata = previous.metadata.concat(metadata)
+
+        # The lexical index is append-only and shared; the new snapshot's
+        # size is what makes the appended chunks visible
+        previous.lexical.add(chunks)
+
+        documents, tables = previous.documents, previous.tables
+        if table is not None:
+            tables = MappingProxyType({**previous.tables, document["sha256"]: table})
+        if document is not None:
+            # The document's provenance records, so it can be deleted later
+            records = [len(previous.metadata), len(merged_metadata)]
+            documents = MappingProxyType({**previous.documents, document["sha256"]: {
+                **document, "version": previous.version + 1, "records": records}})
+
+        all_chunks = previous.chunks + tuple(chunks)
+        snapshot = IndexSnapshot(
+            version=previous.version + 1,
+            chunks=all_chunks,
+            embeddings=all_embeddings,
+            index=index,
+            metadata=merged_metadata,
+            lexical=previous.lexical,
+            documents=documents,
+            tables=tables,
+            projection=projection,
+            # A duplicate of a tombstoned chunk brings it back to life
+            live=merged_metadata.live_chunks(len(all_chunks))
+        )
+        self._current = snapshot
+        return snapshot
+
+    def delete_document(self, sha256: str) -> IndexSnapshot:
+        """Remove a document's provenance records and publish the next snapshot.
+
+        Chunks left without any record are tombstoned: they are masked out of
+        every search right away but keep their place in the index until
+        `compact` rebuilds it. Raises KeyError for an unknown document.
+        """
+        with self._write_lock:
+            self._check_open()
+            previous = self._current
+            document = previous.documents.get(sha256)
+            if document is None:
+                raise KeyError(sha256)
+            if "records" not in document:
+                raise ValueError(f"Document {sha256} was ingested without record positions and can't be deleted")
+            start, end = document["records"]
+            keep = np.ones(len(previous.metadata), dtype=bool)
+            keep[start:end] = False
+            metadata = previous.metadata.take(np.flatnonzero(keep))
+
+            # Later documents' records move up by the number removed
+            documents = {}
+            for key, other in previous.documents.items():
+                if key == sha256:
+                    continue
+                if other.get("records") and other["records"][0] >= end:
+                    other = {**other, "records": [other["records"][0] - (end - start),
+                                                  other["records"][1] - (end - start)]}
+                documents[key] = other
+
+            snapshot = replace(previous, version=previous.version + 1, metadata=metadata,
+                               documents=MappingProxyType(documents),
+                               tables=MappingProxyType({key: table for key, table in previous.tables.items()
+                                                        if key != sha256}),
+                               live=metadata.live_chunks(previous.size))
+            self._current = snapshot
+            return snapshot
+
+    def restore(self, version: int, chunks: List[str], embeddings: Optional[np.ndarray], metadata: ChunkMetadata,
+                documents: Mapping[str, dict], tables: Mapping[str, Table]) -> IndexSnapshot:
+        """Publish an exported collection's contents into this empty store, without re-embedding.
+
+        Raises ValueError if the collection already has chunks or documents.
+        """
+        with self._write_lock:
+            self._check_open()
+            previous = self._current
+            if previous.size or previous.documents:
+                raise ValueError("An archive can only be imported into a new or empty collection")
+            snapshot = self._publish_locked(previous, chunks, embeddings, metadata)
+            snapshot = replace(snapshot, version=max(version, snapshot.version),
+                               documents=MappingProxyType(dict(documents)), tables=MappingProxyType(dict(tables)))
+            self.dedup.add_existing(chunks)
+            self._current = snapshot
+            return snapshot
+
+    @property
+    def tombstone_ratio(self) -> float:
+        snapshot = self._current
+        return snapshot.deleted_count / snapshot.size if snapshot.size else 0.0
+
+    def compact(self) -> Optional[IndexSnapshot]:
+        """Rebuild the index without tombstoned chunks and publish it.
+
+        The rebuild reuses the stored embeddings, so nothing is re-embedded.
+        It runs outside the write lock, so queries and uploads carry on; if
+        the collection changed in the meantime, the rebuild is redone under
+        the lock from the latest snapshot. Returns None if there was nothing
+        to compact or another compaction is running.
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return None
+        try:
+            base = self._current
+            if base.live is None:
+                return None
+            compacted, dedup = compact_snapshot(base, self.dedup_threshold)
+            with self._write_lock:
+                self._check_open()
+                if self._current is not base:
+                    base = self._current
+                    if base.live is None:
+                        return None
+                    compacted, dedup = compact_snapshot(base, self.dedup_threshold)
+                snapshot = replace(compacted, version=base.version + 1)
+                self.dedup = dedup
+                self._current = snapshot
+                return snapshot
+        finally:
+            self._compact_lock.release()
+
+
+def compact_snapshot(snapshot: IndexSnapshot, dedup_threshold: float) -> Tuple[IndexSnapshot, DedupIndex]:
+    """Copy of a snapshot holding only its live chunks, renumbered, plus a matching DedupIndex"""
+    live_ids = np.flatnonzero(snapshot.live)
+    new_ids = np.cumsum(snapshot.live, dtype='int32') - 1
+    chunks = tuple(snapshot.chunks[i] for i in live_ids)
+
+    embeddings = index = None
+    if len(live_ids):
+        embeddings = np.ascontiguousarray(snapshot.embeddings[live_ids])
+        embeddings.setflags(write=False)
+        index = build_index(embeddings, snapshot.projection)
+    lexical = LexicalIndex()
+    lexical.add(chunks)
+    dedup = DedupIndex(threshold=dedup_threshold)
+    dedup.add_existing(list(chunks))
+
+    compacted = replace(snapshot, chunks=chunks, embeddings=embeddings, index=index,
+                        metadata=snapshot.metadata.with_chunk_ids(new_ids[snapshot.metadata.chunk_ids]),
+                        lexical=lexical, live=None)
+    return compacted, dedup
+
+
+def build_index(embeddings: np.ndarray, projection: Optional[Projection] = None) -> faiss.Index:
+    """A flat L2 index over the embeddings, projected first if there is a projection"""
+    vectors = embeddings if projection is None else projection.apply(embeddings)
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(np.ascontiguousarray(vectors, dtype='float32'))
+    return index
+
+
+def save_snapshot(snapshot: IndexSnapshot, path: str):
+    """Write a snapshot to a directory so it can be unloaded and reloaded later"""
+    os.makedirs(path, exist_ok=True)
+    if snapshot.index is not None:
+        faiss.write_index(snapshot.index, os.path.join(path, "index.faiss"))
+        np.save(os.path.join(path, "embeddings.npy"), snapshot.embeddings)
+    if snapshot.projection is not None:
+        snapshot.projection.save(path)
+    with open(os.path.join(path, "chunks.json"), "w") as f:
+        json.dump(list(snapshot.chunks), f)
+    save_metadata(snapshot, path)
+    save_meta(snapshot, path)
+
+
+def save_meta(snapshot: IndexSnapshot, path: str):
+    """Write meta.json, the version and sizes that can be read without loading the snapshot"""
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"version": snapshot.version, "chunks": snapshot.size,
+                   "provenance_records": len(snapshot.metadata), "documents": len(snapshot.documents),
+                   "deleted_chunks": snapshot.deleted_count,
+                   "projection_dims": snapshot.projection.dims if snapshot.projection is not None else None}, f)
+
+
+def save_metadata(snapshot: IndexSnapshot, path: str):
+    """Write a snapshot's provenance records, document hashes and CSV tables"""
+    metadata = snapshot.metadata
+    np.savez(
+        os.path.join(path, "metadata.npz"),
+        chunk_ids=metadata.chunk_ids,
+        source_ids=metadata.source_ids,
+        pages=metadata.pages,
+        rows=metadata.rows,
+        uploaded_at=metadata.uploaded_at
+    )
+    with open(os.path.join(path, "sources.json"), "w") as f:
+        json.dump(list(metadata.sources), f)
+    with open(os.path.join(path, "documents.json"), "w") as f:
+        json.dump(dict(snapshot.documents), f)
+    save_tables(snapshot.tables, path)
+
+
+def load_metadata(path: str) -> Tuple[ChunkMetadata, Mapping[str, dict], Mapping[str, Table]]:
+    """Read what save_metadata wrote"""
+    with open(os.path.join(path, "sources.json")) as f:
+        sources = tuple(json.load(f))
+    with np.load(os.path.join(path, "metadata.npz")) as columns:
+        metadata = ChunkMetadata(
+            sources=sources,
+            chunk_ids=columns["chunk_ids"],
+            source_ids=columns["source_ids"],
+            pages=columns["pages"],
+            rows=columns["rows"],
+            uploaded_at=columns["uploaded_at"]
+        )
+    documents = {}
+    documents_path = os.path.join(path, "documents.json")
+    if os.path.exists(documents_path):
+        with open(documents_path) as f:
+            documents = json.load(f)
+    return metadata, MappingProxyType(documents), load_tables(path)
+
+
+def load_snapshot(path: str) -> IndexSnapshot:
+    """Read a snapshot written by save_snapshot"""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    with open(os.path.join(path, "chunks.json")) as f:
+        chunks = tuple(json.load(f))
+    metadata, documents, tables = load_metadata(path)
+    # The BM25 index is cheap to rebuild, so it isn't saved
+    lexical = LexicalIndex()
+    lexical.add(chunks)
+    index_path = os.path.join(path, "index.faiss")
+    if not os.path.exists(index_path):
+        return IndexSnapshot(version=meta["version"], chunks=chunks, embeddings=None, index=None,
+                             metadata=metadata, lexical=lexical, documents=documents, tables=tables,
+                             live=metadata.live_chunks(len(chunks)))
+    embeddings = np.load(os.path.join(path, "embeddings.npy"))
+    embeddings.setflags(write=False)
+    return IndexSnapshot(
+        version=meta["version"],
+        chunks=chunks,
+        embeddings=embeddings,
+        index=faiss.read_index(index_path),
+        metadata=metadata,
+        lexical=lexical,
+        documents=documents,
+        tables=tables,
+        projection=Projection.load(path),
+        live=metadata.live_chunks(len(chunks))
+    )
+
+
+COLLECTION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def validate_collection_name(name: str):
+    if not COLLECTION_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid collection name '{name}': use letters, digits, '-' or '_'")
+
+
+def snapshot_stats(name: str, snapshot: IndexSnapshot, memory_bytes: int) -> dict:
+    """One loaded collection's entry in stats()"""
+    return {
+        "name": name,
+        "loaded": True,
+        "chunks": snapshot.size,
+        "provenance_records": len(snapshot.metadata),
+        "documents": len(snapshot.documents),
+        "deleted_chunks": snapshot.deleted_count,
+        "snapshot_version": snapshot.version,
+        "memory_bytes": memory_bytes,
+        "projection_dims": snapshot.projection.dims if snapshot.projection is not None else None
+    }
+
+
+class CollectionManager:
+    """Named collections, each with its own SnapshotStore.
+
+    Unloading a collection saves its current snapshot under `root_dir` and
+    drops it from memory; it is loaded again on first use. Saving happens
+    outside the manager's lock, so only requests for the collection being
+    unloaded wait for it.
+    """
+
+    def __init__(self, root_dir: str, dedup_threshold: float = 0.8,
+                 projection_policy: Optional[ProjectionPolicy] = None):
+        self.root_dir = root_dir
+        self.dedup_threshold = dedup_threshold
+        self.projection_policy = projection_policy
+        self._stores: Dict[str, SnapshotStore] = {}
+        self._unloading: Dict[str, threading.Event] = {}  # Set once the collection is saved
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root_dir, name)
+
+    def _is_saved(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self._path(name), "meta.json"))
+
+    validate_name = staticmethod(validate_collection_name)
+
+    def names(self) -> List[str]:
+        """Loaded and unloaded collection names"""
+        saved = set()
+        if os.path.isdir(self.root_dir):
+            saved = {name for name in os.listdir(self.root_dir)
+                     if COLLECTION_NAME_PATTERN.match(name) and self._is_saved(name)}
+        with self._lock:
+            return sorted(saved | set(self._stores))
+
+    def get(self, name: str, create: bool = False) -> Optional[SnapshotStore]:
+        """Return a collection's store, loading it from disk if it was unloaded"""
+        self.validate_name(name)
+        while True:
+            with self._lock:
+                saving = self._unloading.get(name)
+                if saving is None:
+                    store = self._stores.get(name)
+                    if store is None:
+                        if self._is_saved(name):
+                            store = SnapshotStore(load_snapshot(self._path(name)), self.dedup_threshold,
+                                                  self.projection_policy)
+                        elif create:
+                            store = SnapshotStore(dedup_threshold=self.dedup_threshold,
+                                                  projection_policy=self.projection_policy)
+                        else:
+                            return None
+                        self._stores[name] = store
+                    return store
+            # Being unloaded: wait until it is on disk, then load it from there
+            saving.wait()
+
+    def restore(self, name: str, contents: dict) -> IndexSnapshot:
+        """Fill a new or empty collection from an archive's contents (see archive.read_archive)"""
+        return self.get(name, create=True).restore(**contents)
+
+    def load(self, name: str) -> SnapshotStore:
+        store = self.get(name)
+        if store is None:
+            raise KeyError(name)
+        return store
+
+    def unload(self, name: str) -> bool:
+        """Save a collection to disk and free its memory"""
+        self.validate_name(name)
+        with self._lock:
+            saving = self._unloading.get(name)
+            store = self._stores.pop(name, None) if saving is None else None
+            if store is not None:
+                # Ingests that haven't started fail; one in progress finishes and is saved
+                store.closed = True
+                saving = self._unloading[name] = threading.Event()
+        if store is None:
+            if saving is not None:
+                saving.wait()  # Another call is unloading it
+            return self._is_saved(name)
+
+        try:
+            with store._write_lock:
+                path = self._path(name)
+                tmp_path = path + ".tmp"
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                save_snapshot(store.current(), tmp_path)
+                shutil.rmtree(path, ignore_errors=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            # Keep serving it from memory rather than lose what wasn't saved
+            store.closed = False
+            with self._lock:
+                self._stores[name] = store
+            raise
+        finally:
+            with self._lock:
+                del self._unloading[name]
+            saving.set()
+        return True
+
+    def loaded(self) -> Dict[str, SnapshotStore]:
+        with self._lock:
+            return dict(self._stores)
+
+    def stats(self) -> List[dict]:
+        """Per-collection size and memory usage"""
+        loaded = self.loaded()
+        results = []
+        for name in self.names():
+            store = loaded.get(name)
+            if store is not None:
+                snapshot = store.current()
+                memory_bytes = 0
+                if snapshot.index is not None:
+                    memory_bytes = snapshot.embeddings.nbytes + snapshot.index.ntotal * snapshot.index.d * 4
+                results.append(snapshot_stats(name, snapshot, memory_bytes))
+            else:
+                with open(os.path.join(self._path(name), "meta.json")) as f:
+                    meta = json.load(f)
+                results.append({
+                    "name": name,
+                    "loaded": False,
+                    "chunks": meta["chunks"],
+                    "provenance_records": meta["provenance_records"],
+                    "documents": meta.get("documents", 0),
+                    "deleted_chunks": meta.get("deleted_chunks", 0),
+                    "snapshot_version": meta["version"],
+                    "memory_bytes": 0,
+                    "projection_dims": meta.get("projection_dims")
+                })
+        return results
@@ -0,0 +1,134 @@
+# lexical.py - Incremental BM25 inverted index for candidate generation
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens, so "iPhone 15 Pro" -> ["iphone", "15", "pro"]"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """Append-only BM25 inverted index shared by successive index snapshots.
+
+    Chunk ids only ever grow, so each posting list is sorted by id. A snapshot
+    that holds `n_docs` chunks searches only ids below `n_docs`, which lets
+    ingestion append postings for the next snapshot while queries keep a
+    consistent view of the current one. Readers copy posting lists before
+    using them so appends never resize an array that numpy is viewing.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> (chunk ids, term frequencies, chunk lengths)
+        self._postings: Dict[str, Tuple[array, array, array]] = {}
+        self._cumulative_lengths = array('q', [0])  # total tokens in the first i chunks
+
+    @property
+    def size(self) -> int:
+        return len(self._cumulative_lengths) - 1
+
+    def add(self, chunks: List[str]):
+        """Index chunks with ids continuing from the current size"""
+        for text in chunks:
+            chunk_id = self.size
+            terms = Counter(tokenize(text))
+            length = sum(terms.values())
+            for term, frequency in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = (array('i'), array('i'), array('i'))
+                    self._postings[term] = postings
+                postings[0].append(chunk_id)
+                postings[1].append(frequency)
+                postings[2].append(length)
+            self._cumulative_lengths.append(self._cumulative_lengths[-1] + length)
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(chunk ids, term frequencies, chunk lengths) of one term as int32 arrays"""
+        postings = self._postings.get(term)
+        if postings is None:
+            return None
+        return tuple(np.frombuffer(column[:], dtype='int32') for column in postings)
+
+    def _total_length(self, n_docs: int) -> int:
+        return self._cumulative_lengths[n_docs]
+
+    def export(self, n_docs: int) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Flatten the postings of the first n_docs chunks into CSR arrays.
+
+        Returns (terms, offsets, ids, frequencies, lengths, cumulative_lengths);
+        term i's postings are rows offsets[i]:offsets[i + 1].
+        """
+        terms = []
+        columns = ([], [], [])
+        offsets = [0]
+        for term in sorted(self._postings):
+            ids, frequencies, lengths = self._term_postings(term)
+            end = int(np.searchsorted(ids, n_docs))
+            if end == 0:
+                continue
+            terms.append(term)
+            for column, values in zip(columns, (ids, frequencies, lengths)):
+                column.append(values[:end])
+            offsets.append(offsets[-1] + end)
+        flat = [np.concatenate(column) if column else np.empty(0, dtype='int32') for column in columns]
+        cumulative = np.frombuffer(self._cumulative_lengths[:n_docs + 1], dtype='int64')
+        return terms, np.asarray(offsets, dtype='int64'), flat[0], flat[1], flat[2], cumulative
+
+    def search(self, query_text: str, top_k: int, n_docs: Optional[int] = None,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, ids) of the best BM25 matches among the first n_docs chunks"""
+        n_docs = self.size if n_docs is None else n_docs
+        if n_docs == 0:
+            return np.empty(0, dtype='float32'), np.empty(0, dtype='int64')
+        average_length = max(self._total_length(n_docs) / n_docs, 1.0)
+
+        all_ids = []
+        all_scores = []
+        for term in set(tokenize(query_text)):
+            postings = self._term_postings(term)
+            if postings is None:
+                continue
+            ids = postings[0]
+            end = int(np.searchsorted(ids, n_docs))
+            if end == 0:
+                continue
+            ids = ids[:end]
+            frequencies = postings[1][:end].astype('float32')
+            doc_lengths = postings[2][:end].astype('float32')
+
+            idf = math.log(1.0 + (n_docs - end + 0.5) / (end + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_lengths / average_length)
+            all_ids.append(ids)
+            all_scores.append(idf * frequencies * (self.k1 + 1.0) / (frequencies + norm))
+
+        if not all_ids:
+            return np.empty(0, dtype='float32'), np.empty(0, dtype='int64')
+
+        candidate_ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype('float32')
+        if mask is not None:
+            keep = mask[candidate_ids]
+            candidate_ids, scores = candidate_ids[keep], scores[keep]
+
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        return scores[order], candidate_ids[order].astype('int64')
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse several ranked id lists into one, best first"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            chunk_id = int(chunk_id)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])
@@ -0,0 +1,155 @@
+# metadata.py - Columnar per-chunk metadata and filter evaluation
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+NO_VALUE = -1  # Page or row number for chunks where it doesn't apply
+
+
+@dataclass(frozen=True)
+class ChunkMetadata:
+    """Provenance records stored as one compact numpy array per field.
+
+    Each record says where one occurrence of a chunk came from. Duplicate
+    chunks are stored once, so a chunk id can have several records. Source
+    file names are stored once in `sources`; each record holds an int32 index
+    into that table.
+    """
+    sources: Tuple[str, ...]
+    chunk_ids: np.ndarray    # int32, the stored chunk each record points to
+    source_ids: np.ndarray   # int32
+    pages: np.ndarray        # int32, NO_VALUE for CSV rows
+    rows: np.ndarray         # int32, NO_VALUE for PDF text
+    uploaded_at: np.ndarray  # float64 epoch seconds
+
+    def __len__(self) -> int:
+        return len(self.source_ids)
+
+    @classmethod
+    def empty(cls) -> "ChunkMetadata":
+        return cls(
+            sources=(),
+            chunk_ids=np.empty(0, dtype='int32'),
+            source_ids=np.empty(0, dtype='int32'),
+            pages=np.empty(0, dtype='int32'),
+            rows=np.empty(0, dtype='int32'),
+            uploaded_at=np.empty(0, dtype='float64')
+        )
+
+    @classmethod
+    def for_document(cls, source: str, count: int, pages: Optional[Sequence[int]] = None,
+                     rows: Optional[Sequence[int]] = None, uploaded_at: Optional[float] = None) -> "ChunkMetadata":
+        """Records for `count` chunks from one uploaded file, numbered 0..count-1 until assigned"""
+        missing = np.full(count, NO_VALUE, dtype='int32')
+        return cls(
+            sources=(source,),
+            chunk_ids=np.arange(count, dtype='int32'),
+            source_ids=np.zeros(count, dtype='int32'),
+            pages=np.asarray(pages, dtype='int32') if pages is not None else missing,
+            rows=np.asarray(rows, dtype='int32') if rows is not None else missing.copy(),
+            uploaded_at=np.full(count, time.time() if uploaded_at is None else uploaded_at, dtype='float64')
+        )
+
+    def concat(self, other: "ChunkMetadata") -> "ChunkMetadata":
+        """Append another batch, merging its source names into this table"""
+        sources = list(self.sources)
+        positions = {name: i for i, name in enumerate(sources)}
+        remap = np.empty(len(other.sources), dtype='int32')
+        for i, name in enumerate(other.sources):
+            if name not in positions:
+                positions[name] = len(sources)
+                sources.append(name)
+            remap[i] = positions[name]
+        return ChunkMetadata(
+            sources=tuple(sources),
+            chunk_ids=np.concatenate([self.chunk_ids, other.chunk_ids]),
+            source_ids=np.concatenate([self.source_ids, remap[other.source_ids]]),
+            pages=np.concatenate([self.pages, other.pages]),
+            rows=np.concatenate([self.rows, other.rows]),
+            uploaded_at=np.concatenate([self.uploaded_at, other.uploaded_at])
+        )
+
+    def with_chunk_ids(self, chunk_ids: Sequence[int]) -> "ChunkMetadata":
+        """Point each record at the stored chunk it was deduplicated to"""
+        return ChunkMetadata(
+            sources=self.sources,
+            chunk_ids=np.asarray(chunk_ids, dtype='int32'),
+            source_ids=self.source_ids,
+            pages=self.pages,
+            rows=self.rows,
+            uploaded_at=self.uploaded_at
+        )
+
+    def take(self, record_ids: np.ndarray) -> "ChunkMetadata":
+        """The selected records, in order; the source table is kept as is"""
+        return ChunkMetadata(
+            sources=self.sources,
+            chunk_ids=self.chunk_ids[record_ids],
+            source_ids=self.source_ids[record_ids],
+            pages=self.pages[record_ids],
+            rows=self.rows[record_ids],
+            uploaded_at=self.uploaded_at[record_ids]
+        )
+
+    def live_chunks(self, n_chunks: int) -> Optional[np.ndarray]:
+        """Mask of chunk ids that still have a provenance record, or None if all do.
+
+        A chunk loses its last record when every document it came from has
+        been deleted; it stays in the index as a tombstone until compaction.
+        """
+        if n_chunks == 0:
+            return None
+        live = np.bincount(self.chunk_ids, minlength=n_chunks)[:n_chunks] > 0
+        return None if live.all() else live
+
+    def describe(self, chunk_id: int) -> List[dict]:
+        """All provenance records of one chunk as plain dicts"""
+        records = []
+        for i in np.flatnonzero(self.chunk_ids == chunk_id):
+            page = int(self.pages[i])
+            row = int(self.rows[i])
+            records.append({
+                "source": self.sources[self.source_ids[i]],
+                "page": page if page != NO_VALUE else None,
+                "row": row if row != NO_VALUE else None,
+                "uploaded_at": float(self.uploaded_at[i])
+            })
+        return records
+
+    def mask(self, n_chunks: int, sources: Optional[List[str]] = None, page_min: Optional[int] = None,
+             page_max: Optional[int] = None, uploaded_after: Optional[float] = None,
+             uploaded_before: Optional[float] = None) -> np.ndarray:
+        """Evaluate a filter into a boolean mask over chunk ids.
+
+        A chunk is selected when any of its provenance records matches.
+        """
+        matches = np.ones(len(self), dtype=bool)
+        if sources is not None:
+            names = set(sources)
+            wanted = [i for i, name in enumerate(self.sources) if name in names]
+            matches &= np.isin(self.source_ids, wanted)
+        if page_min is not None:
+            matches &= self.pages >= page_min
+        if page_max is not None:
+            matches &= (self.pages != NO_VALUE) & (self.pages <= page_max)
+        if uploaded_after is not None:
+            matches &= self.uploaded_at >= uploaded_after
+        if uploaded_before is not None:
+            matches &= self.uploaded_at <= uploaded_before
+        mask = np.zeros(n_chunks, dtype=bool)
+        mask[self.chunk_ids[matches]] = True
+        return mask
+
+
+def id_selector(mask: np.ndarray) -> Tuple[faiss.SearchParameters, np.ndarray]:
+    """Pack a boolean mask into a FAISS bitmap selector.
+
+    The selector points into the packed bitmap's memory, so the bitmap is
+    returned too and must be kept alive until the search finishes.
+    """
+    bitmap = np.packbits(mask, bitorder='little')
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    return faiss.SearchParameters(sel=selector), bitmap
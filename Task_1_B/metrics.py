@@ -0,0 +1,73 @@
+# metrics.py - Per-stage request timings and Prometheus metrics
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Stages range from sub-millisecond index searches to multi-second generation
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+QUERY_STAGE_SECONDS = Histogram(
+    'rag_query_stage_seconds', 'Time spent in each query stage', ['stage'], buckets=STAGE_BUCKETS)
+QUERY_SECONDS = Histogram(
+    'rag_query_seconds', 'End-to-end query time', ['mode'], buckets=STAGE_BUCKETS)
+INGEST_STAGE_SECONDS = Histogram(
+    'rag_ingest_stage_seconds', 'Time spent in each ingestion stage', ['stage'], buckets=STAGE_BUCKETS)
+INGESTED_DOCUMENTS = Counter(
+    'rag_ingested_documents_total', 'Documents ingested', ['type'])
+INGESTED_CHUNKS = Counter(
+    'rag_ingested_chunks_total', 'Chunks ingested, by whether they were new or duplicates', ['type', 'outcome'])
+DUPLICATE_UPLOADS = Counter(
+    'rag_duplicate_uploads_total', 'Uploads skipped because the same bytes were already ingested', ['type'])
+INDEX_CHUNKS = Gauge(
+    'rag_index_chunks', 'Chunks stored per collection', ['collection'])
+INDEX_MEMORY_BYTES = Gauge(
+    'rag_index_memory_bytes', 'Embedding and FAISS memory per loaded collection', ['collection'])
+
+
+class StageTimer:
+    """Collects the duration of each stage of one request.
+
+    Every stage is also observed in `histogram`, so the same measurements
+    feed the response's timings, the Server-Timing header and /metrics.
+    """
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.durations: Dict[str, float] = {}  # seconds, in stage order
+
+    def record(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.histogram.labels(stage=name).observe(seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def as_ms(self) -> Dict[str, float]:
+        """Durations as {"<stage>_ms": milliseconds}"""
+        return {f"{name}_ms": round(seconds * 1000, 3) for name, seconds in self.durations.items()}
+
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header"""
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.durations.items())
+
+
+def record_ingestion(doc_type: str, plan):
+    """Count one ingested document and what dedup did with its chunks"""
+    INGESTED_DOCUMENTS.labels(type=doc_type).inc()
+    INGESTED_CHUNKS.labels(type=doc_type, outcome='new').inc(len(plan.new_positions))
+    INGESTED_CHUNKS.labels(type=doc_type, outcome='exact_duplicate').inc(plan.exact_duplicates)
+    INGESTED_CHUNKS.labels(type=doc_type, outcome='near_duplicate').inc(plan.near_duplicates)
+
+
+def update_index_gauges(collection_stats):
+    """Refresh per-collection size gauges from CollectionManager.stats()"""
+    for stats in collection_stats:
+        INDEX_CHUNKS.labels(collection=stats["name"]).set(stats["chunks"])
+        INDEX_MEMORY_BYTES.labels(collection=stats["name"]).set(stats["memory_bytes"])
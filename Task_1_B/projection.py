@@ -0,0 +1,110 @@
+# projection.py - PCA projection of embeddings to fewer dimensions for the search index
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+PROJECTION_FILE = "projection.npz"
+
+
+@dataclass(frozen=True)
+class Projection:
+    """A PCA basis fitted on a collection's embeddings.
+
+    The search index holds projected vectors and queries are projected the
+    same way. Centering cancels out of L2 distances, so distances in the
+    projected space approximate those of the full vectors, minus the
+    variance the dropped components carried.
+    """
+    mean: np.ndarray        # float32 (d,)
+    components: np.ndarray  # float32 (d, dims), orthonormal columns
+    fitted_chunks: int      # Collection size when fitted
+    residual: float         # Share of the fit sample's variance the projection drops
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, dims: int, sample_size: int = 20000, seed: int = 0) -> "Projection":
+        """Fit the top `dims` principal components on up to `sample_size` embeddings"""
+        sample = embeddings
+        if len(embeddings) > sample_size:
+            rng = np.random.RandomState(seed)
+            sample = embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))]
+        sample = np.asarray(sample, dtype='float64')
+        mean = sample.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        variance = singular_values ** 2
+        total = float(variance.sum())
+        return cls(
+            mean=mean.astype('float32'),
+            components=np.ascontiguousarray(vt[:dims].T, dtype='float32'),
+            fitted_chunks=len(embeddings),
+            residual=float(variance[dims:].sum()) / total if total else 0.0
+        )
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        """Project vectors (n, d) to (n, dims)"""
+        return np.ascontiguousarray((np.asarray(vectors, dtype='float32') - self.mean) @ self.components)
+
+    def residual_share(self, vectors: np.ndarray) -> float:
+        """Share of the vectors' variance around the fitted mean that the projection drops"""
+        centered = np.asarray(vectors, dtype='float32') - self.mean
+        total = float((centered ** 2).sum())
+        if total == 0.0:
+            return 0.0
+        kept = float(((centered @ self.components) ** 2).sum())
+        return max(0.0, 1.0 - kept / total)
+
+    def save(self, path: str):
+        np.savez(os.path.join(path, PROJECTION_FILE), mean=self.mean, components=self.components,
+                 fitted_chunks=self.fitted_chunks, residual=self.residual)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Projection"]:
+        """Read what save wrote; None for indexes saved without a projection"""
+        file_path = os.path.join(path, PROJECTION_FILE)
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as arrays:
+            return cls(mean=arrays["mean"], components=arrays["components"],
+                       fitted_chunks=int(arrays["fitted_chunks"]), residual=float(arrays["residual"]))
+
+
+@dataclass(frozen=True)
+class ProjectionPolicy:
+    """When a collection's index should be projected, and when the projection is refitted.
+
+    `dims` of 0 keeps full-dimension vectors. A projection is first fitted
+    once the collection holds `min_chunks` chunks, and refitted when the
+    collection has grown by `refit_growth` times since, or when a new batch
+    of at least `drift_batch` chunks loses more than `drift` times the
+    variance the fit sample did.
+    """
+    dims: int = 0
+    min_chunks: int = 1024
+    refit_growth: float = 2.0
+    drift: float = 1.5
+    drift_batch: int = 16
+    sample_size: int = 20000
+
+    def update(self, projection: Optional[Projection], embeddings: np.ndarray,
+               batch: np.ndarray) -> Tuple[Optional[Projection], bool]:
+        """The projection to index `embeddings` with after `batch` was appended, and whether it changed"""
+        if self.dims <= 0 or self.dims >= embeddings.shape[1]:
+            return None, projection is not None
+        if projection is None:
+            if len(embeddings) < max(self.min_chunks, self.dims):
+                return None, False
+            return Projection.fit(embeddings, self.dims, self.sample_size), True
+
+        stale = (projection.dims != self.dims
+                 or projection.mean.shape[0] != embeddings.shape[1]
+                 or len(embeddings) >= projection.fitted_chunks * self.refit_growth
+                 or (len(batch) >= self.drift_batch
+                     and projection.residual_share(batch) > self.drift * max(projection.residual, 1e-6)))
+        if stale:
+            return Projection.fit(embeddings, self.dims, self.sample_size), True
+        return projection, False
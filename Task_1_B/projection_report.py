@@ -0,0 +1,132 @@
+# projection_report.py - Index memory, search latency and recall of PCA-projected embeddings
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import config
+import synthetic_corpus
+from benchmark import create_system, summarize
+from index_store import PROJECTED_OVERFETCH, IndexSnapshot, SnapshotStore
+from metadata import ChunkMetadata
+from projection import ProjectionPolicy
+
+
+def corpus_embeddings(rag, work_dir: str, pages: int, rows: int, seed: int):
+    """Chunks of a synthetic PDF and CSV and their full-size embeddings"""
+    pdf_path = os.path.join(work_dir, f"synthetic_{pages}p.pdf")
+    csv_path = os.path.join(work_dir, f"synthetic_{rows}r.csv")
+    synthetic_corpus.write_pdf(pdf_path, pages, seed)
+    synthetic_corpus.write_csv(csv_path, rows, seed)
+    chunks, _ = rag.process_pdf(pdf_path)
+    csv_chunks, _ = rag.process_csv(csv_path)
+    chunks = chunks + csv_chunks
+    return chunks, np.asarray(rag.embedder.encode(chunks), dtype='float32')
+
+
+def build(chunks: List[str], embeddings: np.ndarray, dims: int) -> IndexSnapshot:
+    """A snapshot indexed with `dims`-dimension projected vectors, fitted on the whole corpus"""
+    store = SnapshotStore(projection_policy=ProjectionPolicy(dims=dims, min_chunks=0))
+    return store.publish(chunks, embeddings, ChunkMetadata.for_document("corpus", len(chunks)))
+
+
+def measure(snapshot: IndexSnapshot, queries: np.ndarray, top_k: int, exact: Optional[np.ndarray]) -> Dict:
+    """Search latency and recall against the full-dimension results.
+
+    `search` is what queries get: projected candidates reranked with the full
+    vectors. `projected_only` ranks by projected distance alone.
+    """
+    latencies, ids, projected = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = snapshot.search(query[None, :], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(found[0])
+        if snapshot.projection is not None:
+            projected.append(snapshot.index.search(snapshot.projection.apply(query[None, :]), top_k)[1][0])
+
+    index_bytes = snapshot.index.ntotal * snapshot.index.d * 4
+    result = {
+        "dims": snapshot.index.d,
+        "index_bytes": index_bytes,
+        "total_bytes": index_bytes + snapshot.embeddings.nbytes,
+        "variance_dropped": round(snapshot.projection.residual, 4) if snapshot.projection is not None else 0.0,
+        "search": summarize(latencies),
+        "ids": np.array(ids)
+    }
+    if exact is not None:
+        result[f"recall_at_{top_k}"] = round(float(np.mean(
+            [len(set(a) & set(b)) / top_k for a, b in zip(exact, ids)])), 4)
+        result[f"recall_at_{top_k}_projected_only"] = round(float(np.mean(
+            [len(set(a) & set(b)) / top_k for a, b in zip(exact, projected)])), 4)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PCA-projected indexes with full-dimension embeddings")
+    parser.add_argument("--dims", default="128,64,32", help="Comma-separated projection sizes")
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic PDF pages")
+    parser.add_argument("--rows", type=int, default=4000, help="Synthetic CSV rows")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--backend", choices=["offline", "models"], default="models",
+                        help="models: EMBEDDING_BACKEND (MiniLM); offline: hashing embedder")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="projection_report.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-projection-") as work_dir:
+        rag = create_system(args.backend, os.path.join(work_dir, "collections"))
+        chunks, embeddings = corpus_embeddings(rag, work_dir, args.pages, args.rows, args.seed)
+        queries = np.asarray(rag.embedder.encode(synthetic_corpus.queries(args.queries, seed=args.seed + 1)),
+                             dtype='float32')
+        rag.embedder.close()
+
+    print(f"Full-dimension baseline over {len(chunks)} chunks...")
+    baseline = measure(build(chunks, embeddings, 0), queries, args.top_k, None)
+    runs = []
+    for dims in (int(value) for value in args.dims.split(",")):
+        print(f"Projecting to {dims} dims...")
+        start = time.perf_counter()
+        snapshot = build(chunks, embeddings, dims)
+        run = measure(snapshot, queries, args.top_k, baseline["ids"])
+        run["fit_and_index_s"] = round(time.perf_counter() - start, 3)
+        run["index_memory_saved"] = round(1 - run["index_bytes"] / baseline["index_bytes"], 4)
+        run["total_memory_saved"] = round(1 - run["total_bytes"] / baseline["total_bytes"], 4)
+        run["search_speedup_p50"] = round(baseline["search"]["p50_ms"] / run["search"]["p50_ms"], 2)
+        runs.append(run)
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": args.backend
+        },
+        "settings": {
+            "embedding_model": config.EMBEDDING_MODEL if args.backend == "models" else "hashing",
+            "chunks": len(chunks),
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "projected_overfetch": PROJECTED_OVERFETCH
+        },
+        "baseline": {key: value for key, value in baseline.items() if key != "ids"},
+        "runs": [{key: value for key, value in run.items() if key != "ids"} for run in runs]
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps([{key: run[key] for key in ("dims", f"recall_at_{args.top_k}",
+                                                  f"recall_at_{args.top_k}_projected_only", "index_memory_saved",
+                                                  "search_speedup_p50")} for run in report["runs"]], indent=2))
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
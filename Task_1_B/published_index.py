@@ -0,0 +1,388 @@
+# published_index.py - Immutable index versions on disk, memory-mapped read-only by query workers
+import json
+import os
+import shutil
+import threading
+import time
+from collections.abc import Sequence
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from index_store import (COLLECTION_NAME_PATTERN, IndexSnapshot, load_metadata, save_meta, save_metadata,
+                         snapshot_stats, validate_collection_name)
+from lexical import LexicalIndex
+from projection import Projection
+
+CURRENT_FILE = "CURRENT"  # Holds the name of the latest complete version directory
+
+
+class MappedChunks(Sequence):
+    """Chunk texts decoded on access from one memory-mapped UTF-8 buffer"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes().decode('utf-8')
+
+
+class MappedFlatIndex:
+    """Exact L2 search over memory-mapped embeddings, in place of faiss.IndexFlatL2.
+
+    FAISS keeps its own copy of the vectors in each process; searching the
+    mapped file directly lets every worker share the page cache instead.
+    Squared norms are precomputed at publish time, so a search is one
+    matrix-vector product.
+    """
+    accepts_mask = True
+
+    def __init__(self, embeddings: np.ndarray, norms: np.ndarray):
+        self.embeddings = embeddings
+        self.norms = norms
+        self.ntotal, self.d = embeddings.shape
+
+    def search(self, queries: np.ndarray, k: int,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.asarray(queries, dtype='float32')
+        distances = np.full((len(queries), k), np.inf, dtype='float32')
+        labels = np.full((len(queries), k), -1, dtype='int64')
+        if self.ntotal == 0:
+            return distances, labels
+
+        all_distances = (self.norms[None, :] - 2.0 * (queries @ self.embeddings.T)
+                         + (queries ** 2).sum(axis=1, keepdims=True))
+        np.maximum(all_distances, 0.0, out=all_distances)
+        if mask is not None:
+            all_distances[:, ~mask[:self.ntotal]] = np.inf
+
+        count = min(k, self.ntotal)
+        for row, row_distances in enumerate(all_distances):
+            # Everything within the k-th distance, then ties broken by lower id
+            kth = np.partition(row_distances, count - 1)[count - 1]
+            top = np.flatnonzero(row_distances <= kth)
+            top = top[np.lexsort((top, row_distances[top]))][:count]
+            top = top[np.isfinite(row_distances[top])]
+            distances[row, :len(top)] = row_distances[top]
+            labels[row, :len(top)] = top
+        return distances, labels
+
+
+class MappedLexicalIndex(LexicalIndex):
+    """Read-only BM25 index over memory-mapped CSR posting arrays"""
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, ids: np.ndarray, frequencies: np.ndarray,
+                 lengths: np.ndarray, cumulative_lengths: np.ndarray):
+        super().__init__()
+        self._term_rows = {term: row for row, term in enumerate(terms)}
+        self._offsets = offsets
+        self._columns = (ids, frequencies, lengths)
+        self._cumulative = cumulative_lengths
+
+    @property
+    def size(self) -> int:
+        return len(self._cumulative) - 1
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        row = self._term_rows.get(term)
+        if row is None:
+            return None
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return tuple(column[start:end] for column in self._columns)
+
+    def _total_length(self, n_docs: int) -> int:
+        return int(self._cumulative[n_docs])
+
+    def add(self, chunks: List[str]):
+        raise TypeError("Published indexes are read-only")
+
+
+def write_version(snapshot: IndexSnapshot, path: str):
+    """Write a snapshot in the memory-mappable layout read by read_version"""
+    os.makedirs(path, exist_ok=True)
+    if snapshot.embeddings is not None:
+        embeddings = np.ascontiguousarray(snapshot.embeddings, dtype='float32')
+        np.save(os.path.join(path, "embeddings.npy"), embeddings)
+        if snapshot.projection is not None:
+            # Searches scan the projected vectors; the full ones are only read to rescore
+            snapshot.projection.save(path)
+            embeddings = snapshot.projection.apply(embeddings)
+            np.save(os.path.join(path, "projected.npy"), embeddings)
+        np.save(os.path.join(path, "norms.npy"), (embeddings ** 2).sum(axis=1))
+
+    encoded = [chunk.encode('utf-8') for chunk in snapshot.chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(chunk) for chunk in encoded])
+    np.save(os.path.join(path, "chunk_data.npy"), np.frombuffer(b''.join(encoded), dtype='uint8'))
+    np.save(os.path.join(path, "chunk_offsets.npy"), offsets)
+
+    terms, term_offsets, ids, frequencies, lengths, cumulative = snapshot.lexical.export(snapshot.size)
+    with open(os.path.join(path, "lexical_terms.json"), "w") as f:
+        json.dump(terms, f)
+    for name, values in (("offsets", term_offsets), ("ids", ids), ("frequencies", frequencies),
+                         ("lengths", lengths), ("cumulative_lengths", cumulative)):
+        np.save(os.path.join(path, f"lexical_{name}.npy"), values)
+
+    save_metadata(snapshot, path)
+    save_meta(snapshot, path)
+
+
+def read_version(path: str) -> IndexSnapshot:
+    """Open a published version; large arrays are mapped read-only, not loaded"""
+    def mapped(name: str) -> np.ndarray:
+        return np.load(os.path.join(path, name), mmap_mode='r')
+
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    with open(os.path.join(path, "lexical_terms.json")) as f:
+        terms = json.load(f)
+    metadata, documents, tables = load_metadata(path)
+
+    embeddings = index = None
+    projection = Projection.load(path)
+    if os.path.exists(os.path.join(path, "embeddings.npy")):
+        embeddings = mapped("embeddings.npy")
+        vectors = embeddings if projection is None else mapped("projected.npy")
+        index = MappedFlatIndex(vectors, mapped("norms.npy"))
+    chunks = MappedChunks(mapped("chunk_data.npy"), mapped("chunk_offsets.npy"))
+    return IndexSnapshot(
+        version=meta["version"],
+        chunks=chunks,
+        embeddings=embeddings,
+        index=index,
+        metadata=metadata,
+        lexical=MappedLexicalIndex(terms, mapped("lexical_offsets.npy"), mapped("lexical_ids.npy"),
+                                   mapped("lexical_frequencies.npy"), mapped("lexical_lengths.npy"),
+                                   mapped("lexical_cumulative_lengths.npy")),
+        documents=documents,
+        tables=tables,
+        projection=projection,
+        live=metadata.live_chunks(len(chunks))
+    )
+
+
+def _version_name(version: int) -> str:
+    return f"v{version:08d}"
+
+
+def current_version_path(publish_dir: str, name: str) -> Optional[str]:
+    """Directory of a collection's latest published version, or None"""
+    try:
+        with open(os.path.join(publish_dir, name, CURRENT_FILE)) as f:
+            return os.path.join(publish_dir, name, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+class IndexPublisher:
+    """Writer side: publishes each collection's snapshots as immutable version directories.
+
+    A version is written to a temporary directory and renamed into place
+    before the CURRENT pointer is atomically replaced, so readers only ever
+    see complete versions. Older versions beyond `keep_versions` are
+    deleted; readers that still map them keep working because the data
+    stays valid until they unmap it.
+
+    Each version is a full export, BM25 postings included, so its cost
+    grows with the collection. `schedule` publishes at most once per
+    `min_interval` seconds per collection, and only the newest snapshot
+    from a burst of uploads is written.
+    """
+
+    def __init__(self, publish_dir: str, keep_versions: int = 3, min_interval: float = 0.0):
+        self.publish_dir = publish_dir
+        self.keep_versions = max(1, keep_versions)
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[str, IndexSnapshot] = {}  # Newest unpublished snapshot per collection
+        self._published_at: Dict[str, float] = {}
+        self._busy = False
+        self._flushing = False
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def schedule(self, name: str, snapshot: IndexSnapshot):
+        """Publish a snapshot in the background, coalescing snapshots that arrive within `min_interval`"""
+        if self.min_interval <= 0:
+            self.publish(name, snapshot)
+            return
+        with self._changed:
+            pending = self._pending.get(name)
+            if pending is None or snapshot.version > pending.version:
+                self._pending[name] = snapshot
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="index-publisher", daemon=True)
+                self._thread.start()
+            self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while True:
+                    now = time.monotonic()
+                    due = {name: self._published_at.get(name, float('-inf')) + self.min_interval
+                           for name in self._pending}
+                    ready = [name for name, at in due.items() if at <= now or self._flushing]
+                    if ready:
+                        break
+                    self._changed.wait(min(due.values()) - now if due else None)
+                name = ready[0]
+                snapshot = self._pending.pop(name)
+                self._published_at[name] = now
+                self._busy = True
+            try:
+                self.publish(name, snapshot)
+            except Exception as e:
+                print(f"Error publishing collection '{name}': {e}")
+            finally:
+                with self._changed:
+                    self._busy = False
+                    self._changed.notify_all()
+
+    def flush(self):
+        """Publish every pending snapshot now and wait for it, e.g. before shutting down"""
+        with self._changed:
+            self._flushing = True
+            self._changed.notify_all()
+            while self._pending or self._busy:
+                self._changed.wait()
+            self._flushing = False
+
+    def published_version(self, name: str) -> int:
+        path = current_version_path(self.publish_dir, name)
+        if path is None:
+            return 0
+        with open(os.path.join(path, "meta.json")) as f:
+            return json.load(f)["version"]
+
+    def publish(self, name: str, snapshot: IndexSnapshot) -> bool:
+        """Publish a snapshot unless the same or a newer version is already out"""
+        with self._lock:
+            if snapshot.version <= self.published_version(name):
+                return False
+            collection_dir = os.path.join(self.publish_dir, name)
+            version_name = _version_name(snapshot.version)
+            tmp_path = os.path.join(collection_dir, f".{version_name}.tmp")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            write_version(snapshot, tmp_path)
+            os.replace(tmp_path, os.path.join(collection_dir, version_name))
+
+            pointer_tmp = os.path.join(collection_dir, f".{CURRENT_FILE}.tmp")
+            with open(pointer_tmp, "w") as f:
+                f.write(version_name)
+            os.replace(pointer_tmp, os.path.join(collection_dir, CURRENT_FILE))
+
+            versions = sorted(entry for entry in os.listdir(collection_dir) if entry.startswith("v"))
+            for old in versions[:-self.keep_versions]:
+                shutil.rmtree(os.path.join(collection_dir, old), ignore_errors=True)
+            return True
+
+
+class PublishedStore:
+    """Read-only stand-in for SnapshotStore holding a mapped snapshot"""
+
+    def __init__(self, snapshot: IndexSnapshot, path: Optional[str] = None):
+        self._current = snapshot
+        self.path = path
+        self.closed = False
+
+    def current(self) -> IndexSnapshot:
+        return self._current
+
+
+class PublishedCollections:
+    """Reader side: follows the writer's published versions of every collection.
+
+    A background thread polls each collection's CURRENT pointer and maps a
+    new version as soon as it appears, swapping it in the same way a
+    SnapshotStore publishes. In-flight queries keep the snapshot they
+    pinned. `on_update(name, snapshot)` is called after each swap. Offers
+    the read-only part of CollectionManager's interface.
+    """
+
+    def __init__(self, publish_dir: str, poll_seconds: float = 1.0,
+                 on_update: Optional[Callable[[str, IndexSnapshot], None]] = None):
+        self.publish_dir = publish_dir
+        self.poll_seconds = poll_seconds
+        self.on_update = on_update
+        self._stores: Dict[str, PublishedStore] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.refresh()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="index-follower", daemon=True)
+            self._thread.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing published indexes: {e}")
+
+    def refresh(self):
+        """Map any collection version published since the last refresh"""
+        if not os.path.isdir(self.publish_dir):
+            return
+        for name in os.listdir(self.publish_dir):
+            if not COLLECTION_NAME_PATTERN.match(name):
+                continue
+            path = current_version_path(self.publish_dir, name)
+            with self._lock:
+                store = self._stores.get(name)
+            if path is None or (store is not None and store.path == path):
+                continue
+            try:
+                snapshot = read_version(path)
+            except FileNotFoundError:
+                continue  # Superseded and removed while we read it; the next poll sees the newer one
+            with self._lock:
+                self._stores[name] = PublishedStore(snapshot, path)
+            if self.on_update is not None:
+                self.on_update(name, snapshot)
+
+    validate_name = staticmethod(validate_collection_name)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._stores)
+
+    def get(self, name: str, create: bool = False) -> Optional[PublishedStore]:
+        """A collection's store; `create` gives an empty placeholder until the writer publishes it"""
+        self.validate_name(name)
+        with self._lock:
+            store = self._stores.get(name)
+            if store is None and create:
+                store = self._stores[name] = PublishedStore(IndexSnapshot.empty())
+            return store
+
+    def load(self, name: str) -> PublishedStore:
+        store = self.get(name)
+        if store is None:
+            raise KeyError(name)
+        return store
+
+    def loaded(self) -> Dict[str, PublishedStore]:
+        with self._lock:
+            return dict(self._stores)
+
+    def stats(self) -> List[dict]:
+        """Per-collection size; mapped memory is shared with other workers"""
+        results = []
+        for name, store in sorted(self.loaded().items()):
+            snapshot = store.current()
+            stats = snapshot_stats(name, snapshot, 0)
+            stats["mapped_bytes"] = snapshot.embeddings.nbytes if snapshot.embeddings is not None else 0
+            results.append(stats)
+        return results
@@ -0,0 +1,205 @@
+# quantization_report.py - Speed and answer quality of int8 CPU inference against fp32
+import argparse
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+import config
+from answer_cache import AnswerCache
+from app import RAGSystem
+from backends import configure_torch_threads, create_embedder, create_generator
+from metadata import ChunkMetadata
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Fixed evaluation set over the bundled sample files, so runs are comparable
+EVAL_DOCUMENTS = ("sample_document.pdf", "sample_data.csv")
+EVAL_QUERIES = [
+    "What are the main challenges in AI development?",
+    "How can machine learning improve software engineering?",
+    "What tools are recommended for data processing?",
+    "What products are available in the electronics category?",
+    "Which items have the highest ratings?",
+    "Show me products released in 2024",
+    "How does AI help with CI/CD pipelines?",
+    "Which AI coding assistants are mentioned?",
+    "What are the ethical considerations of AI?",
+    "How much does the MacBook Air M2 cost?",
+    "Which product has noise cancellation?",
+    "What chip does the Vision Pro use?",
+]
+
+
+def model_size_mb(module) -> float:
+    """Serialized size of a torch module's weights"""
+    import torch
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+    return round(buffer.tell() / (1024 * 1024), 1)
+
+
+def token_f1(prediction: str, reference: str) -> float:
+    """SQuAD-style token overlap F1"""
+    predicted, expected = prediction.lower().split(), reference.lower().split()
+    common = sum((Counter(predicted) & Counter(expected)).values())
+    if not predicted or not expected or not common:
+        return float(predicted == expected)
+    precision, recall = common / len(predicted), common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+def load_variant(quantize: bool, collections_dir: str) -> RAGSystem:
+    """A RAGSystem on the configured models, fp32 or int8, with the answer cache off"""
+    embedder = create_embedder('sentence-transformers', config.EMBEDDING_MODEL, quantize=quantize)
+    llm = create_generator('transformers', config.GENERATION_MODEL, quantize=quantize)
+    rag = RAGSystem(embedder, llm, collections_dir=collections_dir,
+                    answer_cache=AnswerCache(max_entries=0, semantic_entries=0))
+    rag.load_models()
+    if not rag.ready:
+        raise RuntimeError(f"Models failed to load: {rag.load_error}")
+    return rag
+
+
+def eval_chunks(rag: RAGSystem) -> List[str]:
+    chunks, _ = rag.process_pdf(os.path.join(HERE, EVAL_DOCUMENTS[0]))
+    rows, _ = rag.process_csv(os.path.join(HERE, EVAL_DOCUMENTS[1]))
+    return chunks + rows
+
+
+def best_of(repeats: int, fn) -> float:
+    """Fastest of several timed runs, in seconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(rag: RAGSystem, chunks: List[str], prompts: List[str], top_k: int, repeats: int) -> Dict:
+    """Timings and outputs of one variant on the evaluation set.
+
+    `prompts` are built from the fp32 retrieval results, so the generator is
+    compared on identical inputs.
+    """
+    embeddings = rag.embedder.encode(chunks)
+    embed_seconds = best_of(repeats, lambda: rag.embedder.encode(chunks))
+    query_seconds = best_of(repeats, lambda: [rag.embedder.encode([query]) for query in EVAL_QUERIES])
+
+    rag.create_embeddings(chunks, ChunkMetadata.for_document("eval", len(chunks)))
+    snapshots = rag.pin_snapshots([config.DEFAULT_COLLECTION])
+    retrieved = [rag.retrieve(snapshots, query, top_k)[0] for query in EVAL_QUERIES]
+    prompts = prompts or [rag.build_prompt(query, top) for query, top in zip(EVAL_QUERIES, retrieved)]
+
+    answers, generate_ms = [], []
+    for prompt in prompts:
+        start = time.perf_counter()
+        # Greedy decoding, so differences come from the weights and not from sampling
+        answers.append(rag.llm.generate_batch([prompt], max_length=150, do_sample=False)[0])
+        generate_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "embeddings": embeddings,
+        "retrieved": retrieved,
+        "prompts": prompts,
+        "answers": answers,
+        "speed": {
+            "embed_chunks_per_s": round(len(chunks) / embed_seconds, 1),
+            "query_embed_ms": round(query_seconds / len(EVAL_QUERIES) * 1000, 3),
+            "generate_mean_ms": round(float(np.mean(generate_ms)), 1),
+            "generate_p95_ms": round(float(np.percentile(generate_ms, 95)), 1)
+        },
+        "model_mb": {
+            "embedding": model_size_mb(rag.embedder.model),
+            "generation": model_size_mb(rag.llm.pipeline.model)
+        }
+    }
+
+
+def compare(fp32: Dict, int8: Dict, top_k: int) -> Dict:
+    """How far int8 outputs drift from fp32"""
+    a = fp32["embeddings"] / np.linalg.norm(fp32["embeddings"], axis=1, keepdims=True)
+    b = int8["embeddings"] / np.linalg.norm(int8["embeddings"], axis=1, keepdims=True)
+    cosine = (a * b).sum(axis=1)
+    overlap = [len(set(x) & set(y)) / top_k for x, y in zip(fp32["retrieved"], int8["retrieved"])]
+    top1 = [bool(x) and bool(y) and x[0] == y[0] for x, y in zip(fp32["retrieved"], int8["retrieved"])]
+    return {
+        "embedding_cosine_mean": round(float(cosine.mean()), 5),
+        "embedding_cosine_min": round(float(cosine.min()), 5),
+        "retrieval_overlap_at_k": round(float(np.mean(overlap)), 4),
+        "retrieval_top1_agreement": round(float(np.mean(top1)), 4),
+        "answer_exact_match": round(float(np.mean([x.strip() == y.strip()
+                                                   for x, y in zip(fp32["answers"], int8["answers"])])), 4),
+        "answer_token_f1": round(float(np.mean([token_f1(y, x)
+                                                for x, y in zip(fp32["answers"], int8["answers"])])), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare int8-quantized CPU inference with fp32")
+    parser.add_argument("--threads", type=int, default=config.INFERENCE_THREADS,
+                        help="Intra-op threads for both runs (0 = torch default)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per measurement; the fastest counts")
+    parser.add_argument("--output", default="quantization_report.json")
+    args = parser.parse_args()
+
+    configure_torch_threads(args.threads)
+    import torch
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rag-quant-") as work_dir:
+        prompts = []
+        for name, quantize in (("fp32", False), ("int8", True)):
+            print(f"Evaluating {name}...")
+            rag = load_variant(quantize, os.path.join(work_dir, name))
+            results[name] = measure(rag, eval_chunks(rag), prompts, args.top_k, args.repeats)
+            prompts = results[name]["prompts"]
+
+    fp32, int8 = results["fp32"]["speed"], results["int8"]["speed"]
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "quantized_engine": torch.backends.quantized.engine
+        },
+        "settings": {
+            "embedding_model": config.EMBEDDING_MODEL,
+            "generation_model": config.GENERATION_MODEL,
+            "documents": list(EVAL_DOCUMENTS),
+            "queries": len(EVAL_QUERIES),
+            "top_k": args.top_k,
+            "repeats": args.repeats
+        },
+        "speed": {name: results[name]["speed"] for name in results},
+        "model_mb": {name: results[name]["model_mb"] for name in results},
+        "speedup": {
+            "embed_throughput": round(int8["embed_chunks_per_s"] / fp32["embed_chunks_per_s"], 2),
+            "query_embed": round(fp32["query_embed_ms"] / int8["query_embed_ms"], 2),
+            "generate": round(fp32["generate_mean_ms"] / int8["generate_mean_ms"], 2)
+        },
+        "quality": compare(results["fp32"], results["int8"], args.top_k),
+        "answers": [{"query": query, "fp32": a, "int8": b}
+                    for query, a, b in zip(EVAL_QUERIES, results["fp32"]["answers"], results["int8"]["answers"])]
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps({key: report[key] for key in ("speedup", "quality", "model_mb")}, indent=2))
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
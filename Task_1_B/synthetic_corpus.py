@@ -0,0 +1,126 @@
+# synthetic_corpus.py - Reproducible PDF and CSV documents for benchmarks
+import argparse
+import csv
+import os
+import random
+from typing import List
+
+TOPICS = ["revenue", "latency", "inventory", "compliance", "onboarding", "pricing",
+          "shipping", "support", "security", "hiring", "forecast", "migration"]
+SYLLABLES = ["ka", "lo", "mi", "ta", "ren", "so", "vel", "dor", "pi", "nu", "ex", "ar",
+             "quin", "bel", "tor", "sa", "li", "mon", "ga", "fe"]
+VOCABULARY_SIZE = 4000
+
+
+def _vocabulary(size: int) -> List[str]:
+    """Pseudo-words, so chunks overlap about as much as real prose rather than near-duplicating"""
+    rng = random.Random(1234)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+WORDS = _vocabulary(VOCABULARY_SIZE)
+# Zipf-like weights: a few very common words and a long tail, as in natural text
+WORD_WEIGHTS = [1.0 / rank for rank in range(1, VOCABULARY_SIZE + 1)]
+
+LINES_PER_PAGE = 60
+CHARS_PER_LINE = 90
+
+
+def sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, weights=WORD_WEIGHTS, k=rng.randint(8, 20))
+    words.insert(rng.randrange(len(words)), rng.choice(TOPICS))
+    return ' '.join(words).capitalize() + '.'
+
+
+def page_lines(rng: random.Random) -> List[str]:
+    """One page of text wrapped to fixed-width lines"""
+    lines = []
+    current = ''
+    while len(lines) < LINES_PER_PAGE:
+        for word in sentence(rng).split(' '):
+            if len(current) + len(word) + 1 > CHARS_PER_LINE:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+    return lines[:LINES_PER_PAGE]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path: str, pages: int, seed: int = 0) -> int:
+    """Write a text-only PDF of `pages` pages and return its size in bytes"""
+    rng = random.Random(seed)
+    page_count = max(1, pages)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and a content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            ' '.join(f"{4 + 2 * i} 0 R" for i in range(page_count)), page_count)).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(page_count):
+        text = ' T* '.join(f"({_pdf_escape(line)}) Tj" for line in page_lines(rng))
+        stream = f"BT /F1 9 Tf 12 TL 40 800 Td {text} ET".encode('latin-1')
+        objects.append(("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                        "/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i)).encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        data += b"%010d 00000 n \n" % offset
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def write_csv(path: str, rows: int, seed: int = 0) -> int:
+    """Write a product-catalog style CSV of `rows` rows and return its size in bytes"""
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "category", "price", "rating", "description"])
+        for i in range(rows):
+            writer.writerow([
+                i + 1,
+                f"{rng.choice(TOPICS).capitalize()} {rng.choice(WORDS)} {i + 1}",
+                rng.choice(["electronics", "furniture", "apparel", "books", "garden"]),
+                round(rng.uniform(5, 500), 2),
+                round(rng.uniform(1, 5), 1),
+                sentence(rng)
+            ])
+    return os.path.getsize(path)
+
+
+def queries(count: int, seed: int = 1) -> List[str]:
+    """Questions that share vocabulary with the synthetic documents"""
+    rng = random.Random(seed)
+    return [f"What did the {rng.choice(WORDS)} say about {rng.choice(TOPICS)}?" for _ in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark documents")
+    parser.add_argument("--pages", type=int, default=50, help="Pages in the PDF")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows in the CSV")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="benchmark_data")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    pdf_path = os.path.join(args.output_dir, f"synthetic_{args.pages}p.pdf")
+    csv_path = os.path.join(args.output_dir, f"synthetic_{args.rows}r.csv")
+    print(f"{pdf_path}: {write_pdf(pdf_path, args.pages, args.seed)} bytes")
+    print(f"{csv_path}: {write_csv(csv_path, args.rows, args.seed)} bytes")
@@ -0,0 +1,426 @@
+# table_query.py - Plan and answer filter, sort and aggregate questions over CSV tables
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tables import DATE, NUMBER, TEXT, Table
+
+# Words that tie a question to a price-like or date-like column without naming it
+MONEY_NAME = re.compile(r'price|cost|amount|fee|salary|revenue|spend|total')
+MONEY_WORDS = ('cost', 'costs', 'costing', 'price', 'prices', 'priced', 'pay', 'cheap', 'cheaper',
+               'cheapest', 'expensive', 'pricier', 'priciest', 'dollars')
+DATE_WORDS = ('released', 'release', 'launched', 'launch', 'date', 'dated', 'newest', 'latest', 'oldest',
+              'earliest', 'recent', 'recently')
+ROW_NOUNS = ('rows', 'row', 'items', 'item', 'entries', 'entry', 'records', 'record')
+# Words a table question can contain besides the parts the planner recognizes. Any
+# other word (e.g. "stock" in "how many items are in stock?") is a condition no
+# column covers, so the question is left to retrieval.
+FILLER_WORDS = frozenset('''
+    a an the this that these those of in on at to for from with by and or than as
+    is are was were be been being do does did have has had can could would will
+    what what's which who whose where how many much me us i we you it its there
+    show list give tell find get display return please all any each every some only
+    one ones most least more less very ascending descending asc desc increasing
+    decreasing first last
+'''.split())
+_WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+_VALUE = r'(?P<money>\$)?\s*(?P<number>\d[\d,]*(?:\.\d+)?)\s*(?P<scale>k\b|thousand\b)?\s*(?P<dollars>dollars)?'
+_NUMBER_OPS = {
+    '<=': ('no more than', 'not more than', 'at most', 'up to', '<='),
+    '>=': ('no less than', 'not less than', 'at least', '>='),
+    '<': ('less than', 'fewer than', 'lower than', 'smaller than', 'cheaper than', 'under', 'below', '<'),
+    '>': ('more than', 'greater than', 'higher than', 'larger than', 'bigger than', 'pricier than', 'over',
+          'above', 'exceeding', '>'),
+    '==': ('equal to', 'exactly'),
+}
+_NUMBER_OP_WORDS = {phrase: op for op, phrases in _NUMBER_OPS.items() for phrase in phrases}
+_COMPARISON = re.compile(
+    r'(?<![\w<>])(?P<op>' + '|'.join(re.escape(p) for p in sorted(_NUMBER_OP_WORDS, key=len, reverse=True))
+    + r')\s*' + _VALUE)
+_BETWEEN = re.compile(r'\bbetween\s+' + _VALUE + r'\s+and\s+' + _VALUE.replace('?P<', '?P<high_'))
+
+_DATE_VALUE = r'(?P<date>\d{4}-\d{1,2}-\d{1,2}|(?:19|20)\d{2}\b)'
+_DATE_OPS = {'before': '<', 'prior to': '<', 'earlier than': '<', 'after': '>', 'later than': '>',
+             'since': '>=', 'in': 'in', 'during': 'in', 'from': 'in'}
+_DATE_COMPARISON = re.compile(
+    r'\b(?P<op>' + '|'.join(sorted(_DATE_OPS, key=len, reverse=True)) + r')\s+' + _DATE_VALUE)
+
+# (pattern, implied column kind, descending); implied columns: money or date
+_SUPERLATIVES = [
+    (r'most expensive|priciest|highest[- ]priced', 'money', True),
+    (r'least expensive|cheapest|lowest[- ]priced', 'money', False),
+    (r'newest|latest|most recent(?:ly released)?', DATE, True),
+    (r'oldest|earliest', DATE, False),
+    (r'highest|largest|biggest|greatest|top', None, True),
+    (r'lowest|smallest|fewest|bottom', None, False),
+]
+_SORT_BY = re.compile(r'\b(?:sort(?:ed)?|order(?:ed)?|rank(?:ed)?) by\s+(?P<rest>.*)')
+_AGGREGATES = [('count', r'how many|number of|count of'), ('mean', r'average|mean|avg'),
+               ('median', r'median'), ('sum', r'total|sum of|combined'), ('max', r'maximum|max'),
+               ('min', r'minimum|min')]
+_NUMBER_WORDS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8,
+                 'nine': 9, 'ten': 10}
+_LIMIT = re.compile(r'\b(?:top|first)\s+(?P<n>\d+|' + '|'.join(_NUMBER_WORDS) + r')\b')
+_AGGREGATE_NAMES = {'count': 'number', 'mean': 'average', 'median': 'median', 'sum': 'total',
+                    'max': 'maximum', 'min': 'minimum'}
+
+
+@dataclass
+class Condition:
+    column: str
+    op: str  # <, <=, >, >=, ==, between, in
+    value: object
+
+    def evaluate(self, values: np.ndarray, kind: str) -> np.ndarray:
+        if kind == TEXT:
+            wanted = [v.lower() for v in (self.value if self.op == 'in' else [self.value])]
+            return np.isin(np.char.lower(values.astype(str)), wanted)
+        if self.op in ('between', 'in'):
+            low, high = self.value
+            return (values >= low) & (values <= high)
+        return {'<': values < self.value, '<=': values <= self.value, '>': values > self.value,
+                '>=': values >= self.value, '==': values == self.value}[self.op]
+
+    def describe(self) -> str:
+        if self.op == 'between':
+            return f"{self.column} between {_show(self.value[0])} and {_show(self.value[1])}"
+        if self.op == 'in' and isinstance(self.value, tuple):
+            start, end = (_show(value) for value in self.value)
+            return f"{self.column} in {start[:4] if start != end else start}"
+        if self.op == 'in':
+            return f"{self.column} in ({', '.join(self.value)})"
+        return f"{self.column} {'=' if self.op == '==' else self.op} {_show(self.value)}"
+
+
+@dataclass
+class TablePlan:
+    """What to do with one table: filter, then sort and limit, then aggregate"""
+    key: str
+    table: Table
+    conditions: List[Condition] = field(default_factory=list)
+    sort: Optional[Tuple[str, bool]] = None  # (column, descending)
+    limit: Optional[int] = None
+    aggregate: Optional[Tuple[str, Optional[str]]] = None  # (function, column)
+
+    def describe(self) -> dict:
+        return {
+            "table": self.table.source,
+            "filters": [condition.describe() for condition in self.conditions],
+            "sort": f"{self.sort[0]} {'desc' if self.sort[1] else 'asc'}" if self.sort else None,
+            "limit": self.limit,
+            "aggregate": (f"{self.aggregate[0]}({self.aggregate[1] or '*'})" if self.aggregate else None)
+        }
+
+
+@dataclass
+class TableResult:
+    plan: TablePlan
+    rows: np.ndarray              # Positions of the selected rows, in answer order
+    matched: int                  # Rows that passed the filters, before the limit
+    value: Optional[object] = None  # The aggregate, if one was asked for
+
+
+def _show(value) -> str:
+    if isinstance(value, np.datetime64):
+        return str(value.astype('datetime64[D]'))
+    if isinstance(value, float):
+        return f"{value:,.2f}".rstrip('0').rstrip('.')
+    return str(value)
+
+
+def _number(match: re.Match, prefix: str = '') -> Tuple[float, bool]:
+    """A matched value and whether it was written as money"""
+    value = float(match.group(prefix + 'number').replace(',', ''))
+    if match.group(prefix + 'scale'):
+        value *= 1000
+    return value, bool(match.group(prefix + 'money') or match.group(prefix + 'dollars'))
+
+
+def _date_range(text: str, op: str) -> Tuple[str, object]:
+    """Translate 'before 2023', 'in 2024', 'since 2022-06-01' into a comparison on datetime64 values"""
+    if len(text) == 4:
+        start = np.datetime64(f"{text}-01-01", 's')
+        end = np.datetime64(f"{int(text) + 1}-01-01", 's') - np.timedelta64(1, 's')
+    else:
+        year, month, day = (int(part) for part in text.split('-'))
+        start = np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", 's')
+        end = start + np.timedelta64(86399, 's')
+    return {'<': ('<', start), '>': ('>', end), '>=': ('>=', start), 'in': ('in', (start, end))}[op]
+
+
+class _Columns:
+    """Where each column of a table is mentioned in a question"""
+
+    def __init__(self, table: Table, query: str):
+        self.table = table
+        numbers = table.names(NUMBER)
+        money = [name for name in numbers if MONEY_NAME.search(name.lower())]
+        self.money = money[0] if money else (numbers[0] if len(numbers) == 1 else None)
+        dates = table.names(DATE)
+        self.date = dates[0] if dates else None
+
+        self.mentions: List[Tuple[int, str]] = []  # (position, column)
+        self.spans: List[Tuple[int, int]] = []     # Where each mention is in the question
+        self.named = False    # A column is referred to by its own name
+        self.implied = False  # ...or by a money or date word
+        for name in table.columns:
+            words = [word for word in re.split(r'[\W_]+', name.lower()) if len(word) >= 3]
+            aliases = {name.lower(), name.lower().replace('_', ' ')} | set(words)
+            for alias in aliases:
+                for match in re.finditer(r'\b' + re.escape(alias) + r'(?:e?s)?\b', query):
+                    self.mentions.append((match.start(), name))
+                    self.spans.append(match.span())
+                    self.named = True
+        for words, column in ((MONEY_WORDS, self.money), (DATE_WORDS, self.date)):
+            if column is None:
+                continue
+            for word in words:
+                for match in re.finditer(r'\b' + word + r'\b', query):
+                    self.mentions.append((match.start(), column))
+                    self.spans.append(match.span())
+                    self.implied = True
+        self.mentions.sort()
+
+    def near(self, position: int, kinds: Tuple[str, ...], after: bool = False) -> Optional[str]:
+        """The mentioned column of an allowed kind nearest before `position`, else nearest after"""
+        before = [(p, c) for p, c in self.mentions if p < position and self.table.kinds[c] in kinds]
+        following = [(p, c) for p, c in self.mentions if p >= position and self.table.kinds[c] in kinds]
+        if after:
+            before, following = [], following or before[::-1]
+        if before:
+            return before[-1][1]
+        return following[0][1] if following else None
+
+
+def plan_query(query: str, key: str, table: Table) -> Optional[TablePlan]:
+    """Recognize a filter, sort or aggregate question about one table; None if it isn't one.
+
+    A question only qualifies if it is anchored to the table: it names a
+    column, uses a money or date word for one, quotes a cell value such as a
+    category, mentions rows (or the table's own noun, e.g. "products" for a
+    product_name column), or compares against a dollar amount. It must also
+    not contain words the plan leaves unexplained, since those are usually
+    conditions no column covers. Everything else is left to retrieval.
+    """
+    query = ' '.join(query.lower().split())
+    columns = _Columns(table, query)
+    plan = TablePlan(key, table)
+    taken: List[Tuple[int, int]] = []  # Comparisons already turned into conditions
+    covered = list(columns.spans)      # Every part of the question the plan accounts for
+    money_value = False
+
+    def free(match: re.Match) -> bool:
+        return all(match.end() <= start or match.start() >= end for start, end in taken)
+
+    if columns.date:
+        for match in _DATE_COMPARISON.finditer(query):
+            column = columns.near(match.start(), (DATE,)) or columns.date
+            op, value = _date_range(match.group('date'), _DATE_OPS[match.group('op')])
+            plan.conditions.append(Condition(column, op, value))
+            taken.append(match.span())
+
+    for match in _BETWEEN.finditer(query):
+        low, low_money = _number(match)
+        high, high_money = _number(match, 'high_')
+        column = columns.near(match.start(), (NUMBER,)) or ((low_money or high_money) and columns.money)
+        if column:
+            plan.conditions.append(Condition(column, 'between', (min(low, high), max(low, high))))
+            taken.append(match.span())
+            money_value |= low_money or high_money
+
+    for match in _COMPARISON.finditer(query):
+        if not free(match):
+            continue
+        value, is_money = _number(match)
+        column = columns.near(match.start(), (NUMBER,)) or (is_money and columns.money)
+        if column:
+            plan.conditions.append(Condition(column, _NUMBER_OP_WORDS[match.group('op')], value))
+            taken.append(match.span())
+            money_value |= is_money
+
+    equalities, value_spans = _equality_conditions(table, query)
+    plan.conditions.extend(equalities)
+    covered += taken + value_spans
+
+    for pattern, implied, descending in _SUPERLATIVES:
+        match = re.search(r'\b(?:' + pattern + r')\b', query)
+        if not match:
+            continue
+        column = {'money': columns.money, DATE: columns.date}.get(implied) if implied else \
+            columns.near(match.end(), (NUMBER, DATE), after=True)
+        if column:
+            plan.sort = (column, descending)
+            covered.append(match.span())
+            number = re.search(r'\b(\d+|' + '|'.join(_NUMBER_WORDS) + r')\s+(?:\w+\s+)?$', query[:match.start()])
+            plan.limit = _count(number.group(1)) if number else 1
+            if number:
+                covered.append(number.span(1))
+            break
+    sort_by = _SORT_BY.search(query)
+    if plan.sort is None and sort_by:
+        column = columns.near(sort_by.start('rest'), (NUMBER, DATE, TEXT), after=True)
+        if column:
+            plan.sort = (column, not re.search(r'\b(?:asc|ascending|lowest first|increasing)\b', sort_by.group('rest')))
+            covered.append((sort_by.start(), sort_by.start('rest')))
+    limit = _LIMIT.search(query)
+    if limit and plan.sort:
+        plan.limit = _count(limit.group('n'))
+        covered.append(limit.span())
+
+    for function, pattern in _AGGREGATES:
+        match = re.search(r'\b(?:' + pattern + r')\b', query)
+        if not match:
+            continue
+        if function == 'count':
+            plan.aggregate = ('count', None)
+            covered.append(match.span())
+            break
+        kinds = (NUMBER, DATE) if function in ('max', 'min') else (NUMBER,)
+        column = columns.near(match.end(), kinds, after=True)
+        if column:
+            plan.aggregate = (function, column)
+            plan.sort = plan.limit = None
+            covered.append(match.span())
+            break
+
+    intent = plan.sort or plan.aggregate or any(c.op != '==' and table.kinds[c.column] != TEXT
+                                                 for c in plan.conditions)
+    label = _label_column(table)
+    nouns = ROW_NOUNS + ((label.lower().split('_')[0],) if label else ())
+    noun_spans = [match.span() for noun in nouns
+                  for match in re.finditer(r'\b' + re.escape(noun) + r'(?:e?s)?\b', query)]
+    covered += noun_spans
+    anchored = columns.named or columns.implied or money_value or bool(value_spans) or bool(noun_spans)
+    unexplained = [word for word in _WORD.finditer(query) if word.group() not in FILLER_WORDS
+                   and not any(start <= word.start() < end for start, end in covered)]
+    return plan if intent and anchored and not unexplained else None
+
+
+def _rows(n: int) -> str:
+    return f"{n} row" if n == 1 else f"{n} rows"
+
+
+def _count(text: str) -> int:
+    return int(text) if text.isdigit() else _NUMBER_WORDS[text]
+
+
+def _equality_conditions(table: Table, query: str) -> Tuple[List[Condition], List[Tuple[int, int]]]:
+    """Short text values quoted in the question, e.g. a category name, singular or plural.
+
+    Returns the conditions and where the values appear in the question.
+    """
+    conditions, spans = [], []
+    for name in table.names(TEXT):
+        found = []
+        for value in np.unique(table.columns[name]):
+            text = value.lower().strip()
+            if not text or len(text) > 40 or len(text.split()) > 4 or text.replace('.', '').isdigit():
+                continue
+            stem = re.escape(text[:-1]) + '(?:y|ies)' if text.endswith('y') else re.escape(text) + '(?:e?s)?'
+            match = re.search(r'\b' + stem + r'\b', query)
+            if match:
+                found.append(str(value))
+                spans.append(match.span())
+        if len(found) == 1:
+            conditions.append(Condition(name, '==', found[0]))
+        elif found:
+            conditions.append(Condition(name, 'in', found))
+    return conditions, spans
+
+
+def _label_column(table: Table) -> Optional[str]:
+    """The column used to name rows in answers: the first text column"""
+    texts = table.names(TEXT)
+    return texts[0] if texts else None
+
+
+def execute(plan: TablePlan) -> TableResult:
+    """Run a plan with vectorized column operations"""
+    table = plan.table
+    mask = np.ones(len(table), dtype=bool)
+    for condition in plan.conditions:
+        mask &= condition.evaluate(table.columns[condition.column], table.kinds[condition.column])
+    rows = np.flatnonzero(mask)
+    matched = len(rows)
+
+    if plan.sort:
+        column, descending = plan.sort
+        values = table.columns[column][rows]
+        if table.kinds[column] == TEXT:
+            order = np.argsort(np.char.lower(values.astype(str)), kind='stable')
+            rows = rows[order[::-1] if descending else order]
+        else:
+            # Missing values go last in either direction
+            present = ~np.isnan(values) if table.kinds[column] == NUMBER else ~np.isnat(values)
+            order = np.flatnonzero(present)[np.argsort(values[present], kind='stable')]
+            rows = np.concatenate([rows[order[::-1] if descending else order], rows[~present]])
+        if plan.limit:
+            rows = rows[:plan.limit]
+
+    value = None
+    if plan.aggregate:
+        function, column = plan.aggregate
+        if function == 'count':
+            value = matched
+        else:
+            values = table.columns[column][rows]
+            values = values[~np.isnan(values)] if table.kinds[column] == NUMBER else values[~np.isnat(values)]
+            if len(values):
+                value = {'mean': np.mean, 'median': np.median, 'sum': np.sum,
+                         'max': np.max, 'min': np.min}[function](values)
+                value = float(value) if table.kinds[column] == NUMBER else value
+    return TableResult(plan, rows, matched, value)
+
+
+def answer(result: TableResult, max_rows: int = 20) -> str:
+    """A plain-language answer listing the selected rows or the aggregate"""
+    plan, table = result.plan, result.plan.table
+    conditions = ' and '.join(condition.describe() for condition in plan.conditions)
+    where = f" where {conditions}" if conditions else ""
+
+    if plan.aggregate:
+        function, column = plan.aggregate
+        if function == 'count':
+            return f"{_rows(result.matched)} in {table.source}{where}."
+        if result.value is None:
+            return f"No {column} values in {table.source}{where}."
+        return (f"The {_AGGREGATE_NAMES[function]} {column} is {_show(result.value)} "
+                f"across {_rows(result.matched)} in {table.source}{where}.")
+
+    if not len(result.rows):
+        return f"No rows in {table.source}{where}."
+    label = _label_column(table)
+    shown = [c.column for c in plan.conditions if table.kinds[c.column] != TEXT or c.column == label]
+    if plan.sort:
+        shown.append(plan.sort[0])
+    shown = [name for name in dict.fromkeys(shown) if name != label]
+
+    def describe(i: int) -> str:
+        details = ', '.join(f"{name}: {table.format_value(name, i)}" for name in shown)
+        name = table.format_value(label, i) if label else f"row {table.rows[i]}"
+        return f"{name} ({details})" if details else name
+
+    listed = [describe(i) for i in result.rows[:max_rows]]
+    more = len(result.rows) - len(listed)
+    if plan.sort:
+        column, descending = plan.sort
+        heading = f"By {column} ({'highest' if descending else 'lowest'} first){where}"
+    else:
+        heading = f"{_rows(result.matched)} in {table.source}{where}"
+    return f"{heading}: {'; '.join(listed)}" + (f"; and {more} more." if more else ".")
+
+
+def answer_from_tables(query: str, tables: Dict[str, Table], max_rows: int = 20
+                       ) -> Optional[Tuple[str, List[TableResult]]]:
+    """Plan the question against every table; None if no table can answer it"""
+    results = []
+    for key, table in tables.items():
+        plan = plan_query(query, key, table)
+        if plan is not None:
+            results.append(execute(plan))
+    if not results:
+        return None
+    return ' '.join(answer(result, max_rows) for result in results), results
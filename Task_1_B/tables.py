@@ -0,0 +1,124 @@
+# tables.py - Typed columnar copies of uploaded CSV files
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+NUMBER, DATE, TEXT = "number", "date", "text"
+
+# Currency symbols, thousands separators and percent signs around otherwise numeric text
+_NUMERIC_NOISE = re.compile(r'[$€£¥,%\s]')
+_DATE_LIKE = re.compile(r'^\s*(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4})')
+
+
+def _typed_column(series: pd.Series) -> Tuple[str, np.ndarray]:
+    """Infer a column's kind and convert it to a numpy array of that type.
+
+    Missing values become NaN, NaT or '' respectively.
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return NUMBER, series.to_numpy(dtype='float64', na_value=np.nan)
+
+    present = series.dropna().astype(str)
+    if len(present):
+        numbers = pd.to_numeric(present.str.replace(_NUMERIC_NOISE, '', regex=True), errors='coerce')
+        if numbers.notna().all():
+            values = np.full(len(series), np.nan)
+            values[series.notna().to_numpy()] = numbers.to_numpy(dtype='float64')
+            return NUMBER, values
+        if present.str.match(_DATE_LIKE).all():
+            dates = pd.to_datetime(series, errors='coerce', format='mixed')
+            if dates[series.notna()].notna().all():
+                return DATE, dates.to_numpy(dtype='datetime64[s]')
+    return TEXT, series.fillna('').astype(str).to_numpy(dtype=str)
+
+
+@dataclass(frozen=True)
+class Table:
+    """One uploaded CSV as typed numpy columns, for filters, sorts and aggregates.
+
+    `rows` holds each row's 1-based number in the file, matching the `row`
+    of the chunk the same row became.
+    """
+    source: str
+    columns: Mapping[str, np.ndarray]
+    kinds: Mapping[str, str]  # Column name -> number, date or text
+    rows: np.ndarray          # int32
+    uploaded_at: float
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, source: str, uploaded_at: Optional[float] = None) -> "Table":
+        columns, kinds = {}, {}
+        for name in df.columns:
+            kinds[str(name)], columns[str(name)] = _typed_column(df[name])
+        return cls(
+            source=source,
+            columns=MappingProxyType(columns),
+            kinds=MappingProxyType(kinds),
+            rows=np.arange(1, len(df) + 1, dtype='int32'),
+            uploaded_at=time.time() if uploaded_at is None else uploaded_at
+        )
+
+    def names(self, kind: str) -> List[str]:
+        return [name for name, column_kind in self.kinds.items() if column_kind == kind]
+
+    def format_value(self, name: str, i: int) -> str:
+        value = self.columns[name][i]
+        kind = self.kinds[name]
+        if kind == NUMBER:
+            if np.isnan(value):
+                return ''
+            return str(int(value)) if float(value).is_integer() else f"{value:.15g}"
+        if kind == DATE:
+            return '' if np.isnat(value) else str(value.astype('datetime64[D]'))
+        return str(value)
+
+    def row_text(self, i: int) -> str:
+        """A row in the same "column: value" form that CSV chunks use"""
+        return ' '.join(f"{name}: {value}" for name in self.columns
+                        for value in [self.format_value(name, i)] if value)
+
+
+def save_tables(tables: Mapping[str, Table], path: str):
+    """Write each table's columns to tables/<key>.npz with a JSON index"""
+    table_dir = os.path.join(path, "tables")
+    os.makedirs(table_dir, exist_ok=True)
+    index = {}
+    for key, table in tables.items():
+        columns = list(table.columns)
+        np.savez(os.path.join(table_dir, f"{key}.npz"), rows=table.rows,
+                 **{f"column_{i}": table.columns[name] for i, name in enumerate(columns)})
+        index[key] = {"source": table.source, "columns": columns,
+                      "kinds": [table.kinds[name] for name in columns], "uploaded_at": table.uploaded_at}
+    with open(os.path.join(path, "tables.json"), "w") as f:
+        json.dump(index, f)
+
+
+def load_tables(path: str) -> Mapping[str, Table]:
+    """Read what save_tables wrote; directories saved before tables existed have none"""
+    index_path = os.path.join(path, "tables.json")
+    if not os.path.exists(index_path):
+        return MappingProxyType({})
+    with open(index_path) as f:
+        index = json.load(f)
+    tables: Dict[str, Table] = {}
+    for key, entry in index.items():
+        with np.load(os.path.join(path, "tables", f"{key}.npz")) as arrays:
+            columns = {name: arrays[f"column_{i}"] for i, name in enumerate(entry["columns"])}
+            tables[key] = Table(
+                source=entry["source"],
+                columns=MappingProxyType(columns),
+                kinds=MappingProxyType(dict(zip(entry["columns"], entry["kinds"]))),
+                rows=arrays["rows"],
+                uploaded_at=entry["uploaded_at"]
+            )
+    return MappingProxyType(tables)
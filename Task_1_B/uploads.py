@@ -0,0 +1,107 @@
+# uploads.py - Streamed, size-limited, content-addressed upload storage
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredUpload:
+    path: str
+    sha256: str
+    size: int
+
+
+def content_path(upload_dir: str, sha256: str, extension: str) -> str:
+    """uploads/ab/abcdef...pdf - fanned out so no directory grows too large"""
+    return os.path.join(upload_dir, sha256[:2], sha256 + extension)
+
+
+async def save_upload(file: UploadFile, upload_dir: str, max_bytes: int) -> StoredUpload:
+    """Copy an upload to disk in fixed-size pieces, hashing it on the way.
+
+    The file is written to a temporary name first and moved to its
+    content-addressed path once the hash is known, so identical bytes are
+    stored once and different files with the same name never overwrite
+    each other. Raises UploadTooLarge as soon as `max_bytes` is exceeded.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    extension = os.path.splitext(file.filename or '')[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                piece = await file.read(UPLOAD_CHUNK_BYTES)
+                if not piece:
+                    break
+                size += len(piece)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+                digest.update(piece)
+                await run_in_threadpool(out.write, piece)
+
+        sha256 = digest.hexdigest()
+        path = content_path(upload_dir, sha256, extension)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return StoredUpload(path, sha256, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return StoredUpload(path, sha256, size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class UploadLimitMiddleware:
+    """Refuse oversized upload requests before any of the body is read.
+
+    Starlette spools the whole multipart body to a temporary file before a
+    handler runs, so save_upload's limit alone would only reject a huge
+    upload after it had been written to disk. `limits` pairs a path pattern,
+    matched against the whole request path, with its byte limit; POSTs to a
+    matching path must declare a Content-Length (411 otherwise) no larger than
+    the limit plus room for the multipart framing (413 otherwise).
+    """
+
+    def __init__(self, app, limits: Iterable[Tuple[str, int]]):
+        self.app = app
+        self.limits = [(re.compile(pattern), max_bytes) for pattern, max_bytes in limits]
+
+    def _limit(self, path: str) -> Optional[int]:
+        for pattern, max_bytes in self.limits:
+            if pattern.fullmatch(path):
+                return max_bytes
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self._limit(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if max_bytes is not None:
+            headers = dict(scope["headers"])
+            length = headers.get(b"content-length")
+            if length is None or not length.isdigit():
+                response = JSONResponse({"detail": "Uploads must declare a Content-Length"}, status_code=411)
+                return await response(scope, receive, send)
+            if int(length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+                response = JSONResponse({"detail": f"File exceeds the {max_bytes} byte upload limit"},
+                                        status_code=413)
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
@@ -1,8 +1,17 @@
 from flask import Flask, request, jsonify, render_template_string
 from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import base64
+import binascii
+import json
+import threading
+import time
 import uuid
 import os
 
@@ -10,6 +19,16 @@ app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = 'your-secret-key-change-in-production'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///rbac.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# How long a worker trusts its cached copy of a user's token_version
+app.config['TOKEN_VERSION_CACHE_SECONDS'] = int(os.environ.get('TOKEN_VERSION_CACHE_SECONDS', '30'))
+# Optional JSON file of role -> scope -> actions; the built-in DEFAULT_POLICY is used when unset
+app.config['RBAC_POLICY_FILE'] = os.environ.get('RBAC_POLICY_FILE')
+# How often each worker checks the policy file for changes
+app.config['RBAC_POLICY_CHECK_SECONDS'] = float(os.environ.get('RBAC_POLICY_CHECK_SECONDS', '5'))
+# Bulk provisioning: rows per request, rows per insert transaction, password hashing processes (0 = CPU count)
+app.config['BULK_MAX_USERS'] = int(os.environ.get('BULK_MAX_USERS', '10000'))
+app.config['BULK_INSERT_BATCH'] = int(os.environ.get('BULK_INSERT_BATCH', '1000'))
+app.config['BULK_HASH_WORKERS'] = int(os.environ.get('BULK_HASH_WORKERS', '0'))
 
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
@@ -23,6 +42,8 @@ class User(db.Model):
     role = db.Column(db.String(20), default='viewer')  # admin, manager, contributor, viewer
     org_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
     dept_id = db.Column(db.Integer, db.ForeignKey('department.id'))
+    # Bumped whenever role, org or department change, so tokens carrying the old claims stop working
+    token_version = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Organization(db.Model):
@@ -40,11 +61,20 @@ class Department(db.Model):
     users = db.relationship('User', backref='department', lazy=True)
 
 class Resource(db.Model):
+    # Listings page newest first within an org, department or owner; each index
+    # ends in (created_at, id) so a page is one index range scan from the cursor,
+    # plus a table lookup for each of the (at most `limit`) rows it returns
+    __table_args__ = (
+        db.Index('ix_resource_org_created', 'org_id', 'created_at', 'id'),
+        db.Index('ix_resource_org_dept_created', 'org_id', 'dept_id', 'created_at', 'id'),
+        db.Index('ix_resource_owner_created', 'owner_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text)
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     org_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+    dept_id = db.Column(db.Integer, db.ForeignKey('department.id'))  # Owner's department when created
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     owner = db.relationship('User', backref='resources')
 
@@ -57,15 +87,242 @@ class GuestLink(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     resource = db.relationship('Resource', backref='guest_links')
 
-# Helper functions
-def check_permission(user_role, action):
-    permissions = {
-        'admin': ['create', 'read', 'update', 'delete', 'share'],
-        'manager': ['create', 'read', 'update', 'share'],
-        'contributor': ['create', 'read', 'update'],
-        'viewer': ['read']
-    }
-    return action in permissions.get(user_role, [])
+# Identity claims: role, org and department are signed into the access token at
+# login, so protected endpoints authorize without loading the user. Each token
+# also carries the user's token_version ('ver'); bumping it invalidates tokens
+# issued before a role, org or department change.
+Identity = namedtuple('Identity', ['id', 'role', 'org_id', 'dept_id'])
+
+class TokenVersionCache:
+    """Current token_version per user, cached in this worker for a few seconds.
+
+    A user's version is read once per `ttl` seconds instead of on every
+    request. Changes made by this worker apply immediately; changes made by
+    another worker apply once the cached entry expires.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}  # user id -> (version, fetched at)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry and now - entry[1] < self.ttl:
+            return entry[0]
+        version = db.session.query(User.token_version).filter_by(id=user_id).scalar()
+        self.set(user_id, version)
+        return version
+
+    def set(self, user_id, version):
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic())
+
+token_versions = TokenVersionCache(app.config['TOKEN_VERSION_CACHE_SECONDS'])
+
+def issue_token(user):
+    return create_access_token(identity=str(user.id), additional_claims={
+        'role': user.role,
+        'org_id': user.org_id,
+        'dept_id': user.dept_id,
+        'ver': user.token_version or 0
+    })
+
+def bump_token_version(user):
+    """Invalidate the user's existing tokens; call before committing a role, org or department change"""
+    user.token_version = (user.token_version or 0) + 1
+
+def current_identity():
+    """The caller's identity, read from the verified token's claims"""
+    claims = get_jwt()
+    return Identity(int(get_jwt_identity()), claims['role'], claims['org_id'], claims['dept_id'])
+
+@jwt.token_in_blocklist_loader
+def token_is_stale(jwt_header, jwt_payload):
+    # Deleted users have no version, so their tokens are stale too
+    return jwt_payload.get('ver') != token_versions.get(int(jwt_payload['sub']))
+
+@jwt.revoked_token_loader
+def stale_token_response(jwt_header, jwt_payload):
+    return jsonify({'message': 'Token is out of date, please log in again'}), 401
+
+# Policy engine: each role grants actions at a scope. Scopes nest - a grant on
+# the whole organization covers the department, which covers the owner's own
+# resources - so compiling a policy folds every grant down into the narrower
+# scopes and a check is one dict lookup, one comparison chain and one AND.
+ACTIONS = {'create': 1, 'read': 2, 'update': 4, 'delete': 8, 'share': 16}
+OWNER, DEPARTMENT, ORGANIZATION = 0, 1, 2
+SCOPES = {'owner': OWNER, 'dept': DEPARTMENT, 'org': ORGANIZATION}
+
+ROLES = ('admin', 'manager', 'contributor', 'viewer')
+
+DEFAULT_POLICY = {
+    'admin': {'org': ['create', 'read', 'update', 'delete', 'share']},
+    'manager': {'org': ['read'], 'dept': ['update'], 'owner': ['create', 'share']},
+    'contributor': {'org': ['read'], 'owner': ['create', 'update']},
+    'viewer': {'org': ['read']}
+}
+
+def resource_scope(identity, resource):
+    """The narrowest scope the caller shares with a resource, or None if it is outside their organization"""
+    if resource.owner_id == identity.id:
+        return OWNER
+    if identity.org_id is None or resource.org_id != identity.org_id:
+        return None
+    if identity.dept_id is not None and resource.dept_id == identity.dept_id:
+        return DEPARTMENT
+    return ORGANIZATION
+
+class Policy:
+    """A policy definition compiled to one action bitmask per role and scope.
+
+    Raises ValueError for a malformed definition.
+    """
+    def __init__(self, definition, mtime=None):
+        if not isinstance(definition, dict):
+            raise ValueError('Policy must map roles to scopes')
+        masks = {}
+        for role, grants in definition.items():
+            if not isinstance(grants, dict):
+                raise ValueError(f"Role '{role}' must map scopes to lists of actions")
+            role_masks = [0, 0, 0]
+            for scope, actions in grants.items():
+                if scope not in SCOPES:
+                    raise ValueError(f"Unknown scope '{scope}' for role '{role}'")
+                if not isinstance(actions, list):
+                    raise ValueError(f"Actions for role '{role}' at scope '{scope}' must be a list")
+                bits = 0
+                for action in actions:
+                    if not isinstance(action, str) or action not in ACTIONS:
+                        raise ValueError(f"Unknown action '{action}' for role '{role}'")
+                    bits |= ACTIONS[action]
+                for narrower in range(SCOPES[scope] + 1):
+                    role_masks[narrower] |= bits
+            masks[role] = tuple(role_masks)
+        self.definition = definition
+        self.masks = masks
+        self.mtime = mtime  # Modification time of the file it was loaded from
+
+    def widest_scope(self, identity, action):
+        """The broadest scope the caller's role grants `action` at, or None"""
+        role_masks = self.masks.get(identity.role, (0, 0, 0))
+        for scope in (ORGANIZATION, DEPARTMENT, OWNER):
+            if role_masks[scope] & ACTIONS[action]:
+                return scope
+        return None
+
+    def allows(self, identity, action, resource=None):
+        """Whether the caller may perform `action` on `resource`.
+
+        Without a resource the action is checked at owner scope, which is
+        where anything the caller creates ends up.
+        """
+        role_masks = self.masks.get(identity.role)
+        if role_masks is None:
+            return False
+        scope = OWNER if resource is None else resource_scope(identity, resource)
+        return scope is not None and bool(role_masks[scope] & ACTIONS[action])
+
+def load_policy():
+    """The policy in RBAC_POLICY_FILE, or DEFAULT_POLICY; OSError or ValueError if the file is unusable"""
+    path = app.config['RBAC_POLICY_FILE']
+    if not path:
+        return Policy(DEFAULT_POLICY)
+    mtime = os.path.getmtime(path)
+    with open(path) as f:
+        return Policy(json.load(f), mtime)
+
+# Bulk provisioning: password hashing is deliberately slow, so it runs across a
+# process pool shared by all requests in this worker. Small batches hash inline,
+# where starting the pool would cost more than it saves.
+HASH_POOL_MIN_PASSWORDS = 32
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+def hash_passwords(passwords):
+    global _hash_pool
+    if len(passwords) < HASH_POOL_MIN_PASSWORDS:
+        return [generate_password_hash(password) for password in passwords]
+    workers = app.config['BULK_HASH_WORKERS'] or os.cpu_count() or 1
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(max_workers=workers)
+        pool = _hash_pool
+    return list(pool.map(generate_password_hash, passwords,
+                         chunksize=max(1, len(passwords) // (workers * 4))))
+
+def validate_bulk_user(row, department_ids):
+    """Error message for a malformed bulk provisioning row, or None"""
+    if not isinstance(row, dict):
+        return 'Expected an object'
+    for field in ('username', 'email', 'password'):
+        if not isinstance(row.get(field), str) or not row[field]:
+            return f'Missing {field}'
+    if row.get('role', 'viewer') not in ROLES:
+        return 'Unknown role'
+    dept_id = row.get('dept_id')
+    if dept_id is not None and (not isinstance(dept_id, int) or dept_id not in department_ids):
+        return 'Department not in your organization'
+    return None
+
+def insert_users(rows):
+    """Insert rows in one transaction; on a conflict, retry row by row.
+
+    Returns (created, failed): created maps row index to user id, failed maps
+    row index to an error. Conflicts only happen when another request
+    registers the same username or email between the uniqueness check and
+    the insert.
+    """
+    values = [{key: value for key, value in row.items() if key != 'index'} for row in rows]
+    try:
+        insert = User.__table__.insert().returning(User.__table__.c.id, sort_by_parameter_order=True)
+        ids = db.session.execute(insert, values).scalars().all()
+        db.session.commit()
+        return {row['index']: user_id for row, user_id in zip(rows, ids)}, {}
+    except IntegrityError:
+        db.session.rollback()
+    if len(rows) == 1:
+        return {}, {rows[0]['index']: 'Username or email already exists'}
+    created, failed = {}, {}
+    for row in rows:
+        row_created, row_failed = insert_users([row])
+        created.update(row_created)
+        failed.update(row_failed)
+    return created, failed
+
+# Keyset pagination cursors: the (created_at, id) of the last resource on a page
+def encode_cursor(resource):
+    key = f"{resource.created_at.isoformat()}|{resource.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_cursor(cursor):
+    """(created_at, id) from encode_cursor; ValueError if the cursor is malformed"""
+    try:
+        created_at, resource_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(resource_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+# Replaced wholesale on reload, so a request sees either the old or the new policy
+policy = load_policy()
+_policy_checked_at = time.monotonic()
+
+@app.before_request
+def refresh_policy():
+    """Pick up edits to the policy file, so every worker follows it without a reload call"""
+    global policy, _policy_checked_at
+    path = app.config['RBAC_POLICY_FILE']
+    now = time.monotonic()
+    if not path or now - _policy_checked_at < app.config['RBAC_POLICY_CHECK_SECONDS']:
+        return
+    _policy_checked_at = now
+    try:
+        if os.path.getmtime(path) != policy.mtime:
+            policy = load_policy()
+    except (OSError, ValueError) as e:
+        # Keep serving the previous policy until the file is fixed
+        app.logger.warning('Policy not reloaded: %s', e)
 
 # Routes
 @app.route('/')
@@ -572,7 +829,7 @@ def dashboard():
 
         <script>
             // Check if user is logged in
-            const authToken = localStorage.getItem('authToken');
+            let authToken = localStorage.getItem('authToken');
             const userRole = localStorage.getItem('userRole');
             const username = localStorage.getItem('username');
             
@@ -613,6 +870,11 @@ def dashboard():
                     })
                 });
                 const data = await response.json();
+                if (data.access_token) {
+                    // Joining the organization changed our claims; the old token is no longer valid
+                    authToken = data.access_token;
+                    localStorage.setItem('authToken', authToken);
+                }
                 showResult('Organization: ' + JSON.stringify(data));
                 if (response.ok) document.getElementById('orgForm').reset();
             });
@@ -697,24 +959,141 @@ def register():
     
     return jsonify({'message': 'User registered successfully', 'user_id': user.id}), 201
 
+@app.route('/users/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_users():
+    identity = current_identity()
+    
+    if identity.role != 'admin':
+        return jsonify({'message': 'Insufficient permissions'}), 403
+    if identity.org_id is None:
+        return jsonify({'message': 'Create an organization first'}), 400
+    
+    rows = (request.get_json() or {}).get('users')
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'message': 'Expected a non-empty users list'}), 400
+    if len(rows) > app.config['BULK_MAX_USERS']:
+        return jsonify({'message': f"At most {app.config['BULK_MAX_USERS']} users per request"}), 400
+    
+    department_ids = {dept_id for (dept_id,) in
+                      db.session.query(Department.id).filter_by(org_id=identity.org_id)}
+    failed = {}
+    valid = []
+    seen_usernames, seen_emails = set(), set()
+    for index, row in enumerate(rows):
+        error = validate_bulk_user(row, department_ids)
+        if error is None and (row['username'] in seen_usernames or row['email'] in seen_emails):
+            error = 'Duplicate username or email in request'
+        if error:
+            failed[index] = error
+            continue
+        seen_usernames.add(row['username'])
+        seen_emails.add(row['email'])
+        valid.append(index)
+    
+    # One query finds every username or email that is already taken
+    if valid:
+        taken_usernames, taken_emails = set(), set()
+        for username, email in db.session.query(User.username, User.email).filter(
+                db.or_(User.username.in_(seen_usernames), User.email.in_(seen_emails))):
+            taken_usernames.add(username)
+            taken_emails.add(email)
+        available = []
+        for index in valid:
+            if rows[index]['username'] in taken_usernames:
+                failed[index] = 'Username already exists'
+            elif rows[index]['email'] in taken_emails:
+                failed[index] = 'Email already exists'
+            else:
+                available.append(index)
+        valid = available
+    
+    hashes = hash_passwords([rows[index]['password'] for index in valid])
+    now = datetime.utcnow()
+    records = [{
+        'index': index,
+        'username': rows[index]['username'],
+        'email': rows[index]['email'],
+        'password_hash': password_hash,
+        'role': rows[index].get('role', 'viewer'),
+        'org_id': identity.org_id,
+        'dept_id': rows[index].get('dept_id'),
+        'token_version': 0,
+        'created_at': now
+    } for index, password_hash in zip(valid, hashes)]
+    
+    created = {}
+    batch_size = app.config['BULK_INSERT_BATCH']
+    for start in range(0, len(records), batch_size):
+        batch_created, batch_failed = insert_users(records[start:start + batch_size])
+        created.update(batch_created)
+        failed.update(batch_failed)
+    
+    return jsonify({
+        'message': f'{len(created)} users created, {len(failed)} failed',
+        'created': [{'index': index, 'username': rows[index]['username'], 'user_id': user_id}
+                    for index, user_id in sorted(created.items())],
+        'failed': [{'index': index, 'error': error} for index, error in sorted(failed.items())]
+    }), 201 if not failed else 207
+
 @app.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
     user = User.query.filter_by(username=data['username']).first()
     
     if user and check_password_hash(user.password_hash, data['password']):
-        access_token = create_access_token(identity=user.id)
+        access_token = issue_token(user)
         return jsonify({'access_token': access_token, 'role': user.role}), 200
     
     return jsonify({'message': 'Invalid credentials'}), 401
 
+@app.route('/users/<int:user_id>/role', methods=['PUT'])
+@jwt_required()
+def change_role(user_id):
+    identity = current_identity()
+    
+    if identity.role != 'admin':
+        return jsonify({'message': 'Insufficient permissions'}), 403
+    
+    data = request.get_json()
+    if data.get('role') not in ROLES:
+        return jsonify({'message': 'Unknown role'}), 400
+    
+    user = User.query.get_or_404(user_id)
+    if user.org_id != identity.org_id:
+        return jsonify({'message': 'Can only change roles within your organization'}), 403
+    
+    # Tokens issued with the old role stop working
+    user.role = data['role']
+    bump_token_version(user)
+    db.session.commit()
+    token_versions.set(user.id, user.token_version)
+    
+    return jsonify({'message': 'Role updated', 'user_id': user.id, 'role': user.role})
+
+@app.route('/policy/reload', methods=['POST'])
+@jwt_required()
+def reload_policy():
+    global policy
+    identity = current_identity()
+    
+    if identity.role != 'admin':
+        return jsonify({'message': 'Insufficient permissions'}), 403
+    
+    try:
+        policy = load_policy()
+    except (OSError, ValueError) as e:
+        # Keep serving the previous policy
+        return jsonify({'message': f'Policy not reloaded: {e}'}), 400
+    
+    return jsonify({'message': 'Policy reloaded', 'roles': sorted(policy.masks)})
+
 @app.route('/organizations', methods=['POST'])
 @jwt_required()
 def create_organization():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    identity = current_identity()
     
-    if not check_permission(user.role, 'create'):
+    if not policy.allows(identity, 'create'):
         return jsonify({'message': 'Insufficient permissions'}), 403
     
     data = request.get_json()
@@ -722,19 +1101,21 @@ def create_organization():
     db.session.add(org)
     db.session.commit()
     
-    # Assign user to organization
+    # Assign user to organization; their old token's org claim is now stale
+    user = User.query.get(identity.id)
     user.org_id = org.id
+    bump_token_version(user)
     db.session.commit()
+    token_versions.set(user.id, user.token_version)
     
-    return jsonify({'message': 'Organization created', 'org_id': org.id}), 201
+    return jsonify({'message': 'Organization created', 'org_id': org.id, 'access_token': issue_token(user)}), 201
 
 @app.route('/departments', methods=['POST'])
 @jwt_required()
 def create_department():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    identity = current_identity()
     
-    if not check_permission(user.role, 'create'):
+    if not policy.allows(identity, 'create'):
         return jsonify({'message': 'Insufficient permissions'}), 403
     
     data = request.get_json()
@@ -747,34 +1128,101 @@ def create_department():
 @app.route('/resources', methods=['POST'])
 @jwt_required()
 def create_resource():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    identity = current_identity()
     
-    if not check_permission(user.role, 'create'):
+    if not policy.allows(identity, 'create'):
         return jsonify({'message': 'Insufficient permissions'}), 403
+    if identity.org_id is None:
+        return jsonify({'message': 'Join or create an organization first'}), 400
     
     data = request.get_json()
     resource = Resource(
         name=data['name'],
         content=data.get('content', ''),
-        owner_id=current_user_id,
-        org_id=user.org_id or 1  # Default org if none
+        owner_id=identity.id,
+        org_id=identity.org_id,
+        dept_id=identity.dept_id
     )
     db.session.add(resource)
     db.session.commit()
     
     return jsonify({'message': 'Resource created', 'resource_id': resource.id}), 201
 
+@app.route('/resources', methods=['GET'])
+@jwt_required()
+def list_resources():
+    identity = current_identity()
+    
+    # List at the broadest scope the role can read, narrowed further if asked
+    scope = policy.widest_scope(identity, 'read')
+    if scope is None:
+        return jsonify({'message': 'Insufficient permissions'}), 403
+    requested = request.args.get('scope')
+    if requested is not None:
+        if requested not in SCOPES:
+            return jsonify({'message': 'Unknown scope'}), 400
+        scope = min(scope, SCOPES[requested])
+    if scope >= DEPARTMENT and identity.org_id is None:
+        scope = OWNER
+    if scope == DEPARTMENT and identity.dept_id is None:
+        scope = OWNER
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer'}), 400
+    
+    query = Resource.query
+    if scope == ORGANIZATION:
+        query = query.filter(Resource.org_id == identity.org_id)
+    elif scope == DEPARTMENT:
+        query = query.filter(Resource.org_id == identity.org_id, Resource.dept_id == identity.dept_id)
+    else:
+        query = query.filter(Resource.owner_id == identity.id)
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            created_at, resource_id = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        query = query.filter(db.tuple_(Resource.created_at, Resource.id) < (created_at, resource_id))
+    
+    include_content = request.args.get('include') == 'content'
+    if not include_content:
+        query = query.options(defer(Resource.content))
+    
+    # One extra row tells whether another page follows
+    rows = query.order_by(Resource.created_at.desc(), Resource.id.desc()).limit(limit + 1).all()
+    page = rows[:limit]
+    items = []
+    for resource in page:
+        item = {
+            'id': resource.id,
+            'name': resource.name,
+            'owner_id': resource.owner_id,
+            'dept_id': resource.dept_id,
+            'created_at': resource.created_at.isoformat()
+        }
+        if include_content:
+            item['content'] = resource.content
+        items.append(item)
+    
+    return jsonify({
+        'resources': items,
+        'scope': next(name for name, value in SCOPES.items() if value == scope),
+        'next_cursor': encode_cursor(page[-1]) if len(rows) > limit else None
+    })
+
 @app.route('/resources/<int:resource_id>', methods=['GET'])
 @jwt_required()
 def get_resource(resource_id):
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    identity = current_identity()
     
-    if not check_permission(user.role, 'read'):
+    resource = Resource.query.get_or_404(resource_id)
+    if not policy.allows(identity, 'read', resource):
         return jsonify({'message': 'Insufficient permissions'}), 403
     
-    resource = Resource.query.get_or_404(resource_id)
     return jsonify({
         'id': resource.id,
         'name': resource.name,
@@ -785,18 +1233,13 @@ def get_resource(resource_id):
 @app.route('/guest-links', methods=['POST'])
 @jwt_required()
 def create_guest_link():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not check_permission(user.role, 'share'):
-        return jsonify({'message': 'Insufficient permissions'}), 403
+    identity = current_identity()
     
     data = request.get_json()
     resource = Resource.query.get_or_404(data['resource_id'])
     
-    # Check if user owns the resource or has admin rights
-    if resource.owner_id != current_user_id and user.role != 'admin':
-        return jsonify({'message': 'Can only share your own resources'}), 403
+    if not policy.allows(identity, 'share', resource):
+        return jsonify({'message': 'Insufficient permissions'}), 403
     
     guest_link = GuestLink(
         token=str(uuid.uuid4()),
@@ -828,7 +1271,26 @@ def guest_access(token):
         'expires_at': guest_link.expires_at.isoformat() if guest_link.expires_at else None
     })
 
+# Columns added after the first release; create_all() only creates missing
+# tables, so databases created by an older version get these added in place
+SCHEMA_UPGRADES = [
+    ('user', 'token_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('resource', 'dept_id', 'INTEGER REFERENCES department (id)'),
+]
+
+def upgrade_schema():
+    inspector = db.inspect(db.engine)
+    tables = inspector.get_table_names()
+    for table, column, definition in SCHEMA_UPGRADES:
+        if table in tables and column not in {c['name'] for c in inspector.get_columns(table)}:
+            db.session.execute(db.text(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}'))
+    db.session.commit()
+    # Likewise indexes added to existing tables
+    for index in Resource.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        upgrade_schema()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file